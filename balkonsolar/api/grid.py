@@ -1,26 +1,47 @@
 """ Grid demand API client for StromGedacht and OpenGridMap. """
-import requests
+import asyncio
 import logging
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from balkonsolar.api.http_session import DEFAULT_BACKOFF, DEFAULT_RETRIES, DEFAULT_TIMEOUT, get_json
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+API_URL = "https://api.stromgedacht.de/v1"
+
 class StromGedachtClient():
     """Client for StromGedacht API."""
     
     def __init__(
         self,
-        zip_code: int|None = None
+        zip_code: int|None = None,
+        api_url: str = API_URL,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
     ):
         """
         Initialize the StromGedacht API client.
         
         Args:
             zip_code: The zip code of the location to get the grid load for
+            api_url: Base URL of the API
+            timeout: Seconds per request attempt
+            retries: Retries after failed attempts (connection errors, timeouts, 429/5xx)
+            backoff: Delay before the first retry in seconds, doubled for every further retry
         """
-        self.base_url = "https://api.stromgedacht.de/v1/now"
-        self.forecast_url = "https://api.stromgedacht.de/v1/states"
+        self.base_url = f"{api_url}/now"
+        self.forecast_url = f"{api_url}/states"
         self.zip_code = zip_code
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _get(self, url: str, params: dict):
+        return await get_json(url, params, timeout=self.timeout, retries=self.retries, backoff=self.backoff)
         
     @staticmethod
     async def get_stromgedacht_mapping():
@@ -43,13 +64,16 @@ class StromGedachtClient():
     async def get_stromgedacht_api_response(self) -> dict:
         '''
         Get the response from the StromGedacht API.
-        : return: The response from the StromGedacht API as a dictionary
+        : return: The response from the StromGedacht API as a dictionary (empty on errors)
         '''
         params = {
             "zip": self.zip_code
         }
-        response = requests.get(self.base_url, params=params)
-        return response.json()
+        try:
+            return await self._get(self.base_url, params)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Error getting StromGedacht state for zip code: {self.zip_code}. Error: {e!r}")
+            return {}
         
     async def get_stromgedacht_mapping_integer(
         self,
@@ -87,11 +111,9 @@ class StromGedachtClient():
     async def get_forecast(self) -> list[dict]:
         """
         Get the forecast from the StromGedacht API.
-        : return: The forecast from the StromGedacht API as a list of dictionaries
+        : return: The forecast from the StromGedacht API as a list of dictionaries (empty on errors)
         """
         # Calculate date range for the API request
-        from datetime import datetime, timedelta
-        
         now = datetime.now()
         from_date = (now - timedelta(hours=12)).strftime("%Y-%m-%dT%H:%M:%S")
         to_date = (now + timedelta(hours=36)).strftime("%Y-%m-%dT%H:%M:%S")
@@ -103,15 +125,16 @@ class StromGedachtClient():
         }
         
         logger.info(f"Requesting forecast with params: {params}")
-        response = requests.get(self.forecast_url, params=params)
-        
-        # Check for errors
-        if response.status_code != 200:
-            logger.error(f"API error: {response.status_code} - {response.text}")
-            return response.json()  # Return error for debugging
-            
+        try:
+            data = await self._get(self.forecast_url, params)
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"API error: {e.status} - {e.message}")
+            return []
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Error getting StromGedacht forecast for zip code: {self.zip_code}. Error: {e!r}")
+            return []
+
         # The API returns a JSON object, not a list, so we need to extract the forecast
-        data = response.json()
         logger.info(f"Received forecast data: {data}")
         
         if isinstance(data, list):
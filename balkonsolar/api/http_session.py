@@ -0,0 +1,121 @@
+"""
+Shared HTTP session for the API clients.
+
+Every event loop gets one aiohttp ClientSession with a keep-alive connection pool, so repeated
+requests to Forecast.Solar and StromGedacht reuse their TCP/TLS connections instead of opening
+new ones. get_json() adds a per-request timeout and retries connection errors, timeouts and
+429/5xx responses with exponential backoff.
+
+Scripts that drive the clients with asyncio.run() should use run() instead, which closes the
+loop's session before the loop goes away.
+"""
+import asyncio
+import logging
+import random
+import weakref
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Seconds a single request may take, including connecting and reading the body
+DEFAULT_TIMEOUT = 10.0
+
+# Attempts after the first one, and the delay before the first retry (doubled each time)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+# Connections kept per session
+DEFAULT_CONNECTIONS = 10
+
+# Responses that are worth retrying
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+T = TypeVar("T")
+
+# One session per event loop; a session cannot be used from another loop
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    The shared session of the running event loop, created on first use.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=DEFAULT_CONNECTIONS))
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """
+    Close the shared session of the running event loop, if there is one.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def run(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine like asyncio.run() and close the loop's shared session afterwards.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_session()
+
+    return asyncio.run(main())
+
+
+async def get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> Any:
+    """
+    GET a URL with the shared session and decode the JSON response.
+
+    Args:
+        url: Request URL.
+        params: Query parameters; None values are left out.
+        headers: Additional request headers.
+        timeout: Seconds per attempt.
+        retries: Attempts after the first one for connection errors, timeouts and 429/5xx responses.
+        backoff: Delay before the first retry in seconds; doubled for every further retry
+            (plus up to 10% jitter). A Retry-After header in seconds takes precedence.
+
+    Returns:
+        The decoded JSON body.
+
+    Raises:
+        aiohttp.ClientResponseError: Non-retryable status, or retryable status after the last attempt.
+        aiohttp.ClientError, asyncio.TimeoutError: Connection error or timeout after the last attempt.
+    """
+    params = {key: str(value) for key, value in (params or {}).items() if value is not None}
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    for attempt in range(retries + 1):
+        delay = backoff * 2 ** attempt * (1 + random.random() / 10)
+        try:
+            async with get_session().get(url, params=params, headers=headers, timeout=client_timeout) as response:
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = float(retry_after)
+                    logger.warning(f"{url} returned {response.status}, retrying in {delay:.1f}s")
+                else:
+                    response.raise_for_status()
+                    # Some APIs send JSON with a text/plain content type
+                    return await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Request to {url} failed ({e!r}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
@@ -2,14 +2,17 @@
 Solar forecast API client for forecast.solar
 """
 
+import asyncio
 import time
+from collections import namedtuple
 from pathlib import Path
-from typing import Optional
-import requests
+from typing import List, Optional
+import aiohttp
 import logging
 import os
 from datetime import datetime, timedelta
 from diskcache import Cache
+from .http_session import DEFAULT_BACKOFF, DEFAULT_RETRIES, DEFAULT_TIMEOUT, get_json, run
 from ..core.database_interface import DatabaseInterface
 from dotenv import load_dotenv
 
@@ -17,6 +20,49 @@ load_dotenv(dotenv_path="balkonsolar/.env")
 
 logger = logging.getLogger(__name__)
 
+BASE_URL = "https://api.forecast.solar/"
+
+# One panel plane (e.g. an east and a west balcony string): tilt in degrees (0 = horizontal),
+# azimuth in degrees (Forecast.Solar convention) and peak power in kWp
+Plane = namedtuple("Plane", ["declination", "azimuth", "kwp"])
+
+# Forecast series that are added up across planes, and the ones among them that are cumulative per day
+MERGED_SERIES = ("watts", "watt_hours_period", "watt_hours", "watt_hours_day")
+CUMULATIVE_SERIES = ("watt_hours",)
+
+
+def merge_forecasts(forecasts: List[dict]) -> dict:
+    """
+    Add up the forecasts of several planes per timestamp.
+
+    Planes at the same location share their timestamps; where one is missing, a plane contributes
+    nothing (or, for cumulative series, its last value of the same day).
+
+    Args:
+        forecasts: Forecast.Solar results, one per plane.
+
+    Returns:
+        dict: Result with the series in MERGED_SERIES, timestamps in ascending order.
+    """
+    merged = {}
+    for key in MERGED_SERIES:
+        series = [forecast.get(key) or {} for forecast in forecasts]
+        timestamps = sorted(set().union(*series))
+        if not timestamps:
+            continue
+        if key in CUMULATIVE_SERIES:
+            day, last, values = None, [0] * len(series), {}
+            for timestamp in timestamps:
+                if timestamp[:10] != day:
+                    day, last = timestamp[:10], [0] * len(series)
+                last = [plane.get(timestamp, value) for plane, value in zip(series, last)]
+                values[timestamp] = sum(last)
+            merged[key] = values
+        else:
+            merged[key] = {timestamp: sum(plane.get(timestamp, 0) for plane in series) for timestamp in timestamps}
+    return merged
+
+
 class ForecastSolarClient():
     """Client for Forecast.Solar API with persistent caching."""
 
@@ -29,7 +75,12 @@ class ForecastSolarClient():
             kwp: float = 1.0,
             api_key: Optional[str] = None,
             cache_dirname: str = ".forecast_solar_cache",
-            cache_ttl: int = 3600  # 1 hour default TTL in seconds
+            cache_ttl: int = 3600,  # 1 hour default TTL in seconds
+            planes: Optional[List[Plane]] = None,
+            base_url: str = BASE_URL,
+            timeout: float = DEFAULT_TIMEOUT,
+            retries: int = DEFAULT_RETRIES,
+            backoff: float = DEFAULT_BACKOFF,
     ):
         """
         Initialize the Forecast.Solar API client with caching.
@@ -43,8 +94,14 @@ class ForecastSolarClient():
             api_key: Optional API key for premium features
             cache_dirname: Directory for cache storage
             cache_ttl: Time-to-live for cache entries in seconds
+            planes: Panel planes fetched concurrently and added up (default: the single plane
+                given by declination, azimuth and kwp)
+            base_url: Base URL of the API
+            timeout: Seconds per request attempt
+            retries: Retries after failed attempts (connection errors, timeouts, 429/5xx)
+            backoff: Delay before the first retry in seconds, doubled for every further retry
         """
-        self.base_url = "https://api.forecast.solar/"
+        self.base_url = base_url
         self.latitude = latitude
         self.longitude = longitude
         self.declination = declination
@@ -52,6 +109,10 @@ class ForecastSolarClient():
         self.kwp = kwp
         self.api_key = api_key or os.getenv("FORECAST_SOLAR_API_KEY")
         self.cache_ttl = cache_ttl
+        self.planes = list(planes) if planes else [Plane(declination, azimuth, kwp)]
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
 
         cache_dir = os.path.join(Path(__file__).parent, cache_dirname)
 
@@ -61,16 +122,28 @@ class ForecastSolarClient():
         # Initialize disk cache
         self.cache = Cache(cache_dir)
 
-    def _get_cache_key(self) -> str:
+    def _get_cache_key(self, plane: Optional[Plane] = None) -> str:
         """Generate a unique cache key based on installation parameters."""
-        return f"forecast_{self.latitude}_{self.longitude}_{self.declination}_{self.azimuth}_{self.kwp}"
+        declination, azimuth, kwp = plane or self.planes[0]
+        return f"forecast_{self.latitude}_{self.longitude}_{declination}_{azimuth}_{kwp}"
 
     async def get_forecast(self) -> dict:
         '''
-        Get the response from the Forecast.Solar API with caching.
-        Returns: The response from the Forecast.Solar API as a dictionary
+        Get the forecast of all planes from the Forecast.Solar API with caching. The planes are
+        requested concurrently and added up per timestamp.
+        Returns: The response from the Forecast.Solar API as a dictionary (empty if any plane failed)
         '''
-        cache_key = self._get_cache_key()
+        results = await asyncio.gather(*(self.get_plane_forecast(plane) for plane in self.planes))
+        if not all(results):
+            return {}
+        return results[0] if len(results) == 1 else merge_forecasts(results)
+
+    async def get_plane_forecast(self, plane: Plane) -> dict:
+        '''
+        Get the response from the Forecast.Solar API for one plane with caching.
+        Returns: The response from the Forecast.Solar API as a dictionary (empty on errors)
+        '''
+        cache_key = self._get_cache_key(plane)
 
         # Try to get from cache first
         cached_data = self.cache.get(cache_key)
@@ -86,22 +159,23 @@ class ForecastSolarClient():
             headers['X-FORECAST-API-KEY'] = self.api_key
 
         try:
-            params_url_suffix = f"estimate/{self.latitude}/{self.longitude}/{self.declination}/{self.azimuth}/{self.kwp}"
-            response = requests.get(self.base_url + params_url_suffix, headers=headers)
-            response.raise_for_status()
-            result = response.json().get('result', {})
+            params_url_suffix = f"estimate/{self.latitude}/{self.longitude}/{plane.declination}/{plane.azimuth}/{plane.kwp}"
+            response = await get_json(self.base_url + params_url_suffix, headers=headers, timeout=self.timeout,
+                                      retries=self.retries, backoff=self.backoff)
+            result = response.get('result') or {}
 
             # Store in cache with current timestamp
-            self.cache[cache_key] = (time.time(), result)
+            if result:
+                self.cache[cache_key] = (time.time(), result)
 
             return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting forecast data: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, AttributeError) as e:
+            logger.error(f"Error getting forecast data: {e!r}")
             return {}
 
     async def get_watt_hours(self) -> dict:
         forecast = await self.get_forecast()
-        watt_hour_forecast = forecast["watt_hours_period"]
+        watt_hour_forecast = forecast.get("watt_hours_period", {})
         format = "%Y-%m-%d %H:%M:%S"
         return { datetime.strptime(timestamp, format): watts for (timestamp, watts) in
                       watt_hour_forecast.items() }
@@ -147,8 +221,6 @@ class ForecastSolarClient():
 
 if __name__ == "__main__":
     if __name__ == '__main__':
-        import asyncio
-
         client = ForecastSolarClient(
             latitude=52.520008,
             longitude=13.404954,
@@ -156,11 +228,11 @@ if __name__ == "__main__":
             azimuth=0,
             kwp=0.8,
         )
-        forecast = asyncio.run(client.get_forecast())
+        forecast = run(client.get_forecast())
         watt_forecast = forecast["watts"]
         watt_hour_forecast = forecast["watt_hours"]
         format = "%Y-%m-%d %H:%M:%S"
-        watt_hours = asyncio.run(client.get_watt_hours())
+        watt_hours = run(client.get_watt_hours())
         print(list(watt_hours.items())[:10])
 
         import pandas as pd
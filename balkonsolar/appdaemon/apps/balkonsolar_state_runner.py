@@ -1,28 +1,62 @@
+import os
+import sys
 import appdaemon.plugins.hass.hassapi as hass
-from balkonsolar.core.determine_balkonsolar_state import determine_balkonsolar_state
-from balkonsolar.database_shenanigans.energy_db import EnergyDB
+from virtual_battery import VirtualBattery
+
+# The apps directory is loaded by AppDaemon directly; make the balkonsolar package importable
+_repo_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.mpc import MPCController
+from balkonsolar.core.planner import Planner
+
 
 class BalkonsolarStateRunner(hass.Hass):
     """
-    AppDaemon app that periodically runs the Balkonsolar state determination algorithm
-    and stores the result in the energy database. This can be used for logging, monitoring,
-    or triggering further automations based on the calculated state.
+    AppDaemon app that runs the receding-horizon controller (balkonsolar/core/mpc.py) on a short
+    interval. The plan in output_algorithm is only re-solved when the forecasts change, the
+    virtual battery drifts from the planned state of charge or the plan runs short; otherwise a
+    step just reads the current slot's suggested state.
     """
     def initialize(self):
         """
         Called once when the app is initialized by AppDaemon.
-        Sets up the database connection and schedules the algorithm to run every 15 minutes.
+        Sets up the planner and controller and schedules a control step every `interval` seconds.
+        """
+        db_path = self.args.get("db_path") or os.getenv("DB_PATH")
+        self.battery = VirtualBattery()
+        planner = Planner(
+            DatabaseInterface(db_path, pooled=True),
+            battery_max=self.battery.capacity * 1000,
+            backend=self.args.get("backend", "dp"),
+            time_limit=self.args.get("time_limit"),
+            resolution=self.args.get("resolution", 60),
+            usage_source=self.args.get("usage_source", "profile"),
+        )
+        self.mpc = MPCController(
+            planner,
+            pv_tolerance=self.args.get("pv_tolerance", 50.0),
+            usage_tolerance=self.args.get("usage_tolerance", 50.0),
+            soc_tolerance=self.args.get("soc_tolerance", 100.0),
+        )
+        self.run_every(self.run_algorithm_and_store, self.datetime(), self.args.get("interval", 60))
+
+    def terminate(self):
+        """
+        Called by AppDaemon when the app is stopped or reloaded. Closes the database connections.
         """
-        self.energy_db = EnergyDB()
-        # Schedule the algorithm to run every 900 seconds (15 minutes)
-        self.run_every(self.run_algorithm_and_store, self.datetime(), 900)
+        self.mpc.planner.close()
 
     def run_algorithm_and_store(self, kwargs):
         """
-        Runs the Balkonsolar state determination algorithm, stores the result in the database,
-        and logs the output with a timestamp.
+        Runs one control step with the virtual battery's charge; logs replans with their reasons.
         """
-        result = determine_balkonsolar_state()
-        timestamp = self.datetime().strftime("%Y-%m-%d %H:%M:%S")
-        self.energy_db.store_algorithm_output(result, timestamp)
-        self.log(f"Algorithm output {result} stored at {timestamp}")
+        result = self.mpc.step(self.datetime().replace(tzinfo=None), soc=self.battery.current_charge * 1000)
+        if result["replanned"]:
+            replan = self.mpc.replans[-1]
+            self.log(
+                f"Replanned {replan['solved_hours']:g} hours from {replan['from']:%H:%M} in {replan['ms']:.1f} ms "
+                f"({'; '.join(result['reasons'])}), now: {result['current']['suggested_state']}"
+            )
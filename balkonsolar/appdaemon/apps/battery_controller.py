@@ -22,7 +22,13 @@ class BatteryController(hass.Hass):
 
         # Initialize database with path from config or environment
         db_path = self.args.get("db_path") or os.getenv("DB_PATH")  # None will use the default path in DatabaseManager
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(
+            db_path,
+            buffered=self.args.get("buffered_writes", False),
+            flush_size=self.args.get("flush_size", 50),
+            flush_interval=self.args.get("flush_interval", 30),
+            hot_tier=self.args.get("hot_tier", False),
+        )
         self.log(f"Database initialized at {self.db_manager.db_path}")
 
         self.active = False
@@ -30,6 +36,12 @@ class BatteryController(hass.Hass):
         self.current_power = 0.0
         self.run_every(self.manage_battery, self.datetime(), 60)
 
+    def terminate(self):
+        """
+        Called by AppDaemon when the app is stopped or reloaded. Drains buffered database writes.
+        """
+        self.db_manager.close()
+
     def manage_battery(self, kwargs):
         """
         Simulates battery charging/discharging based on PV production and grid consumption.
@@ -76,9 +88,7 @@ class BatteryController(hass.Hass):
 
         # Log solar, battery, and grid data to the database
         timestamp = self.datetime().strftime("%Y-%m-%d %H:%M:%S")
-        self.db_manager.store_battery_status(self.battery.current_charge, timestamp)
-        self.db_manager.store_solar_output(pv_power, timestamp)
-        self.db_manager.store_grid_usage(grid_power, timestamp)
+        self.db_manager.store_telemetry(self.battery.current_charge, pv_power, grid_power, timestamp)
         self.log(f"Logged energy data to database at {timestamp}")
 
     def activate_battery(self):
@@ -1,23 +1,275 @@
 import sqlite3
 import os
+import sys
 import datetime
-from typing import Optional, Dict, List, Any
+import atexit
+import threading
+from typing import Optional, Dict, Iterator, List, Any, Tuple, Union
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path="balkonsolar/.env")
 
+# The in-memory hot tier and the time zone of naive timestamps come from the balkonsolar
+# package, so both storage layers convert epoch seconds alike; the package is optional for the apps
+try:
+    from balkonsolar.core.hot_tier import HotTier
+    from balkonsolar.core.timestamps import LOCAL_TZ
+except ImportError:
+    _repo_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+    if _repo_root not in sys.path:
+        sys.path.append(_repo_root)
+    try:
+        from balkonsolar.core.hot_tier import HotTier
+        from balkonsolar.core.timestamps import LOCAL_TZ
+    except ImportError:
+        HotTier = None
+        # None means the (DST-aware) system time zone
+        LOCAL_TZ = ZoneInfo(os.environ["TIMEZONE"]) if os.getenv("TIMEZONE") else None
+
+
+def to_epoch(timestamp: Union[str, datetime.datetime, int, float]) -> int:
+    """
+    Convert a timestamp to integer UTC epoch seconds for tables using the epoch schema.
+    Naive timestamps are taken as local time.
+    """
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None and LOCAL_TZ is not None:
+        timestamp = timestamp.replace(tzinfo=LOCAL_TZ)
+    return int(timestamp.timestamp())
+
+
+def from_epoch(seconds: int) -> str:
+    """
+    Format epoch seconds as a local "%Y-%m-%d %H:%M:%S" timestamp.
+    """
+    return datetime.datetime.fromtimestamp(seconds, LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def now_timestamp() -> str:
+    """
+    Current local time as a "%Y-%m-%d %H:%M:%S" timestamp, like the timestamps the apps pass.
+    Every store path uses it for samples without a timestamp.
+    """
+    return datetime.datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BufferedWriter:
+    """
+    Group-commit writer shared by all AppDaemon apps that write to the same database file.
+    Samples from all tables are queued in memory and written in a single transaction with
+    executemany once flush_size samples are pending or flush_interval seconds have passed.
+    One instance exists per database path, so every app's samples end up in the same batch.
+    Every BufferedWriter(...) call counts as one user that must call close(); the flush thread
+    stops when the last user closes, and the next BufferedWriter(...) starts a new instance.
+    """
+    _instances: Dict[str, "BufferedWriter"] = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, db_path: str, **kwargs):
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                instance = super(BufferedWriter, cls).__new__(cls)
+                instance._key = key
+                instance._users = 0
+                cls._instances[key] = instance
+            instance = cls._instances[key]
+            instance._users += 1
+            return instance
+
+    def __init__(self, db_path: str, flush_size: int = 50, flush_interval: float = 30.0):
+        """
+        Initialize the writer and start its background flush thread.
+        Args:
+            db_path: Path to the database file.
+            flush_size: Number of pending samples that triggers an immediate flush.
+            flush_interval: Maximum age in seconds of a pending sample before it is flushed.
+        """
+        # Only initialize once per database path
+        if hasattr(self, "_initialized"):
+            return
+        self.db_path = db_path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[str, tuple]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="BufferedWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self._shutdown)
+        self._initialized = True
+
+    def add(self, table: str, value: float, timestamp: Optional[Any] = None):
+        """
+        Queue a sample for the given table. Flushes right away if flush_size is reached.
+        Args:
+            table: Table name
+            value: Value to store
+            timestamp: Optional timestamp, text or epoch seconds for epoch schema tables
+                (if None, the current local time is used)
+        """
+        # OR REPLACE: epoch schema tables keep one sample per second
+        self._queue(f"INSERT OR REPLACE INTO {table} (tstamp, value) VALUES (?, ?)", (self._timestamp(timestamp), value))
+
+    def add_row(self, table: str, values: Dict[str, float], timestamp: Optional[Any] = None):
+        """
+        Queue a row with one column per signal (telemetry table). A row for a timestamp that
+        already exists is merged into it.
+        Args:
+            table: Table name
+            values: Column name -> value
+            timestamp: Optional timestamp, as for add()
+        """
+        columns = ", ".join(values)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in values)
+        sql = (
+            f"INSERT INTO {table} (tstamp, {columns}) VALUES ({', '.join('?' * (len(values) + 1))}) "
+            f"ON CONFLICT(tstamp) DO UPDATE SET {updates}"
+        )
+        self._queue(sql, (self._timestamp(timestamp), *values.values()))
+
+    def _timestamp(self, timestamp: Optional[Any]) -> Any:
+        """
+        Default a missing timestamp to the current local time.
+        """
+        return now_timestamp() if timestamp is None else timestamp
+
+    def _queue(self, sql: str, params: tuple):
+        """
+        Queue one statement execution. Flushes right away if flush_size is reached.
+        """
+        with self._lock:
+            self._pending.append((sql, params))
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write all pending samples in one transaction.
+        Returns:
+            Number of samples written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            # One executemany per distinct statement (i.e. per table and row layout)
+            by_statement: Dict[str, List[tuple]] = {}
+            for sql, params in batch:
+                by_statement.setdefault(sql, []).append(params)
+
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                try:
+                    with conn:
+                        for sql, rows in by_statement.items():
+                            conn.executemany(sql, rows)
+                finally:
+                    conn.close()
+                return len(batch)
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    # Keep the samples and retry on the next flush
+                    with self._lock:
+                        self._pending = batch + self._pending
+                    print(f"Error flushing {len(batch)} buffered samples: {e}")
+                    return 0
+                return self._flush_separately(by_statement, e)
+            except Exception as e:
+                return self._flush_separately(by_statement, e)
+
+    def _flush_separately(self, by_statement: Dict[str, List[tuple]], error: Exception) -> int:
+        """
+        Retry a failed batch with one transaction per statement, so a table that cannot be
+        written (e.g. dropped or migrated) does not take the other tables' samples with it.
+        Statements that still fail for a lock are requeued; other failures are dropped.
+        """
+        print(f"Error flushing {sum(len(rows) for rows in by_statement.values())} buffered samples: {error}; "
+              f"retrying per table")
+        written = 0
+        requeue: List[Tuple[str, tuple]] = []
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+        except Exception as e:
+            print(f"Error opening {self.db_path}: {e}")
+            requeue = [(sql, params) for sql, rows in by_statement.items() for params in rows]
+        else:
+            try:
+                for sql, rows in by_statement.items():
+                    try:
+                        with conn:
+                            conn.executemany(sql, rows)
+                        written += len(rows)
+                    except sqlite3.OperationalError as e:
+                        if "locked" in str(e) or "busy" in str(e):
+                            requeue.extend((sql, params) for params in rows)
+                        else:
+                            print(f"Dropping {len(rows)} samples for '{sql}': {e}")
+                    except Exception as e:
+                        print(f"Dropping {len(rows)} samples for '{sql}': {e}")
+            finally:
+                conn.close()
+        if requeue:
+            with self._lock:
+                self._pending = requeue + self._pending
+        return written
+
+    def _run(self):
+        """
+        Background loop that flushes pending samples every flush_interval seconds.
+        """
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Release one user. Drains all pending samples to disk; the last user also stops the
+        background thread and retires the instance.
+        """
+        with self._instances_lock:
+            self._users -= 1
+            last = self._users <= 0
+            if last and self._instances.get(self._key) is self:
+                del self._instances[self._key]
+        if last:
+            self._shutdown()
+        else:
+            self.flush()
+
+    def _shutdown(self):
+        """
+        Stop the background thread and drain all pending samples to disk (also run at exit).
+        """
+        self._stop.set()
+        self.flush()
+
+
 class DatabaseManager:
     """
     Standalone database manager for AppDaemon apps.
     Handles creation, connection, and operations for the energy data database.
     Can be used without requiring the main balkonsolar package.
     """
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, buffered: bool = False, flush_size: int = 50, flush_interval: float = 30.0,
+                 hot_tier: bool = False):
         """
         Initialize the database manager.
         Tries multiple locations for the database file, creates tables if needed.
         Args:
             db_path: Path to the database file (optional).
+            buffered: If True, writes go through the shared BufferedWriter instead of one commit per sample.
+            flush_size: Pending samples that trigger a flush (buffered mode only).
+            flush_interval: Maximum seconds a sample stays buffered (buffered mode only).
+            hot_tier: If True, keep the latest samples in the process-wide HotTier and answer
+                get_latest_values() from RAM (needs the balkonsolar package to be importable).
         """
         if db_path is None:
             # Try multiple paths in order of preference
@@ -55,6 +307,13 @@ class DatabaseManager:
 
         self.db_path = db_path
         self._ensure_db_exists()
+        self.writer = BufferedWriter(self.db_path, flush_size=flush_size, flush_interval=flush_interval) if buffered else None
+        self.hot_tier = None
+        if hot_tier:
+            if HotTier is None:
+                print("Hot tier requested but balkonsolar.core.hot_tier is not importable; reading from disk")
+            else:
+                self.hot_tier = HotTier(self.db_path)
 
     def _can_create_path(self, path: str) -> bool:
         """
@@ -137,6 +396,16 @@ class DatabaseManager:
             cursor.execute(table_query)
 
         conn.commit()
+
+        # Tables migrated to the epoch schema store integer UTC seconds in a clustered tstamp
+        self.epoch_tables = set()
+        kinds = dict(cursor.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')").fetchall())
+        for name in kinds:
+            for column in cursor.execute(f'PRAGMA table_info("{name}")').fetchall():
+                if column[1] == "tstamp" and (column[2] or "").upper() == "INTEGER":
+                    self.epoch_tables.add(name)
+        # With the wide telemetry table, battery/solar/grid tables are views on it
+        self.telemetry = kinds.get("telemetry") == "table"
         conn.close()
 
     def _get_connection(self):
@@ -154,31 +423,56 @@ class DatabaseManager:
         Args:
             table: Table name
             value: Value to store
-            timestamp: Optional timestamp (if None, current time is used)
+            timestamp: Optional timestamp (if None, the current local time is used)
         Returns:
-            True if successful, False otherwise
+            True if successful (or queued in buffered mode), False otherwise
         """
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+        # Stamp now on every path, so RAM and disk hold the same local timestamp
+        if timestamp is None:
+            timestamp = now_timestamp()
+        stored = to_epoch(timestamp) if table in self.epoch_tables else timestamp
+        if self.writer is not None:
+            self.writer.add(table, value, stored)
+        else:
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
 
-            if timestamp:
-                cursor.execute(
-                    f"INSERT INTO {table} (tstamp, value) VALUES (?, ?)",
-                    (timestamp, value)
-                )
-            else:
-                cursor.execute(
-                    f"INSERT INTO {table} (value) VALUES (?)",
-                    (value,)
-                )
+                if table in self.epoch_tables:
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO {table} (tstamp, value) VALUES (?, ?)",
+                        (stored, value)
+                    )
+                else:
+                    cursor.execute(
+                        f"INSERT INTO {table} (tstamp, value) VALUES (?, ?)",
+                        (stored, value)
+                    )
 
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error storing value in {table}: {e}")
-            return False
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                print(f"Error storing value in {table}: {e}")
+                return False
+        # Only samples that are queued or on disk are served from RAM
+        if self.hot_tier is not None:
+            self.hot_tier.append(table, timestamp, value)
+        return True
+
+    def flush(self) -> int:
+        """
+        Write buffered samples to disk now. Returns the number of samples written.
+        """
+        return self.writer.flush() if self.writer is not None else 0
+
+    def close(self):
+        """
+        Drain buffered samples. Call this from the app's terminate() on shutdown; the shared
+        writer keeps running for the other apps.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
 
     def store_battery_status(self, value: float, timestamp: Optional[str] = None) -> bool:
         """
@@ -198,6 +492,51 @@ class DatabaseManager:
         """
         return self.store_value("grid_usage", value, timestamp)
 
+    def store_telemetry(self, battery: float, solar: float, grid: float, timestamp: Optional[str] = None) -> bool:
+        """
+        Store battery charge, PV power and grid power sampled at the same time.
+        With the telemetry table this is a single row insert, otherwise one insert per table.
+        Args:
+            battery: Battery charge
+            solar: PV power
+            grid: Grid power
+            timestamp: Optional timestamp (if None, the current local time is used)
+        Returns:
+            True if successful (or queued in buffered mode), False otherwise
+        """
+        if timestamp is None:
+            timestamp = now_timestamp()
+        if not self.telemetry:
+            return all([
+                self.store_battery_status(battery, timestamp),
+                self.store_solar_output(solar, timestamp),
+                self.store_grid_usage(grid, timestamp),
+            ])
+
+        values = {"battery_storage_status": battery, "solar_output": solar, "grid_usage": grid}
+        stored = to_epoch(timestamp) if "telemetry" in self.epoch_tables else timestamp
+        if self.writer is not None:
+            self.writer.add_row("telemetry", values, stored)
+        else:
+            try:
+                conn = self._get_connection()
+                columns = ", ".join(values)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in values)
+                conn.execute(
+                    f"INSERT INTO telemetry (tstamp, {columns}) VALUES (?, ?, ?, ?) ON CONFLICT(tstamp) DO UPDATE SET {updates}",
+                    (stored, *values.values())
+                )
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                print(f"Error storing telemetry: {e}")
+                return False
+        # Only samples that are queued or on disk are served from RAM
+        if self.hot_tier is not None:
+            for signal, value in values.items():
+                self.hot_tier.append(signal, timestamp, value)
+        return True
+
     def get_latest_values(self, table: str, limit: int = 1) -> List[Dict[str, Any]]:
         """
         Get the latest values from a specific table.
@@ -207,22 +546,31 @@ class DatabaseManager:
         Returns:
             List of records as dictionaries
         """
+        if self.hot_tier is not None:
+            if not self.hot_tier.is_warm(table):
+                self.flush()
+                self.hot_tier.warm(table, self._read_latest(table, self.hot_tier.maxlen))
+            records = self.hot_tier.latest(table, limit)
+            if records is not None:
+                return records
+        return self._read_latest(table, limit)
+
+    def _read_latest(self, table: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Read the latest values of a table from disk, newest first.
+        """
+        # Make buffered samples visible to readers
+        self.flush()
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
 
             cursor.execute(
-                f"SELECT id, tstamp, value FROM {table} ORDER BY tstamp DESC LIMIT ?",
+                f"SELECT {self._id_column(table)} AS id, tstamp, value FROM {table} ORDER BY tstamp DESC LIMIT ?",
                 (limit,)
             )
 
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    "id": row["id"],
-                    "timestamp": row["tstamp"],
-                    "value": row["value"]
-                })
+            results = [self._row_to_dict(table, row) for row in cursor.fetchall()]
 
             conn.close()
             return results
@@ -230,6 +578,64 @@ class DatabaseManager:
             print(f"Error getting values from {table}: {e}")
             return []
 
+    def iter_values_by_timeframe(self, table: str, start_time: str, end_time: Optional[str] = None, chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream values from a specific table within a timeframe, oldest first.
+        Rows are fetched chunk_size at a time, so long ranges are read in constant memory.
+        Args:
+            table: Table name
+            start_time: Start time in ISO format
+            end_time: Optional end time in ISO format
+            chunk_size: Rows fetched from the database at a time
+        Returns:
+            Iterator over records as dictionaries
+        Raises:
+            Exception: Errors while reading a chunk are logged and re-raised, so a truncated
+                stream is never mistaken for the end of the data
+        """
+        self.flush()
+        conn = self._get_connection()
+        try:
+            if table in self.epoch_tables:
+                start_time = to_epoch(start_time)
+                end_time = to_epoch(end_time) if end_time else None
+            query = f"SELECT {self._id_column(table)} AS id, tstamp, value FROM {table} WHERE tstamp >= ?"
+            params = [start_time]
+            if end_time:
+                query += " AND tstamp <= ?"
+                params.append(end_time)
+            cursor = conn.execute(query + " ORDER BY tstamp", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_dict(table, row)
+        except Exception as e:
+            print(f"Error streaming values by timeframe from {table}: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _id_column(self, table: str) -> str:
+        """
+        Column selected as id; epoch schema tables have none.
+        """
+        return "NULL" if table in self.epoch_tables else "id"
+
+    def _row_to_dict(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        """
+        Convert a result row to a record, formatting epoch timestamps as local text.
+        """
+        tstamp = row["tstamp"]
+        if table in self.epoch_tables and tstamp is not None:
+            tstamp = from_epoch(tstamp)
+        return {
+            "id": row["id"],
+            "timestamp": tstamp,
+            "value": row["value"]
+        }
+
     def get_battery_status(self, limit: int = 1) -> List[Dict[str, Any]]:
         """
         Get the latest battery status entries.
@@ -259,28 +665,27 @@ class DatabaseManager:
         Returns:
             List of records as dictionaries
         """
+        self.flush()
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
 
+            if table in self.epoch_tables:
+                start_time = to_epoch(start_time)
+                end_time = to_epoch(end_time) if end_time else None
+            id_column = self._id_column(table)
             if end_time:
                 cursor.execute(
-                    f"SELECT id, tstamp, value FROM {table} WHERE tstamp BETWEEN ? AND ? ORDER BY tstamp DESC LIMIT ?",
+                    f"SELECT {id_column} AS id, tstamp, value FROM {table} WHERE tstamp BETWEEN ? AND ? ORDER BY tstamp DESC LIMIT ?",
                     (start_time, end_time, limit)
                 )
             else:
                 cursor.execute(
-                    f"SELECT id, tstamp, value FROM {table} WHERE tstamp >= ? ORDER BY tstamp DESC LIMIT ?",
+                    f"SELECT {id_column} AS id, tstamp, value FROM {table} WHERE tstamp >= ? ORDER BY tstamp DESC LIMIT ?",
                     (start_time, limit)
                 )
 
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    "id": row["id"],
-                    "timestamp": row["tstamp"],
-                    "value": row["value"]
-                })
+            results = [self._row_to_dict(table, row) for row in cursor.fetchall()]
 
             conn.close()
             return results
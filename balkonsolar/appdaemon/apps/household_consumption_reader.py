@@ -17,7 +17,13 @@ class HouseholdConsumptionReader(hass.Hass):
         self.entity_id = "sensor.shellypro3em63_fce8c0dad39c_total_active_power"
         # Initialize database with path from config or environment
         db_path = self.args.get("db_path") or os.getenv("DB_PATH")  # None will use the default path in DatabaseManager
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(
+            db_path,
+            buffered=self.args.get("buffered_writes", False),
+            flush_size=self.args.get("flush_size", 50),
+            flush_interval=self.args.get("flush_interval", 30),
+            hot_tier=self.args.get("hot_tier", False),
+        )
         self.log(f"Database initialized at {self.db_manager.db_path}")
 
         value = self.get_state(self.entity_id)
@@ -31,6 +37,12 @@ class HouseholdConsumptionReader(hass.Hass):
         self.listen_state(self.state_changed, self.entity_id)
         self.run_every(self.log_consumption_power, self.datetime(), 60)
 
+    def terminate(self):
+        """
+        Called by AppDaemon when the app is stopped or reloaded. Drains buffered database writes.
+        """
+        self.db_manager.close()
+
     def state_changed(self, entity, attribute, old, new, kwargs):
         """
         Callback for when the sensor state changes. Updates the latest value and logs the change.
@@ -0,0 +1,51 @@
+import os
+import sys
+import appdaemon.plugins.hass.hassapi as hass
+from virtual_battery import VirtualBattery
+
+# The apps directory is loaded by AppDaemon directly; make the balkonsolar package importable
+_repo_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.planner import Planner
+
+
+class PlannerRunner(hass.Hass):
+    """
+    AppDaemon app that keeps a Planner warm inside the AppDaemon process and replans the battery
+    schedule periodically, starting from the virtual battery's current charge. Forecasts and the
+    consumption profile stay cached between runs, so a replan only costs a few small queries.
+    """
+    def initialize(self):
+        """
+        Called once when the app is initialized by AppDaemon.
+        Creates the planner and schedules a replan every `interval` seconds (default 15 minutes).
+        """
+        db_path = self.args.get("db_path") or os.getenv("DB_PATH")
+        self.battery = VirtualBattery()
+        self.planner = Planner(
+            DatabaseInterface(db_path, pooled=True),
+            battery_max=self.battery.capacity * 1000,
+            backend=self.args.get("backend", "greedy"),
+            time_limit=self.args.get("time_limit"),
+            resolution=self.args.get("resolution", 60),
+            usage_source=self.args.get("usage_source", "profile"),
+        )
+        self.run_every(self.replan, self.datetime(), self.args.get("interval", 900))
+
+    def terminate(self):
+        """
+        Called by AppDaemon when the app is stopped or reloaded. Closes the database connections.
+        """
+        self.planner.close()
+
+    def replan(self, kwargs):
+        """
+        Replans the schedule with the current battery charge and logs the phase timings.
+        """
+        result = self.planner.replan(battery_current=self.battery.current_charge * 1000)
+        timings = ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in result["timings"].items())
+        refreshed = ", ".join(result["refreshed"]) or "none"
+        self.log(f"Schedule replanned ({result['status']}; {timings}; re-read forecasts: {refreshed})")
@@ -14,7 +14,13 @@ class PVProductionReader(hass.Hass):
         self.sensor = "sensor.8cbfea97f1ec_power"
         # Initialize database with path from config
         db_path = self.args.get("db_path", None)  # None will use the default path in DatabaseManager
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(
+            db_path,
+            buffered=self.args.get("buffered_writes", False),
+            flush_size=self.args.get("flush_size", 50),
+            flush_interval=self.args.get("flush_interval", 30),
+            hot_tier=self.args.get("hot_tier", False),
+        )
         self.log(f"Database initialized at {self.db_manager.db_path}")
         value = self.get_state(self.sensor)
         try:
@@ -26,6 +32,12 @@ class PVProductionReader(hass.Hass):
         self.listen_state(self.state_changed, self.sensor)
         self.run_every(self.log_pv_power, self.datetime(), 60)
 
+    def terminate(self):
+        """
+        Called by AppDaemon when the app is stopped or reloaded. Drains buffered database writes.
+        """
+        self.db_manager.close()
+
     def log_pv_power(self, kwargs):
         """
         Periodically logs the current PV production value to the database with a timestamp.
@@ -1,7 +1,141 @@
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+# Time steps processed per chunk by BatteryFleet.run()
+DEFAULT_CHUNK_SIZE = 1440
+
+
+class BatteryFleet:
+    """
+    Simulates many virtual batteries at once, e.g. for capacity planning. Capacity, charge,
+    efficiencies and the discharge switch are NumPy arrays with one slot per battery, and every
+    operation updates all slots in one vectorized step with the same rules as VirtualBattery.
+    """
+
+    def __init__(self, capacity_kwh=2.560, initial_charge_kwh=0.0, charge_efficiency=0.95, discharge_efficiency=0.95,
+                 size: Optional[int] = None, discharge_enabled=False):
+        """
+        Initialize the fleet. All parameters are scalars or arrays and broadcast against each other.
+        Args:
+            capacity_kwh: Total capacity per battery in kWh.
+            initial_charge_kwh: Initial charge per battery in kWh.
+            charge_efficiency: Efficiency factor for charging per battery (0 < efficiency ≤ 1).
+            discharge_efficiency: Efficiency factor for discharging per battery (0 < efficiency ≤ 1).
+            size: Number of batteries, if not given by the array parameters.
+            discharge_enabled: Whether each battery may discharge.
+        """
+        params = np.broadcast_arrays(
+            *(np.asarray(p, dtype=float) for p in (capacity_kwh, initial_charge_kwh, charge_efficiency, discharge_efficiency)),
+            np.asarray(discharge_enabled, dtype=bool),
+        )
+        shape = params[0].shape if size is None else (size,)
+        if len(shape) != 1:
+            raise ValueError("BatteryFleet parameters must be scalars or 1-D arrays")
+        capacity, charge, charge_eff, discharge_eff, enabled = (np.broadcast_to(p, shape).copy() for p in params)
+        if ((charge_eff <= 0) | (charge_eff > 1) | (discharge_eff <= 0) | (discharge_eff > 1)).any():
+            raise ValueError("Efficiencies must be in (0, 1]")
+        self.capacity = capacity  # in kWh
+        self.current_charge = np.clip(charge, 0.0, capacity)  # in kWh
+        self.charge_efficiency = charge_eff
+        self.discharge_efficiency = discharge_eff
+        self.discharge_enabled = enabled
+
+    def __len__(self):
+        return len(self.capacity)
+
+    def charge(self, amount_kwh) -> np.ndarray:
+        """
+        Charge all batteries by the specified amounts (in kWh), considering charge efficiency and not exceeding capacity.
+        Returns the energy each battery took from the source (kWh).
+        """
+        amount = np.maximum(np.asarray(amount_kwh, dtype=float), 0.0)
+        stored = np.minimum(amount * self.charge_efficiency, self.capacity - self.current_charge)
+        self.current_charge += stored
+        return stored / self.charge_efficiency
+
+    def discharge(self, amount_kwh) -> np.ndarray:
+        """
+        Discharge all batteries by the specified amounts (in kWh), considering discharge efficiency and not going below zero.
+        Batteries with discharging disabled deliver nothing. Returns the actual discharged energy (kWh).
+        """
+        amount = np.maximum(np.asarray(amount_kwh, dtype=float), 0.0)
+        discharged = np.where(self.discharge_enabled, np.minimum(self.current_charge, amount / self.discharge_efficiency), 0.0)
+        self.current_charge -= discharged
+        return discharged * self.discharge_efficiency
+
+    def step(self, net_kwh) -> np.ndarray:
+        """
+        Apply one time step of energy flows: a positive net amount (PV surplus) charges, a negative one (deficit)
+        discharges. Returns the net energy the batteries absorbed (kWh), negative where they delivered.
+        """
+        net = np.asarray(net_kwh, dtype=float)
+        return self.charge(net) - self.discharge(-net)
+
+    def run(self, net_kwh: Union[np.ndarray, Iterable[np.ndarray]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+            record: bool = False) -> dict:
+        """
+        Simulate a series of time steps.
+
+        Args:
+            net_kwh: Net energy per step and battery (PV surplus positive, deficit negative), either one array of
+                shape (T, N) or (T,) (one trace for all batteries), or an iterable of such chunks, e.g. read from the
+                database piece by piece.
+            chunk_size: Steps per chunk when net_kwh is a single array.
+            record: Keep the charge of every battery after every step (T x N floats).
+
+        Returns:
+            dict: Totals per battery (arrays of shape (N,), kWh): "charged" (taken from PV), "delivered" (to the
+            household), "import" (deficit left for the grid), "export" (surplus left for the grid), plus "steps"
+            and, if recorded, "charge" of shape (T, N).
+        """
+        if isinstance(net_kwh, np.ndarray):
+            chunks = (net_kwh[start:start + chunk_size] for start in range(0, len(net_kwh), chunk_size))
+        else:
+            chunks = net_kwh
+        n = len(self)
+        totals = {key: np.zeros(n) for key in ("charged", "delivered", "import", "export")}
+        steps, recorded = 0, []
+        for chunk in chunks:
+            chunk = np.broadcast_to(np.asarray(chunk, dtype=float).reshape(len(chunk), -1), (len(chunk), n))
+            surplus = np.maximum(chunk, 0.0)
+            deficit = np.maximum(-chunk, 0.0)
+            charged = np.empty_like(surplus)
+            delivered = np.empty_like(deficit)
+            charges = np.empty_like(surplus) if record else None
+            for t in range(len(chunk)):
+                charged[t] = self.charge(surplus[t])
+                delivered[t] = self.discharge(deficit[t])
+                if record:
+                    charges[t] = self.current_charge
+            totals["charged"] += charged.sum(axis=0)
+            totals["delivered"] += delivered.sum(axis=0)
+            totals["export"] += (surplus - charged).sum(axis=0)
+            totals["import"] += (deficit - delivered).sum(axis=0)
+            steps += len(chunk)
+            if record:
+                recorded.append(charges)
+        totals["steps"] = steps
+        if record:
+            totals["charge"] = np.concatenate(recorded) if recorded else np.empty((0, n))
+        return totals
+
+    def get_state(self) -> dict:
+        """
+        Returns a dictionary with the current charge, capacity and percent full per battery (arrays).
+        """
+        return {
+            "current_charge_kwh": self.current_charge.copy(),
+            "capacity_kwh": self.capacity.copy(),
+            "percent_full": 100 * self.current_charge / self.capacity,
+        }
+
+
 class VirtualBattery:
     """
     Singleton class that simulates the behavior of a physical battery for use in energy management applications.
-    Provides methods for charging, discharging, and querying the battery state.
+    Provides methods for charging, discharging, and querying the battery state. It is a view over one slot of a
+    BatteryFleet, so the single battery and fleet simulations share the same model.
     """
     _instance = None
 
@@ -21,32 +155,55 @@ class VirtualBattery:
         """
         # Only initialize once
         if not hasattr(self, "_initialized"):
-            self.capacity = capacity_kwh  # in kWh
-            self.current_charge = initial_charge_kwh  # in kWh
-            self.charge_efficiency = charge_efficiency
-            self.discharge_efficiency = discharge_efficiency
-            self.discharge_enabled = False
+            self.fleet = BatteryFleet(capacity_kwh, initial_charge_kwh, charge_efficiency, discharge_efficiency, size=1)
+            self.slot = 0
             self._initialized = True
 
+    @property
+    def capacity(self) -> float:
+        return float(self.fleet.capacity[self.slot])  # in kWh
+
+    @capacity.setter
+    def capacity(self, value):
+        self.fleet.capacity[self.slot] = value
+
+    @property
+    def current_charge(self) -> float:
+        return float(self.fleet.current_charge[self.slot])  # in kWh
+
+    @current_charge.setter
+    def current_charge(self, value):
+        self.fleet.current_charge[self.slot] = value
+
+    @property
+    def charge_efficiency(self) -> float:
+        return float(self.fleet.charge_efficiency[self.slot])
+
+    @property
+    def discharge_efficiency(self) -> float:
+        return float(self.fleet.discharge_efficiency[self.slot])
+
+    @property
+    def discharge_enabled(self) -> bool:
+        return bool(self.fleet.discharge_enabled[self.slot])
+
+    def _amounts(self, amount_kwh) -> np.ndarray:
+        amounts = np.zeros(len(self.fleet))
+        amounts[self.slot] = amount_kwh
+        return amounts
+
     def charge(self, amount_kwh):
         """
         Charge the battery by the specified amount (in kWh), considering charge efficiency and not exceeding capacity.
         """
-        effective_amount = amount_kwh * self.charge_efficiency
-        self.current_charge = min(self.capacity, self.current_charge + effective_amount)
+        self.fleet.charge(self._amounts(amount_kwh))
 
     def discharge(self, amount_kwh):
         """
         Discharge the battery by the specified amount (in kWh), considering discharge efficiency and not going below zero.
         Returns the actual discharged energy.
         """
-        if not self.discharge_enabled:
-            return 0.0
-        # Only allow down to 0
-        effective_amount = amount_kwh / self.discharge_efficiency
-        discharged = min(self.current_charge, effective_amount)
-        self.current_charge -= discharged
-        return discharged * self.discharge_efficiency
+        return float(self.fleet.discharge(self._amounts(amount_kwh))[self.slot])
 
     def get_state(self):
         """
@@ -64,4 +221,4 @@ class VirtualBattery:
         Args:
             enabled: True to allow discharging, False to disable.
         """
-        self.discharge_enabled = enabled
+        self.fleet.discharge_enabled[self.slot] = enabled
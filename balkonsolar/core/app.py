@@ -9,9 +9,10 @@ import rootutils
 
 root = rootutils.setup_root(__file__, pythonpath=True)
 
-from balkonsolar.core.rules import determine_balkonsolar_state
+from balkonsolar.core.rules import RULE_STATES, determine_balkonsolar_state
 from balkonsolar.core.database_interface import DatabaseInterface
 from balkonsolar.api.grid import StromGedachtClient
+from balkonsolar.api.http_session import run
 
 def run_balkonsolar_advisor():
     """
@@ -45,19 +46,24 @@ def run_balkonsolar_advisor():
             # Use a default value for demo if no data in database
             current_solar_production = 250
 
-        current_battery_percent = battery_status.get("percent_full", 0)
+        current_battery_capacity = battery_status.get("current_charge_kwh", 0.0)
+        current_battery_percent = 100 * current_battery_capacity / max_battery_capacity
 
         # Get grid demand from API based on zip code
         print(f"\nFetching grid demand data for ZIP code {zip_code}...")
-        current_grid_demand = stromGedachtClient.get_stromgedacht_mapping_integer()
+        current_grid_demand = run(stromGedachtClient.get_stromgedacht_mapping_integer())
+        if current_grid_demand is None:
+            # Treat an unavailable API as normal operation
+            current_grid_demand = 1
 
         # Determine optimal system state
         state = determine_balkonsolar_state(
-            current_grid_demand,
-            current_solar_production,
-            current_battery_percent,
-            max_solar_capacity,
-            min_battery_percent,
+            grid_demand=current_grid_demand,
+            solar_production=current_solar_production,
+            max_battery_capacity=max_battery_capacity,
+            current_battery_capacity=current_battery_capacity,
+            max_solar_capacity=max_solar_capacity,
+            min_battery_percent=min_battery_percent,
         )
 
         # Display system status and recommendation
@@ -67,7 +73,7 @@ def run_balkonsolar_advisor():
               f"({current_battery_percent:.1f}%)")
 
         print("\n===== Recommendation =====")
-        print(f"Optimal state: {state}")
+        print(f"Optimal state: {state} ({RULE_STATES[state]})")
 
 
     except ValueError as e:
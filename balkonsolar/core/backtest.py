@@ -0,0 +1,359 @@
+"""
+Historical backtesting of Balkonsolar control strategies.
+
+Measured solar_output and grid_usage history is streamed from the database and resampled to a
+fixed step (each sample is held until the next one, as in the rollups; gaps longer than
+max_gap count as missing). The history is then replayed through the VirtualBattery model for
+every strategy and scored with the same KPIs: self-consumption, autarky, energy shifted out of
+"reduce consumption" windows (StromGedacht state 3 or 4) and equivalent full cycles.
+
+A strategy is compiled up front into a per-step key array and a decision table that maps
+(key, battery level) to a battery mode, so the replay is a tight scalar loop over precomputed
+arrays: a year at one-minute resolution (525,600 steps) replays in about a second.
+
+Run with: python -m balkonsolar.core.backtest [--days 365] [--step 1min] [--db path]
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.mpc import soc_trajectory
+from balkonsolar.core.planner import build_schedule
+from balkonsolar.core.rollups import DEFAULT_MAX_GAP
+from balkonsolar.core.rules import CHARGE_BATTERY as RULE_CHARGE
+from balkonsolar.core.rules import USE_BATTERY as RULE_USE_BATTERY
+from balkonsolar.core.rules import BATTERY_FILLED_BIT, BATTERY_LOW_BIT, USE_GRID, USE_SOLAR, default_table, rule_index
+from balkonsolar.core.schedule import CHARGE_BATTERY, MIXED, STATES, USE_BATTERY
+
+# Battery modes of one step
+IDLE = 0  # neither charge nor discharge
+CHARGE = 1  # charge from PV surplus
+DISCHARGE = 2  # cover the household deficit from the battery
+AUTO = 3  # both, whichever applies (plain self-consumption)
+
+# Battery levels a decision table distinguishes: below the low threshold, in between, filled
+LOW, MID, FILLED = 0, 1, 2
+
+# rules.py states -> battery mode
+RULE_MODES = {USE_SOLAR: IDLE, RULE_CHARGE: CHARGE, RULE_USE_BATTERY: DISCHARGE, USE_GRID: IDLE}
+
+# StromGedacht states that ask to reduce consumption
+REDUCE_STATES = (3, 4)
+
+# Default battery, as in VirtualBattery
+CAPACITY = 2560.0  # Wh
+CHARGE_EFFICIENCY = 0.95
+DISCHARGE_EFFICIENCY = 0.95
+
+Strategy = namedtuple("Strategy", ["keys", "table", "low", "high"])
+Strategy.__doc__ = """
+A control strategy compiled for replay().
+
+    keys: Row of the decision table per step, int array of shape (T,).
+    table: Battery mode per (key, level), int array of shape (K, 3) for the levels LOW, MID, FILLED.
+    low: State of charge fraction below which the battery counts as LOW.
+    high: State of charge fraction from which the battery counts as FILLED.
+"""
+
+
+def _seconds(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Naive local datetimes as integer seconds.
+    """
+    return np.asarray(timestamps, dtype="datetime64[s]").astype(np.int64)
+
+
+def _resample(db: DatabaseInterface, table: str, grid: np.ndarray, max_gap: int) -> np.ndarray:
+    """
+    Power samples of a table held until the next sample, at the grid's seconds; NaN where the
+    last sample is missing or older than max_gap.
+    """
+    start = pd.Timestamp(int(grid[0]) - max_gap, unit="s").to_pydatetime()
+    end = pd.Timestamp(int(grid[-1]), unit="s").to_pydatetime()
+    chunks = list(db.iter_history(table, start, end, output="numpy"))
+    if not chunks:
+        return np.full(len(grid), np.nan)
+    seconds = np.concatenate([_seconds(chunk["timestamp"]) for chunk in chunks])
+    values = np.concatenate([np.asarray(chunk["value"], dtype=float) for chunk in chunks])
+    last = np.searchsorted(seconds, grid, side="right") - 1
+    held = values[np.maximum(last, 0)]
+    age = grid - seconds[np.maximum(last, 0)]
+    return np.where((last >= 0) & (age <= max_gap), held, np.nan)
+
+
+def load_history(db: DatabaseInterface, start: datetime, end: datetime, step: str = "1min",
+                 max_gap: int = DEFAULT_MAX_GAP, grid_state: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Load measured history resampled to a fixed step.
+
+    grid_usage is the household meter reading with PV already subtracted (negative = feed-in),
+    so the household consumption is grid_usage + solar_output.
+
+    Args:
+        db: Database to read from.
+        start: First step (local time).
+        end: End of the range (local time, exclusive).
+        step: Step as a pandas frequency, e.g. "1min" or "15min".
+        max_gap: Longest time (seconds) a sample is held; later steps count as missing.
+        grid_state: Optional StromGedacht state per hour; defaults to grid_usage_forecast
+            (which only holds the latest forecast), missing hours get state 0.
+
+    Returns:
+        pd.DataFrame: pv and usage (Wh per step), grid_state and valid (both series measured)
+        per step, indexed by time.
+    """
+    index = pd.date_range(start, end, freq=step, inclusive="left")
+    if len(index) == 0:
+        return pd.DataFrame(columns=["pv", "usage", "grid_state", "valid"])
+    grid = _seconds(index.values)
+    step_hours = pd.Timedelta(step) / pd.Timedelta(hours=1)
+
+    pv_w = np.maximum(_resample(db, "solar_output", grid, max_gap), 0.0)
+    meter_w = _resample(db, "grid_usage", grid, max_gap)
+    valid = ~(np.isnan(pv_w) | np.isnan(meter_w))
+    pv = np.where(valid, pv_w, 0.0) * step_hours
+    usage = np.where(valid, np.maximum(meter_w + pv_w, 0.0), 0.0) * step_hours
+
+    if grid_state is None:
+        forecast = db.get_history("grid_usage_forecast")
+        if isinstance(forecast, pd.DataFrame) and not forecast.empty:
+            grid_state = pd.Series(forecast["grid_state"].to_numpy(dtype=float),
+                                   index=pd.to_datetime(forecast["timestamp"].astype(str).str.slice(0, 19)))
+    if grid_state is not None and len(grid_state):
+        grid_state = grid_state[~grid_state.index.duplicated(keep="last")]
+        states = grid_state.reindex(index.floor("h")).fillna(0).to_numpy()
+    else:
+        states = np.zeros(len(index))
+
+    return pd.DataFrame({"pv": pv, "usage": usage, "grid_state": states.astype(int), "valid": valid}, index=index)
+
+
+def self_consumption_strategy(history: pd.DataFrame) -> Strategy:
+    """
+    Charge from every surplus and discharge into every deficit.
+    """
+    return Strategy(np.zeros(len(history), dtype=np.int64), np.full((1, 3), AUTO), 0.0, 1.0)
+
+
+def rules_strategy(history: pd.DataFrame, max_solar_capacity: float, battery_high_threshold: float = 0.8,
+                   min_battery_percent: float = 0.25, table: Optional[np.ndarray] = None) -> Strategy:
+    """
+    The decision table of rules.py. The grid and solar bits are computed for all steps at once;
+    the battery bits follow from the replayed state of charge (min_battery_percent is assumed
+    to be below battery_high_threshold).
+
+    Args:
+        history: Output of load_history().
+        max_solar_capacity: Peak PV power (W); solar counts as high above half of it.
+        battery_high_threshold: Fraction from which the battery counts as filled.
+        min_battery_percent: Fraction below which the battery counts as low.
+        table: Decision table of rules.py (default: rules.default_table()).
+    """
+    table = default_table() if table is None else table
+    step_hours = (history.index[1] - history.index[0]) / pd.Timedelta(hours=1) if len(history) > 1 else 1.0
+    solar_w = history["pv"].to_numpy() / step_hours
+    # Battery in between both thresholds, so only the grid and solar bits are set
+    middle = (battery_high_threshold + min_battery_percent) / 2
+    keys = rule_index(history["grid_state"].to_numpy(), solar_w, 1.0, middle, max_solar_capacity,
+                      battery_high_threshold, min_battery_percent).astype(np.int64) >> 2
+    rows = np.arange(4)[:, np.newaxis] << 2
+    states = table[rows | np.array([BATTERY_LOW_BIT, 0, BATTERY_FILLED_BIT])]
+    modes = np.vectorize(RULE_MODES.get)(states)
+    return Strategy(keys, modes, min_battery_percent, battery_high_threshold)
+
+
+def schedule_strategy(history: pd.DataFrame, schedule: pd.DataFrame) -> Strategy:
+    """
+    Follow an hourly schedule in the output_algorithm format: charge in "charge battery" and
+    "mixed" hours, discharge in "use battery" hours, otherwise leave the battery alone.
+
+    Args:
+        history: Output of load_history().
+        schedule: timestamp and suggested_state per hour.
+    """
+    labels = pd.Series(schedule["suggested_state"].to_numpy(), index=pd.to_datetime(schedule["timestamp"]))
+    labels = labels[~labels.index.duplicated(keep="last")]
+    codes = {label: code for code, label in enumerate(STATES)}
+    keys = labels.map(codes).reindex(history.index.floor("h")).fillna(len(STATES)).to_numpy(dtype=np.int64)
+    modes = np.full(len(STATES) + 1, IDLE)
+    modes[[CHARGE_BATTERY, MIXED]] = CHARGE
+    modes[USE_BATTERY] = DISCHARGE
+    return Strategy(keys, np.repeat(modes[:, np.newaxis], 3, axis=1), 0.0, 1.0)
+
+
+def planner_strategy(history: pd.DataFrame, scheduler: Optional[Any] = None, capacity: float = CAPACITY,
+                     initial_charge: float = 0.0, horizon: int = 24) -> Strategy:
+    """
+    Plan consecutive horizons with a planning backend on the measured hourly energy (perfect
+    foresight) and follow the plans, carrying the planned state of charge from one horizon to
+    the next.
+
+    Args:
+        history: Output of load_history().
+        scheduler: Backend with a plan() method, e.g. a DPScheduler (default: the greedy plan).
+        capacity: Battery capacity (Wh).
+        initial_charge: State of charge at the start (Wh).
+        horizon: Hours per plan.
+    """
+    hourly = history[["usage", "pv"]].resample("h").sum().rename(columns={"pv": "pv_prod"})
+    hourly["grid_state"] = history["grid_state"].resample("h").first()
+    efficiencies = (getattr(scheduler, "charge_efficiency", 1.0), getattr(scheduler, "discharge_efficiency", 1.0))
+    plans, soc = [], initial_charge
+    for first in range(0, len(hourly), horizon):
+        plan = build_schedule(hourly.iloc[first:first + horizon], capacity, soc, scheduler)
+        plans.append(plan)
+        soc = float(soc_trajectory(soc, plan["battery_input"].to_numpy(), capacity, *efficiencies)[-1])
+    return schedule_strategy(history, pd.concat(plans, ignore_index=True))
+
+
+def replay(history: pd.DataFrame, strategy: Strategy, capacity: float = CAPACITY, initial_charge: float = 0.0,
+           charge_efficiency: float = CHARGE_EFFICIENCY, discharge_efficiency: float = DISCHARGE_EFFICIENCY,
+           ) -> Dict[str, Any]:
+    """
+    Replay history through the battery model with a strategy.
+
+    The battery behaves like VirtualBattery: charging stores charge_efficiency of the PV surplus
+    it takes, discharging delivers discharge_efficiency of what it gives up, within 0..capacity.
+
+    Args:
+        history: Output of load_history().
+        strategy: Compiled strategy.
+        capacity: Battery capacity (Wh).
+        initial_charge: State of charge at the start (Wh).
+        charge_efficiency: Fraction of charged energy that ends up in the battery.
+        discharge_efficiency: Fraction of discharged energy that reaches the household.
+
+    Returns:
+        dict: The KPIs (see kpis()) and "soc", the state of charge after every step (Wh).
+    """
+    surplus = (history["pv"].to_numpy() - history["usage"].to_numpy()).tolist()
+    keys = strategy.keys.tolist()
+    table = strategy.table.tolist()
+    low, high = strategy.low * capacity, strategy.high * capacity
+    reduce = np.isin(history["grid_state"].to_numpy(), REDUCE_STATES).tolist()
+
+    soc = float(initial_charge)
+    trajectory = [0.0] * len(surplus)
+    charged = delivered = shifted = 0.0
+    for t, extra in enumerate(surplus):
+        mode = table[keys[t]][LOW if soc < low else FILLED if soc >= high else MID]
+        if extra > 0:
+            if mode == CHARGE or mode == AUTO:
+                taken = min(extra, (capacity - soc) / charge_efficiency)
+                soc += taken * charge_efficiency
+                charged += taken
+        elif extra < 0 and (mode == DISCHARGE or mode == AUTO):
+            given = min(-extra, soc * discharge_efficiency)
+            soc -= given / discharge_efficiency
+            delivered += given
+            if reduce[t]:
+                shifted += given
+        trajectory[t] = soc
+
+    soc_array = np.array(trajectory)
+    result = kpis(history, charged, delivered, shifted, capacity, discharge_efficiency)
+    result["final_charge"] = soc_array[-1] if len(soc_array) else float(initial_charge)
+    result["soc"] = soc_array
+    return result
+
+
+def kpis(history: pd.DataFrame, charged: float, delivered: float, shifted: float,
+         capacity: float = CAPACITY, discharge_efficiency: float = DISCHARGE_EFFICIENCY) -> Dict[str, float]:
+    """
+    Score a replay.
+
+    Args:
+        history: Output of load_history().
+        charged: PV energy taken into the battery (Wh).
+        delivered: Energy the battery delivered to the household (Wh).
+        shifted: Part of delivered within reduce consumption windows (Wh).
+        capacity: Battery capacity (Wh).
+        discharge_efficiency: Fraction of discharged energy that reaches the household.
+
+    Returns:
+        dict: pv_kwh, usage_kwh, import_kwh, export_kwh, self_consumption and autarky
+        (fractions), shifted_kwh, reduce_import_kwh (grid import left in reduce windows) and
+        cycles (equivalent full cycles).
+    """
+    pv = history["pv"].to_numpy()
+    usage = history["usage"].to_numpy()
+    surplus = pv - usage
+    reduce = np.isin(history["grid_state"].to_numpy(), REDUCE_STATES)
+    # Without a battery every surplus is exported and every deficit imported
+    export = np.maximum(surplus, 0.0).sum() - charged
+    grid_import = np.maximum(-surplus, 0.0).sum() - delivered
+    pv_total, usage_total = pv.sum(), usage.sum()
+    return {
+        "pv_kwh": pv_total / 1000,
+        "usage_kwh": usage_total / 1000,
+        "import_kwh": grid_import / 1000,
+        "export_kwh": export / 1000,
+        "self_consumption": (pv_total - export) / pv_total if pv_total > 0 else 0.0,
+        "autarky": (usage_total - grid_import) / usage_total if usage_total > 0 else 0.0,
+        "shifted_kwh": shifted / 1000,
+        "reduce_import_kwh": (np.maximum(-surplus, 0.0)[reduce].sum() - shifted) / 1000,
+        "cycles": delivered / discharge_efficiency / capacity if capacity > 0 else 0.0,
+    }
+
+
+def compare(history: pd.DataFrame, strategies: Dict[str, Callable[[pd.DataFrame], Strategy]],
+            capacity: float = CAPACITY, initial_charge: float = 0.0) -> pd.DataFrame:
+    """
+    Replay several strategies on the same history.
+
+    Args:
+        history: Output of load_history().
+        strategies: Name -> function compiling the strategy for the history.
+        capacity: Battery capacity (Wh).
+        initial_charge: State of charge at the start (Wh).
+
+    Returns:
+        pd.DataFrame: KPIs per strategy plus the time to compile and replay it in milliseconds.
+    """
+    rows = {}
+    for name, build in strategies.items():
+        begin = time.perf_counter()
+        result = replay(history, build(history), capacity, initial_charge)
+        result.pop("soc")
+        result["ms"] = (time.perf_counter() - begin) * 1000
+        rows[name] = result
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def main(argv=None):
+    """
+    Backtest the rules, the planner backends and plain self-consumption on recent history.
+    """
+    parser = argparse.ArgumentParser(description="Backtest Balkonsolar control strategies on measured history.")
+    parser.add_argument("--days", type=int, default=30, help="Days of history to replay")
+    parser.add_argument("--step", default="1min", help="Replay step as a pandas frequency")
+    parser.add_argument("--max-solar", type=float, default=800.0, help="Peak PV power (W) for the rules")
+    parser.add_argument("--db", default=None, help="Database path (default: the configured database)")
+    args = parser.parse_args(argv)
+
+    from balkonsolar.core.dp_schedule import DPScheduler
+
+    db = DatabaseInterface(args.db)
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    try:
+        history = load_history(db, end - timedelta(days=args.days), end, args.step)
+    finally:
+        db.close()
+    print(f"{len(history)} steps, {history['valid'].mean():.1%} measured")
+    results = compare(history, {
+        "self consumption": self_consumption_strategy,
+        "rules": lambda h: rules_strategy(h, args.max_solar),
+        "greedy plan": planner_strategy,
+        "dp plan": lambda h: planner_strategy(h, DPScheduler()),
+    })
+    print(results.to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
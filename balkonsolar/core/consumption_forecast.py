@@ -0,0 +1,330 @@
+"""
+Online household consumption forecast for Balkonsolar.
+
+The household consumption (grid_usage, the meter reading with PV already subtracted, plus
+solar_output) is learned per quarter-hour of the day and day type (WT, SA, FT as in the
+standard profile) as an exponentially weighted mean and variance. Every completed quarter-hour
+updates one cell in O(1), either from the 15-minute rollups (catch_up) or from live samples
+(add_sample); the 3 × 96 state is persisted in the consumption_forecast table. A forecaster
+without state is warm-started from the existing rollups in one vectorized pass.
+
+Forecasts shrink every cell towards the BDEW standard profile (scaled to the household's learned
+level) in proportion to how little data the cell has, so a new installation starts with the
+profile and moves to its own pattern as history accumulates.
+"""
+import sqlite3
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core import rollups
+from balkonsolar.core.resample import to_seconds
+from balkonsolar.utils.read_average_energy_consumption import (
+    DAY_TYPES,
+    QUARTER_HOURS,
+    day_type_codes,
+    load_profile,
+)
+
+# Samples (days of a day type) after which an observation counts half
+HALFLIFE = 8.0
+
+# Weight of the standard profile in samples; a cell with this many samples is half learned
+PRIOR_WEIGHT = 4.0
+
+# Minimum grid_usage samples in a 15-minute rollup bucket for it to be learned from
+MIN_BUCKET_SAMPLES = 10
+
+# Gaps between live samples longer than this (seconds) are not integrated
+MAX_GAP = rollups.DEFAULT_MAX_GAP
+
+QUARTER = 15 * 60  # seconds
+
+
+def ensure_forecast_tables(conn: sqlite3.Connection):
+    """
+    Create the consumption_forecast state tables if they do not exist.
+
+    Args:
+        conn: Open database connection.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS consumption_forecast (
+            day_type INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            variance REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day_type, slot)
+        ) WITHOUT ROWID
+        """
+    )
+    # Start of the last quarter-hour folded into the state
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS consumption_forecast_state (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            last_bucket TEXT,
+            halflife REAL NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+
+def _cells(seconds: np.ndarray, holidays=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Day type and quarter-hour of the day per timestamp (seconds on the local wall clock).
+    """
+    codes = day_type_codes(seconds.astype("datetime64[s]"), holidays).astype(np.int64)
+    return codes, (seconds % 86400) // QUARTER
+
+
+class ConsumptionForecaster:
+    """
+    Exponentially weighted consumption statistics per (day type, quarter-hour), in Wh per quarter-hour.
+    """
+
+    def __init__(self, halflife: float = HALFLIFE, prior_weight: float = PRIOR_WEIGHT, holidays=None):
+        """
+        Initialize an empty forecaster.
+
+        Args:
+            halflife: Samples of a cell after which an observation counts half.
+            prior_weight: Weight of the standard profile in samples.
+            holidays: Holiday dates for the day types (default: Baden-Württemberg).
+        """
+        self.halflife = halflife
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        self.prior_weight = prior_weight
+        self.holidays = holidays
+        shape = (len(DAY_TYPES), QUARTER_HOURS)
+        self.mean = np.zeros(shape)
+        self.variance = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.last_bucket: Optional[int] = None  # seconds
+        # Live samples: open quarter-hour and the last sample, see add_sample()
+        self._open_bucket: Optional[int] = None
+        self._open_energy = 0.0
+        self._open_covered = 0
+        self._last_sample: Optional[Tuple[int, float]] = None
+
+    def update(self, bucket_start: datetime, energy_wh: float):
+        """
+        Fold one completed quarter-hour into its cell in O(1).
+
+        Args:
+            bucket_start: Start of the quarter-hour (local time).
+            energy_wh: Household consumption in that quarter-hour (Wh).
+        """
+        self._update_cell(int(to_seconds([bucket_start])[0]), energy_wh)
+
+    def _update_cell(self, second: int, energy_wh: float):
+        day_types, slots = _cells(np.array([second]), self.holidays)
+        day_type, slot = int(day_types[0]), int(slots[0])
+        count = self.count[day_type, slot] + 1
+        rate = max(self.alpha, 1.0 / count)
+        delta = energy_wh - self.mean[day_type, slot]
+        self.mean[day_type, slot] += rate * delta
+        self.variance[day_type, slot] = (1.0 - rate) * (self.variance[day_type, slot] + rate * delta * delta)
+        self.count[day_type, slot] = count
+        self.last_bucket = second if self.last_bucket is None else max(self.last_bucket, second)
+
+    def add_sample(self, timestamp: datetime, watts: float):
+        """
+        Feed one live consumption sample. Power is held until the next sample as in the rollups
+        (not across gaps longer than MAX_GAP), and a quarter-hour is folded in with update() as
+        soon as a sample after it arrives.
+
+        Args:
+            timestamp: Sample time (local time).
+            watts: Household consumption power (W).
+        """
+        second = int(to_seconds([timestamp])[0])
+        if self._last_sample is not None:
+            previous, value = self._last_sample
+            if 0 < second - previous <= MAX_GAP:
+                while previous < second:
+                    boundary = min(second, previous - previous % QUARTER + QUARTER)
+                    self._integrate(previous, boundary, value)
+                    previous = boundary
+        if self._open_bucket is not None and second >= self._open_bucket + QUARTER:
+            self._close_bucket()
+        self._last_sample = (second, float(watts))
+
+    def _integrate(self, start: int, end: int, watts: float):
+        bucket = start - start % QUARTER
+        if bucket != self._open_bucket:
+            self._close_bucket()
+            self._open_bucket = bucket
+        self._open_energy += watts * (end - start) / 3600.0
+        self._open_covered += end - start
+
+    def _close_bucket(self):
+        # Quarter-hours with short gaps are extrapolated to the full quarter, sparse ones dropped
+        if self._open_bucket is not None and self._open_covered >= MIN_BUCKET_SAMPLES * 60:
+            self._update_cell(self._open_bucket, self._open_energy * QUARTER / self._open_covered)
+        self._open_bucket, self._open_energy, self._open_covered = None, 0.0, 0
+
+    def warm_start(self, timestamps, energy_wh) -> int:
+        """
+        Build the state from history in one vectorized pass; gives the same means as calling
+        update() for every quarter-hour in order.
+
+        Args:
+            timestamps: Quarter-hour starts (local time), ascending.
+            energy_wh: Consumption per quarter-hour (Wh).
+
+        Returns:
+            int: Number of quarter-hours used.
+        """
+        seconds = to_seconds(timestamps)
+        values = np.asarray(energy_wh, dtype=float)
+        keep = ~np.isnan(values)
+        seconds, values = seconds[keep], values[keep]
+        if len(values) == 0:
+            return 0
+        day_types, slots = _cells(seconds, self.holidays)
+        cells = day_types * QUARTER_HOURS + slots
+
+        # Group by cell, keeping time order within a cell
+        order = np.argsort(cells, kind="stable")
+        cells, values = cells[order], values[order]
+        first = np.searchsorted(cells, cells, side="left")
+        rank = np.arange(len(cells)) - first
+        rates = np.maximum(self.alpha, 1.0 / (rank + 1))
+
+        # Weight of sample i: rate_i times the product of (1 - rate_j) of the later samples j in its cell
+        decay = np.log1p(-np.where(rank == 0, 0.0, rates))
+        running = np.cumsum(decay)
+        last = np.searchsorted(cells, cells, side="right") - 1
+        weights = rates * np.exp(running[last] - running)
+
+        size = len(DAY_TYPES) * QUARTER_HOURS
+        counts = np.bincount(cells, minlength=size)
+        mean = np.bincount(cells, weights=weights * values, minlength=size)
+        variance = np.bincount(cells, weights=weights * (values - mean[cells]) ** 2, minlength=size)
+        self.mean = mean.reshape(self.mean.shape)
+        self.variance = variance.reshape(self.variance.shape)
+        self.count = counts.reshape(self.count.shape)
+        self.last_bucket = int(seconds.max())
+        return len(values)
+
+    def effective_count(self) -> np.ndarray:
+        """
+        Effective number of samples per cell (the count, capped at the EW window).
+        """
+        return np.minimum(self.count, (2.0 - self.alpha) / self.alpha)
+
+    def forecast(self, start: datetime, periods: int, resolution_minutes: int = 60) -> np.ndarray:
+        """
+        Expected consumption per slot.
+
+        Args:
+            start: Start of the first slot (local time).
+            periods: Number of slots.
+            resolution_minutes: Slot length in minutes (a multiple of 15, or 5).
+
+        Returns:
+            np.ndarray: Consumption per slot (Wh).
+        """
+        quarters = max(resolution_minutes // 15, 1)
+        first = int(to_seconds([pd.Timestamp(start).floor("min")])[0])
+        starts = first + np.arange(periods) * resolution_minutes * 60
+        seconds = (starts[:, np.newaxis] + np.arange(quarters) * QUARTER).ravel()
+        day_types, slots = _cells(seconds, self.holidays)
+        months = seconds.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) % 12
+
+        # Standard profile (average W per quarter-hour -> Wh), scaled to the learned level
+        profile = load_profile()
+        prior = np.asarray(profile[months, day_types, slots]) * 0.25
+        weight = self.effective_count()
+        month = int(months[0])
+        learned = (weight * self.mean).sum()
+        reference = (weight * np.asarray(profile[month]) * 0.25).sum()
+        if learned > 0 and reference > 0:
+            prior = prior * learned / reference
+
+        cell_weight = weight[day_types, slots]
+        values = (cell_weight * self.mean[day_types, slots] + self.prior_weight * prior) / (cell_weight + self.prior_weight)
+        # Slots shorter than a quarter-hour get their share of it
+        return values.reshape(periods, quarters).sum(axis=1) * min(resolution_minutes, 15) / 15
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, **kwargs) -> "ConsumptionForecaster":
+        """
+        Load the persisted state (an empty forecaster if there is none).
+
+        Args:
+            conn: Open database connection.
+            kwargs: Passed to the constructor; the persisted halflife wins.
+        """
+        ensure_forecast_tables(conn)
+        state = conn.execute("SELECT last_bucket, halflife FROM consumption_forecast_state WHERE id = 0").fetchone()
+        if state is not None:
+            kwargs["halflife"] = state[1]
+        forecaster = cls(**kwargs)
+        if state is not None and state[0] is not None:
+            forecaster.last_bucket = int(to_seconds([state[0]])[0])
+        for day_type, slot, mean, variance, count in conn.execute(
+            "SELECT day_type, slot, mean, variance, count FROM consumption_forecast"
+        ):
+            forecaster.mean[day_type, slot] = mean
+            forecaster.variance[day_type, slot] = variance
+            forecaster.count[day_type, slot] = count
+        return forecaster
+
+    def save(self, conn: sqlite3.Connection):
+        """
+        Persist the state (288 rows) in one transaction.
+
+        Args:
+            conn: Open database connection.
+        """
+        ensure_forecast_tables(conn)
+        day_types, slots = np.indices(self.mean.shape)
+        rows = zip(day_types.ravel().tolist(), slots.ravel().tolist(), self.mean.ravel().tolist(),
+                   self.variance.ravel().tolist(), self.count.ravel().tolist())
+        last_bucket = None if self.last_bucket is None else str(pd.Timestamp(self.last_bucket, unit="s"))
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO consumption_forecast (day_type, slot, mean, variance, count) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO consumption_forecast_state (id, last_bucket, halflife) VALUES (0, ?, ?)",
+                (last_bucket, self.halflife),
+            )
+
+    def catch_up(self, conn: sqlite3.Connection, now: Optional[datetime] = None) -> int:
+        """
+        Fold completed quarter-hours from the 15-minute rollups that are newer than the state.
+        Without any state, all available history is used in one warm_start().
+
+        Args:
+            conn: Open database connection.
+            now: Current time; the running quarter-hour is left out (default: now).
+
+        Returns:
+            int: Number of quarter-hours folded in.
+        """
+        rollups.refresh_rollups(conn, ("grid_usage", "solar_output"))
+        current = pd.Timestamp(now or datetime.now()).floor("15min")
+        start = None if self.last_bucket is None else str(pd.Timestamp(self.last_bucket + QUARTER, unit="s"))
+        end = str(current - pd.Timedelta(minutes=15))
+        grid = rollups.query_rollup(conn, "grid_usage", "15min", start_time=start, end_time=end)
+        solar = {r["timestamp"]: r["energy_wh"] for r in rollups.query_rollup(conn, "solar_output", "15min", start_time=start, end_time=end)}
+        buckets = [(r["timestamp"], r["energy_wh"] + max(solar.get(r["timestamp"], 0.0), 0.0))
+                   for r in reversed(grid) if r["samples"] >= MIN_BUCKET_SAMPLES]
+        if not buckets:
+            return 0
+        timestamps = pd.to_datetime([bucket for bucket, _ in buckets])
+        energy = np.maximum([value for _, value in buckets], 0.0)
+        if self.last_bucket is None and not self.count.any():
+            return self.warm_start(timestamps, energy)
+        for timestamp, value in zip(timestamps, energy):
+            self.update(timestamp, float(value))
+        return len(buckets)
@@ -1,11 +1,25 @@
+import hashlib
 import sqlite3
 import os
 import datetime
+import queue
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, Iterator, List, Optional, Any
 import pandas as pd
 from dotenv import load_dotenv
 
+from balkonsolar.core.schema_catalog import TELEMETRY_SIGNALS, SchemaCatalog, TableInfo, epoch_table_sql
+from balkonsolar.core import pv_correction, rollups, streaming
+from balkonsolar.core.consumption_forecast import ConsumptionForecaster
+from balkonsolar.core.pv_correction import PVBiasCorrector
+from balkonsolar.core.resample import to_seconds
+from balkonsolar.core.hot_tier import DEFAULT_MAXLEN, HotTier
+from balkonsolar.core.timestamps import (
+    TIMESTAMP_FORMAT, from_epoch, now_timestamp, time_bound, to_epoch, to_epoch_series, to_local_datetime,
+)
+
 load_dotenv(dotenv_path="balkonsolar/.env")
 
 """
@@ -13,20 +27,46 @@ Database interface for Balkonsolar project.
 
 Provides methods to access, store, and manage energy data (battery, solar, grid, forecasts) in a SQLite database.
 Handles database path resolution, table existence checks, and integrates with pandas for DataFrame operations.
+Optionally keeps one long-lived WAL connection per thread (pooled mode) instead of reconnecting for every call,
+and an in-memory hot tier that serves the latest readings from RAM while a writer thread persists them.
 """
 
+# Pragmas applied to every pooled connection. WAL lets the dashboard and planner read while
+# the AppDaemon loggers write, and synchronous=NORMAL is durable enough in WAL mode.
+POOLED_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -8000,  # negative = KiB, i.e. 8 MB page cache per connection
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms to wait on a locked database before failing
+}
+
+# Number of compiled statements sqlite3 keeps per connection. All queries below use constant
+# SQL text per table, so a long-lived connection re-uses them instead of re-preparing.
+STATEMENT_CACHE_SIZE = 256
+
 class DatabaseInterface:
     """
     Interface for accessing and managing energy data in the shared SQLite database.
     Provides methods for reading and writing battery, solar, grid, and forecast data.
     """
 
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, pooled: bool = False, update_rollups: bool = False,
+                 hot_tier: bool = False, hot_tier_size: int = DEFAULT_MAXLEN):
         """
         Initialize the database interface.
 
         Args:
             db_path: Optional path to the database. If None, tries to find the default path in common locations.
+            pooled: If True, keep one reusable WAL connection per thread instead of opening a new
+                connection for every call. Call close() when done.
+            update_rollups: If True, store_value() also folds the new sample into the rollup tables.
+            hot_tier: If True, latest values and recent history are served from the process-wide
+                HotTier, and store_value() only queues the sample for a background writer thread.
+                Samples without a timestamp are stamped with the local time. Call flush() or
+                close() to make sure queued samples are on disk.
+            hot_tier_size: Samples kept in RAM per table (hot tier mode only).
         """
         if db_path is None:
             # Try to find the database in common locations
@@ -54,16 +94,126 @@ class DatabaseInterface:
                 os.makedirs(data_dir, exist_ok=True)
 
         self.db_path = db_path
+        self.pooled = pooled
+        self.update_rollups = update_rollups
+        # Rollup tables are created on the first folded sample, not on every write
+        self._rollup_tables_ready = False
+        self._local = threading.local()
+        self._pool: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        # Schema metadata: one catalog per pooled connection, or one shared catalog otherwise
+        self._catalog = SchemaCatalog()
+        self._catalogs: List[SchemaCatalog] = [self._catalog]
+        # Hot tier: RAM buffers in front of SQLite, persisted asynchronously by a writer thread
+        self.hot_tier = HotTier(self.db_path, maxlen=hot_tier_size) if hot_tier else None
+        self._write_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if self.hot_tier is not None:
+            self._writer = threading.Thread(target=self._persist_loop, name="DatabaseInterfaceWriter", daemon=True)
+            self._writer.start()
         print(f"DatabaseInterface initialized with database at: {self.db_path}")
 
     def _get_connection(self):
         """
         Get a database connection with row factory enabled for dict-like row access.
+        In pooled mode this returns the calling thread's long-lived connection, whose schema
+        catalog is validated on reuse (one PRAGMA schema_version read).
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        if not self.pooled:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+            conn.row_factory = sqlite3.Row
+            for pragma, value in POOLED_PRAGMAS.items():
+                conn.execute(f"PRAGMA {pragma}={value}")
+            self._local.conn = conn
+            self._local.catalog = SchemaCatalog()
+            with self._pool_lock:
+                self._pool.append(conn)
+                self._catalogs.append(self._local.catalog)
+        else:
+            self._local.catalog.validate(conn)
         return conn
 
+    def _catalog_for(self, conn: sqlite3.Connection) -> SchemaCatalog:
+        """
+        Get the schema catalog belonging to a connection returned by _get_connection().
+        """
+        if self.pooled:
+            return self._local.catalog
+        return self._catalog
+
+    def _table_info(self, conn: sqlite3.Connection, table: str) -> Optional[TableInfo]:
+        """
+        Look up cached metadata of a table, or None if it does not exist.
+        """
+        return self._catalog_for(conn).table(conn, table)
+
+    def invalidate_schema(self):
+        """
+        Drop all cached schema metadata, e.g. after a table was replaced.
+        """
+        with self._pool_lock:
+            catalogs = list(self._catalogs)
+        for catalog in catalogs:
+            catalog.invalidate()
+        self._rollup_tables_ready = False
+
+    @contextmanager
+    def _connection(self):
+        """
+        Context manager around _get_connection(). Closes the connection on exit unless it is pooled,
+        in which case a failed operation is rolled back instead.
+
+        Fresh (non-pooled) connections skip the schema_version check to save the round-trip;
+        their catalog picks up schema changes on a lookup miss or after an OperationalError
+        (e.g. "no such column"), which drops it for the next call.
+        """
+        conn = self._get_connection()
+        try:
+            yield conn
+        except Exception as e:
+            # Never leave a half-open transaction behind on a reused connection
+            if self.pooled:
+                conn.rollback()
+            if isinstance(e, sqlite3.OperationalError):
+                self._catalog_for(conn).invalidate()
+            raise
+        finally:
+            if not self.pooled:
+                conn.close()
+
+    def close(self):
+        """
+        Persist queued hot tier samples, then close all pooled connections.
+        Safe to call in non-pooled mode.
+        """
+        if self._writer is not None:
+            self.flush()
+            self._write_queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+            self._catalogs = [self._catalog]
+        for conn in pool:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Connection belongs to another thread; it is released when that thread exits
+                pass
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def get_latest_value(self, table: str) -> Optional[Dict[str, Any]]:
         """
         Get the latest value from a specific table.
@@ -74,36 +224,38 @@ class DatabaseInterface:
         Returns:
             Dictionary with the latest record or None if no data or table does not exist.
         """
+        if self.hot_tier is not None:
+            records = self._hot_latest(table)
+            if records is not None:
+                return records[0] if records else None
+
         try:
             if not os.path.exists(self.db_path):
                 return None
 
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            with self._connection() as conn:
+                # Table existence and timestamp column come from the cached schema catalog
+                info = self._table_info(conn, table)
+                if info is None:
+                    return None
+                tstamp = info.timestamp_column
+                id_column = "id" if info.has_column("id") else "NULL"
 
-            # First check if the table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
-            if not cursor.fetchone():
-                conn.close()
-                return None
-
-            cursor.execute(
-                f"SELECT id, tstamp, value FROM {table} ORDER BY tstamp DESC LIMIT 1"
-            )
-
-            row = cursor.fetchone()
-            conn.close()
+                row = conn.execute(
+                    f"SELECT {id_column} AS id, {tstamp} AS tstamp, value FROM {table} ORDER BY {tstamp} DESC LIMIT 1"
+                ).fetchone()
 
             if row:
                 return {
                     "id": row["id"],
-                    "timestamp": row["tstamp"],
+                    "timestamp": from_epoch(row["tstamp"]) if info.epoch else row["tstamp"],
                     "value": row["value"]
                 }
 
             return None
         except Exception as e:
+            # The table may have been changed by another connection; reload the schema next time
+            self.invalidate_schema()
             print(f"Error getting latest value from {table}: {e}")
             return None
 
@@ -161,46 +313,320 @@ class DatabaseInterface:
         Returns:
             List of records (dict) or DataFrame if hours is None.
         """
+        if self.hot_tier is not None:
+            if hours is not None:
+                start_time = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT)
+                records = self.hot_tier.since(table, start_time)
+                if records is not None:
+                    return records
+            self.flush()
+
         try:
             if not os.path.exists(self.db_path):
                 return []
 
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+
+                info = self._table_info(conn, table)
+                if info is None:
+                    return []
+
+                if hours is not None:
+                    # Calculate the timestamp for the start of the period
+                    start_time = time_bound(datetime.datetime.now() - datetime.timedelta(hours=hours), info.epoch)
+                    tstamp = info.timestamp_column
+                    id_column = "id" if info.has_column("id") else "NULL"
+
+                    cursor.execute(
+                        f"SELECT {id_column} AS id, {tstamp} AS tstamp, value FROM {table} WHERE {tstamp} >= ? ORDER BY {tstamp} DESC",
+                        (start_time,)
+                    )
+                    results = []
+                    for row in cursor.fetchall():
+                        results.append({
+                            "id": row["id"],
+                            "timestamp": from_epoch(row["tstamp"]) if info.epoch else row["tstamp"],
+                            "value": row["value"]
+                        })
+
+                    return results
+                elif info.epoch:
+                    # Epoch tables come back with the usual "timestamp" column as local datetimes
+                    df = pd.read_sql_query(f"SELECT * FROM {table} ORDER BY tstamp;", conn)
+                    df["tstamp"] = to_local_datetime(df["tstamp"])
+                    return df.rename(columns={"tstamp": "timestamp"})
+                else:
+                    return pd.read_sql_query(f"SELECT * FROM {table};", conn)
 
-            # First check if the table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
-            if not cursor.fetchone():
-                conn.close()
-                return []
 
-            if hours is not None:
-                # Calculate the timestamp for the start of the period
-                start_time = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
-
-                cursor.execute(
-                    f"SELECT id, tstamp, value FROM {table} WHERE tstamp >= ? ORDER BY tstamp DESC",
-                    (start_time,)
-                )
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        "id": row["id"],
-                        "timestamp": row["tstamp"],
-                        "value": row["value"]
-                    })
+        except Exception as e:
+            self.invalidate_schema()
+            print(f"Error getting history from {table}: {e}")
+            return []
 
-                conn.close()
-                return results
-            else:
-                df = pd.read_sql_query(f"SELECT * FROM {table};", conn)
-                conn.close()
-                return df
+    def iter_history(self, table: str, start_time: Optional[Any] = None, end_time: Optional[Any] = None,
+                     chunk_size: int = streaming.DEFAULT_CHUNK_SIZE, output: str = "records") -> Iterator[Any]:
+        """
+        Stream historical records of a table in timestamp order (oldest first) without loading
+        the whole range into memory. The connection stays open until the iterator is exhausted
+        or closed.
 
+        Args:
+            table: Table name to query.
+            start_time: Optional inclusive lower bound (text or datetime, local time).
+            end_time: Optional inclusive upper bound (text or datetime, local time).
+            chunk_size: Rows fetched from SQLite at a time.
+            output: "records" (one dict per row), "pandas" (one DataFrame per chunk) or
+                "numpy" (one dict of arrays per chunk).
 
+        Returns:
+            Iterator over records or chunks; empty if the table does not exist.
+
+        Raises:
+            Exception: Errors while reading or converting a chunk are logged and re-raised, so
+                a truncated stream is never mistaken for the end of the data.
+        """
+        self.flush()
+        if not os.path.exists(self.db_path):
+            return
+        try:
+            with self._connection() as conn:
+                info = self._table_info(conn, table)
+                if info is None:
+                    return
+                yield from streaming.iter_history(conn, info, start_time, end_time, chunk_size, output)
         except Exception as e:
-            print(f"Error getting history from {table}: {e}")
+            self.invalidate_schema()
+            print(f"Error streaming history from {table}: {e}")
+            raise
+
+    def get_telemetry(self, hours: Optional[int] = 24) -> pd.DataFrame:
+        """
+        Get battery, solar and grid readings aligned by timestamp.
+
+        Reads the wide telemetry table directly. Databases with separate tables are read per
+        table and pivoted into the same layout.
+
+        Args:
+            hours: Number of hours to look back (if None, returns all data).
+
+        Returns:
+            DataFrame indexed by local timestamp with one column per signal
+            (battery_storage_status, solar_output, grid_usage); missing readings are NaN.
+        """
+        self.flush()
+        empty = pd.DataFrame(columns=list(TELEMETRY_SIGNALS), index=pd.DatetimeIndex([], name="timestamp"))
+        try:
+            if not os.path.exists(self.db_path):
+                return empty
+
+            with self._connection() as conn:
+                info = self._table_info(conn, "telemetry")
+                if info is not None:
+                    query = f"SELECT tstamp AS timestamp, {', '.join(TELEMETRY_SIGNALS)} FROM telemetry"
+                    params: List[Any] = []
+                    if hours is not None:
+                        query += " WHERE tstamp >= ?"
+                        params.append(time_bound(datetime.datetime.now() - datetime.timedelta(hours=hours), info.epoch))
+                    df = pd.read_sql_query(query + " ORDER BY tstamp", conn, params=params)
+                else:
+                    frames = []
+                    for signal in TELEMETRY_SIGNALS:
+                        signal_info = self._table_info(conn, signal)
+                        if signal_info is None:
+                            continue
+                        query = f"SELECT {signal_info.timestamp_column} AS timestamp, value FROM {signal}"
+                        params = []
+                        if hours is not None:
+                            query += f" WHERE {signal_info.timestamp_column} >= ?"
+                            params.append(time_bound(datetime.datetime.now() - datetime.timedelta(hours=hours), signal_info.epoch))
+                        frame = pd.read_sql_query(query, conn, params=params)
+                        frame["signal"] = signal
+                        frames.append(frame)
+                    if not frames:
+                        return empty
+                    df = (
+                        pd.concat(frames)
+                        .pivot_table(index="timestamp", columns="signal", values="value", aggfunc="last")
+                        .reindex(columns=list(TELEMETRY_SIGNALS))
+                        .reset_index()
+                    )
+                    df.columns.name = None
+
+            df["timestamp"] = to_local_datetime(df["timestamp"])
+            return df.set_index("timestamp").sort_index()
+        except Exception as e:
+            self.invalidate_schema()
+            print(f"Error getting telemetry: {e}")
+            return empty
+
+    def get_latest_telemetry(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest battery, solar and grid readings.
+
+        Returns:
+            Dictionary with timestamp and one value per signal, or None if there is no data.
+            With separate tables each signal is the latest reading of its own table.
+        """
+        self.flush()
+        try:
+            if not os.path.exists(self.db_path):
+                return None
+
+            with self._connection() as conn:
+                info = self._table_info(conn, "telemetry")
+                if info is not None:
+                    row = conn.execute(
+                        f"SELECT tstamp, {', '.join(TELEMETRY_SIGNALS)} FROM telemetry ORDER BY tstamp DESC LIMIT 1"
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    result = {"timestamp": from_epoch(row["tstamp"]) if info.epoch else row["tstamp"]}
+                    result.update({signal: row[signal] for signal in TELEMETRY_SIGNALS})
+                    return result
+        except Exception as e:
+            self.invalidate_schema()
+            print(f"Error getting latest telemetry: {e}")
+            return None
+
+        latest = {signal: self.get_latest_value(signal) for signal in TELEMETRY_SIGNALS}
+        timestamps = [record["timestamp"] for record in latest.values() if record]
+        if not timestamps:
+            return None
+        result = {"timestamp": max(timestamps)}
+        result.update({signal: record["value"] if record else None for signal, record in latest.items()})
+        return result
+
+    def refresh_rollups(self, sources: Optional[List[str]] = None) -> int:
+        """
+        Fold raw rows added since the last run into the 15-minute, hourly and daily rollup tables.
+
+        Args:
+            sources: Raw tables to roll up (default: all telemetry tables).
+
+        Returns:
+            Number of raw rows processed.
+        """
+        self.flush()
+        try:
+            with self._connection() as conn:
+                return rollups.refresh_rollups(conn, sources or rollups.ROLLUP_SOURCES)
+        except Exception as e:
+            print(f"Error refreshing rollups: {e}")
+            return 0
+
+    def update_consumption_forecast(self, forecaster: Optional[ConsumptionForecaster] = None,
+                                    now: Optional[datetime.datetime] = None) -> Optional[ConsumptionForecaster]:
+        """
+        Bring the learned consumption forecast up to date with the completed quarter-hours of
+        grid_usage and solar_output, and persist its state if anything changed.
+
+        Args:
+            forecaster: Forecaster kept by the caller (default: load the persisted state).
+            now: Current time; the running quarter-hour is left out (default: now).
+
+        Returns:
+            The updated forecaster, or None on error.
+        """
+        self.flush()
+        try:
+            with self._connection() as conn:
+                if forecaster is None:
+                    forecaster = ConsumptionForecaster.load(conn)
+                if forecaster.catch_up(conn, now):
+                    forecaster.save(conn)
+                return forecaster
+        except Exception as e:
+            print(f"Error updating consumption forecast: {e}")
+            return None
+
+    def correct_pv_forecast(self, df: pd.DataFrame, now: Optional[datetime.datetime] = None) -> pd.DataFrame:
+        """
+        Learn the PV forecast bias from the hours measured since the last forecast and correct a
+        freshly fetched forecast (see balkonsolar/core/pv_correction.py).
+
+        Args:
+            df: Forecast with "timestamp" (period end) and "watt_hours".
+            now: Current time (default: now).
+
+        Returns:
+            The forecast with corrected "watt_hours" and the original as "watt_hours_raw";
+            uncorrected on error.
+        """
+        self.flush()
+        try:
+            with self._connection() as conn:
+                corrector = PVBiasCorrector.load(conn)
+                return corrector.ingest(conn, df, now)
+        except Exception as e:
+            print(f"Error correcting PV forecast: {e}")
+            return df.assign(watt_hours_raw=df["watt_hours"])
+
+    def get_pv_correction_table(self) -> Optional[pd.DataFrame]:
+        """
+        Get the learned PV forecast correction per season and hour of day.
+
+        Returns:
+            DataFrame with season, hour, count, forecast_mean, actual_mean and factor, or None on error.
+        """
+        try:
+            with self._connection() as conn:
+                return PVBiasCorrector.load(conn).table()
+        except Exception as e:
+            print(f"Error reading PV correction table: {e}")
+            return None
+
+    def get_pv_forecast_pairs(self, hours: int = 30 * 24) -> Optional[pd.DataFrame]:
+        """
+        Get the archived hourly PV forecasts of the last hours together with the measured energy.
+
+        Args:
+            hours: Number of hours to look back.
+
+        Returns:
+            DataFrame indexed by the hour start with forecast_wh (raw), corrected_wh (raw times
+            the current correction factor) and actual_wh, or None on error.
+        """
+        start = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT)
+        try:
+            with self._connection() as conn:
+                pairs = pv_correction.load_pairs(conn, start)
+                factors = PVBiasCorrector.load(conn).factors_at(to_seconds(pairs.index))
+            pairs["corrected_wh"] = pairs["forecast_wh"] * factors
+            return pairs
+        except Exception as e:
+            print(f"Error reading PV forecast pairs: {e}")
+            return None
+
+    def get_rollup_history(self, table: str, hours: int = 24, points: int = 48,
+                           resolution: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get aggregated history for a telemetry table at the coarsest resolution that still
+        gives at least `points` values over the requested range. Falls back to raw rows.
+
+        Args:
+            table: Raw table name (solar_output, grid_usage or battery_storage_status).
+            hours: Number of hours to look back.
+            points: Minimum number of points the caller needs.
+            resolution: Force a resolution ("15min", "hourly", "daily") instead of choosing one.
+
+        Returns:
+            List of records (dict) with timestamp, value (mean), min, max, samples and energy_wh,
+            newest first. Raw fallback records have the get_history() format.
+        """
+        resolution = resolution or rollups.choose_resolution(hours * 3600, points)
+        if resolution is None or table not in rollups.ROLLUP_SOURCES:
+            return self.get_history(table, hours)
+
+        try:
+            start_time = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+            with self._connection() as conn:
+                if self._table_info(conn, rollups.rollup_table(resolution)) is None:
+                    return self.get_history(table, hours)
+                return rollups.query_rollup(conn, table, resolution, start_time=start_time)
+        except Exception as e:
+            print(f"Error getting rollup history from {table}: {e}")
             return []
 
     def get_battery_history(self, hours: int = 24) -> List[Dict[str, Any]]:
@@ -232,6 +658,38 @@ class DatabaseInterface:
         """Get irradiation forecast"""
         return self.get_history("irradiation_data")
 
+    def table_fingerprint(self, table: str) -> Optional[tuple]:
+        """
+        Summary of a table's contents (row count and a digest of all rows in timestamp order)
+        that changes whenever any value changes, including values moving between timestamps.
+        Used to skip re-parsing forecast tables that did not change; those tables hold a few
+        hundred rows, so hashing them costs far less than rebuilding the series.
+
+        Args:
+            table: Table name.
+
+        Returns:
+            tuple or None if the table does not exist.
+        """
+        try:
+            with self._connection() as conn:
+                info = self._table_info(conn, table)
+                if info is None:
+                    return None
+                tstamp = info.timestamp_column
+                order = f' ORDER BY "{tstamp}"' if tstamp is not None else ""
+                columns = ", ".join(f'"{column}"' for column in info.columns)
+                digest = hashlib.blake2b(digest_size=16)
+                count = 0
+                for row in conn.execute(f"SELECT {columns} FROM {table}{order}"):
+                    digest.update(repr(tuple(row)).encode())
+                    count += 1
+                return count, digest.hexdigest()
+        except Exception as e:
+            self.invalidate_schema()
+            print(f"Error fingerprinting {table}: {e}")
+            return None
+
     def store_value(self, table: str, value: float, timestamp: Optional[str] = None) -> bool:
         """
         Store a value in a specific table
@@ -242,43 +700,175 @@ class DatabaseInterface:
             timestamp: Optional timestamp (if None, current time is used)
 
         Returns:
-            True if successful, False otherwise
+            True if successful (or queued in hot tier mode), False otherwise
         """
+        # Stamp now (local time, like the loggers) on every path, so the hot tier and disk hold the
+        # same timestamp and direct inserts do not fall back to the column's UTC CURRENT_TIMESTAMP
+        if timestamp is None:
+            timestamp = now_timestamp()
+        if self._writer is not None:
+            self.hot_tier.append(table, timestamp, value)
+            self._write_queue.put((table, value, timestamp))
+            return True
+
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-
-            if timestamp:
-                cursor.execute(
-                    f"INSERT INTO {table} (tstamp, value) VALUES (?, ?)",
-                    (timestamp, value)
-                )
-            else:
-                cursor.execute(
-                    f"INSERT INTO {table} (value) VALUES (?)",
-                    (value,)
-                )
-
-            conn.commit()
-            conn.close()
+            with self._connection() as conn:
+                self._insert_value(conn, table, value, timestamp)
+                if self.update_rollups and table in rollups.ROLLUP_SOURCES:
+                    self._fold_rollups(conn, (table,))
+                conn.commit()
             return True
         except Exception as e:
             print(f"Error storing value in {table}: {e}")
             return False
 
+    def _insert_value(self, conn: sqlite3.Connection, table: str, value: float, timestamp: Optional[str] = None):
+        """
+        Insert one sample without committing.
+        """
+        info = self._table_info(conn, table)
+        if info is not None and info.epoch:
+            # Clustered epoch table: one row per second, a repeated timestamp replaces the value
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} (tstamp, value) VALUES (?, ?)",
+                (to_epoch(timestamp or datetime.datetime.now()), value)
+            )
+        elif timestamp:
+            conn.execute(
+                f"INSERT INTO {table} (tstamp, value) VALUES (?, ?)",
+                (timestamp, value)
+            )
+        else:
+            conn.execute(
+                f"INSERT INTO {table} (value) VALUES (?)",
+                (value,)
+            )
+
+    def _fold_rollups(self, conn: sqlite3.Connection, tables: Iterable[str]):
+        """
+        Fold freshly inserted samples into the rollup tables, committing them together with the
+        inserts. The source layout comes from the cached schema catalog.
+        """
+        if not self._rollup_tables_ready:
+            rollups.ensure_rollup_tables(conn)
+            self._rollup_tables_ready = True
+        for table in tables:
+            info = self._table_info(conn, table)
+            if info is not None:
+                rollups.fold_new_rows(conn, table, "id" if info.has_column("id") else "tstamp", info.epoch)
+
+    def _hot_latest(self, table: str, limit: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """
+        Answer a "latest values" query from the hot tier, warming the table's buffer from the
+        database on first use. Returns None if the hot tier cannot answer.
+        """
+        if not self.hot_tier.is_warm(table):
+            self.flush()
+            try:
+                with self._connection() as conn:
+                    info = self._table_info(conn, table)
+                    if info is None:
+                        return None
+                    tstamp = info.timestamp_column
+                    id_column = "id" if info.has_column("id") else "NULL"
+                    rows = conn.execute(
+                        f"SELECT {id_column} AS id, {tstamp} AS tstamp, value FROM {table} ORDER BY {tstamp} DESC LIMIT ?",
+                        (self.hot_tier.maxlen,)
+                    ).fetchall()
+                self.hot_tier.warm(table, [
+                    {"id": row["id"], "timestamp": from_epoch(row["tstamp"]) if info.epoch else row["tstamp"], "value": row["value"]}
+                    for row in rows
+                ])
+            except Exception as e:
+                self.invalidate_schema()
+                print(f"Error warming hot tier for {table}: {e}")
+                return None
+        return self.hot_tier.latest(table, limit)
+
+    def flush(self):
+        """
+        Block until all samples queued in hot tier mode are written. No-op otherwise.
+        """
+        if self._writer is not None:
+            self._write_queue.join()
+
+    def _persist_loop(self):
+        """
+        Writer thread of the hot tier mode: drains the queue and writes everything that is
+        pending in one transaction.
+        """
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                self._write_queue.task_done()
+                return
+            batch = [item]
+            while True:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Put the stop marker back so it ends the loop after this batch
+                    self._write_queue.task_done()
+                    self._write_queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                with self._connection() as conn:
+                    for table, value, timestamp in batch:
+                        self._insert_value(conn, table, value, timestamp)
+                    if self.update_rollups:
+                        tables = {table for table, _, _ in batch if table in rollups.ROLLUP_SOURCES}
+                        if tables:
+                            self._fold_rollups(conn, tables)
+                    conn.commit()
+            except Exception as e:
+                print(f"Error persisting {len(batch)} hot tier samples: {e}")
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
     def overwrite_table(self, df, table_name: str) -> bool:
         """
         Replace a table with contents of DataFrame
         """
         try:
-            conn = self._get_connection()
-            df.to_sql(table_name, conn, if_exists="replace", index=False)
-            conn.close()
+            with self._connection() as conn:
+                info = self._table_info(conn, table_name)
+                if info is not None and info.epoch:
+                    self._replace_epoch_table(conn, df, table_name)
+                else:
+                    df.to_sql(table_name, conn, if_exists="replace", index=False)
+            # The table was dropped and recreated, possibly with different columns
+            self.invalidate_schema()
             return True
         except Exception as e:
             print(f"Error replacing {table_name} table: {e}")
             return False
 
+    def _replace_epoch_table(self, conn: sqlite3.Connection, df: pd.DataFrame, table_name: str):
+        """
+        Replace an epoch schema table with the contents of a DataFrame, keeping it clustered on
+        an integer epoch tstamp. The DataFrame's "timestamp" (or "tstamp") column is converted.
+        """
+        ts_column = "timestamp" if "timestamp" in df.columns else "tstamp"
+        data = df.drop(columns=[ts_column])
+        sql_types = {"i": "INTEGER", "u": "INTEGER", "b": "INTEGER", "f": "REAL"}
+        columns = ", ".join(f'"{col}" {sql_types.get(data[col].dtype.kind, "TEXT")}' for col in data.columns)
+        placeholders = ", ".join("?" for _ in range(len(data.columns) + 1))
+
+        epochs = to_epoch_series(df[ts_column])
+        valid = epochs.notna()
+        rows = zip(epochs[valid].astype("int64").tolist(), *(data.loc[valid, col].tolist() for col in data.columns))
+
+        with conn:
+            # Explicit transaction so readers never see the table missing or half filled
+            conn.execute("BEGIN")
+            conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+            conn.execute(epoch_table_sql(table_name, columns))
+            conn.executemany(f"INSERT OR REPLACE INTO {table_name} VALUES ({placeholders})", rows)
+
     def store_irradiation_data(self, df) -> bool:
         """Store irradiation data value"""
         return self.overwrite_table(df, "irradiation_data")
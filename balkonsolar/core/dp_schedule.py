@@ -0,0 +1,167 @@
+"""
+Dynamic-programming battery dispatch for Balkonsolar.
+
+The state of charge is discretized into levels `step` Wh apart, and for every hour and level the
+best action (change of level) is found by backward induction over the whole horizon. Each hour
+is one vectorized NumPy step over all levels × actions, so a solve costs O(T × S × K) array
+operations regardless of the data: with the defaults (24 hours, 10 Wh steps, 2.56 kWh) that is
+about ten milliseconds, cheap enough to replan every minute on low-power hardware.
+
+The model follows VirtualBattery: charging only from PV (never from the grid) with charge_efficiency,
+discharging to the household with discharge_efficiency, plus a minimum state of charge. Grid
+imports are weighted by the StromGedacht grid state (schedule.grid_costs), and PV that can neither
+be used, stored nor fed in because of the feed-in limit counts as curtailed.
+"""
+import time
+from collections import namedtuple
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from balkonsolar.core.schedule import (
+    CHARGE_BATTERY, MIXED, USE_BATTERY, USE_GRID, USE_SOLAR, ArrayLike, grid_costs,
+)
+
+# Size of one state of charge level (Wh)
+DEFAULT_STEP = 10.0
+
+# Feed-in limit of a balcony power plant: 800 W, i.e. 800 Wh per hour
+FEED_IN_LIMIT = 800.0
+
+# Cost of one curtailed Wh, relative to grid costs (1.0 = as bad as a Wh imported in normal operation)
+CURTAILMENT_COST = 1.0
+
+# Tie-breaker per Wh moved in or out of the battery, so it does not cycle when that saves nothing
+CYCLE_COST = 1e-4
+
+Dispatch = namedtuple("Dispatch", ["battery_input", "state", "surplus", "soc", "grid_import", "feed_in", "cost"])
+Dispatch.__doc__ = """
+Result of DPScheduler.plan(), one value per hour (cost: total over the horizon).
+
+    battery_input: Energy into the battery from PV (Wh), negative for energy delivered to the household.
+    state: Suggested state as an index into schedule.STATES.
+    surplus: PV production minus usage (Wh).
+    soc: State of charge at the end of the hour (Wh).
+    grid_import: Energy drawn from the grid (Wh).
+    feed_in: PV energy fed in, up to the feed-in limit (Wh).
+    cost: Objective value of the plan.
+"""
+
+
+class DPScheduler:
+    """
+    Plans the optimal battery dispatch over a discretized state of charge.
+    """
+
+    def __init__(self, charge_efficiency: float = 0.95, discharge_efficiency: float = 0.95,
+                 min_soc: float = 0.0, max_charge: Optional[float] = None, max_discharge: Optional[float] = None,
+                 feed_in_limit: Optional[float] = FEED_IN_LIMIT, curtailment_cost: float = CURTAILMENT_COST,
+                 step: float = DEFAULT_STEP):
+        """
+        Initialize the scheduler.
+
+        Args:
+            charge_efficiency: Fraction of charged energy that ends up in the battery.
+            discharge_efficiency: Fraction of discharged energy that reaches the household.
+            min_soc: Lowest state of charge the battery may be discharged to (Wh).
+            max_charge: Optional limit of PV energy into the battery per hour (Wh).
+            max_discharge: Optional limit of energy delivered per hour (Wh).
+            feed_in_limit: PV energy that may be fed in per hour (Wh); None for no limit.
+            curtailment_cost: Cost per Wh of PV above the feed-in limit.
+            step: State of charge resolution (Wh).
+        """
+        self.charge_efficiency = charge_efficiency
+        self.discharge_efficiency = discharge_efficiency
+        self.min_soc = min_soc
+        self.max_charge = max_charge
+        self.max_discharge = max_discharge
+        self.feed_in_limit = feed_in_limit
+        self.curtailment_cost = curtailment_cost
+        self.step = step
+        self.last_status = ""
+        self.last_solve_ms = 0.0
+
+    def plan(self, usage: ArrayLike, pv_prod: ArrayLike, grid_state: ArrayLike,
+             battery_max: float, battery_current: float) -> Dispatch:
+        """
+        Plan one horizon.
+
+        Args:
+            usage: Expected household consumption per hour (Wh).
+            pv_prod: Expected PV production per hour (Wh).
+            grid_state: Grid state per hour.
+            battery_max: Battery capacity (Wh).
+            battery_current: Current battery charge (Wh).
+
+        Returns:
+            Dispatch: Optimal action and state of charge per hour.
+        """
+        begin = time.perf_counter()
+        usage = np.nan_to_num(np.asarray(usage, dtype=float))
+        pv_prod = np.maximum(np.nan_to_num(np.asarray(pv_prod, dtype=float)), 0.0)
+        grid_state = np.nan_to_num(np.asarray(grid_state, dtype=float))
+        horizon = len(usage)
+
+        levels = int(np.floor(battery_max / self.step)) + 1
+        min_level = int(np.ceil(self.min_soc / self.step))
+        # Largest level changes per hour; actions are level deltas -down..up
+        up = levels - 1 if self.max_charge is None else min(levels - 1, int(self.max_charge * self.charge_efficiency / self.step))
+        down = levels - 1 if self.max_discharge is None else min(levels - 1, int(self.max_discharge / self.discharge_efficiency / self.step))
+        delta = np.arange(-down, up + 1) * self.step
+
+        # Cost of every action in every hour, shape (T, K)
+        surplus = pv_prod - usage
+        charged = np.where(delta > 0, delta / self.charge_efficiency, 0.0)
+        delivered = np.where(delta < 0, -delta * self.discharge_efficiency, 0.0)
+        # PV left after charging goes to the household first, the rest is fed in
+        pv_left = pv_prod[:, np.newaxis] - charged
+        grid_import = np.maximum(usage[:, np.newaxis] - pv_left - delivered, 0.0)
+        exported = np.maximum(pv_left - usage[:, np.newaxis], 0.0)
+        feed_in = exported if self.feed_in_limit is None else np.minimum(exported, self.feed_in_limit)
+        cost = (
+            grid_import * grid_costs(grid_state)[:, np.newaxis]
+            + self.curtailment_cost * (exported - feed_in)
+            + CYCLE_COST * np.abs(delta)
+        )
+        # The battery charges from PV only, never from the grid
+        cost[pv_left < -1e-9] = np.inf
+
+        # Discharging below the minimum is not allowed (charging up to it is)
+        targets = np.arange(levels)[:, np.newaxis] + np.arange(-down, up + 1)
+        below_min = (targets < min_level) & (delta < 0)
+
+        # Backward induction: value[i] = best cost from level i to the end of the horizon
+        value = np.zeros(levels)
+        policy = np.empty((horizon, levels), dtype=np.int32)
+        padded = np.full(levels + down + up, np.inf)
+        for t in range(horizon - 1, -1, -1):
+            padded[down:down + levels] = value
+            # window[i, k] = value of level i + (k - down), inf outside the battery
+            total = sliding_window_view(padded, len(delta)) + cost[t]
+            total[below_min] = np.inf
+            policy[t] = np.argmin(total, axis=1)
+            value = total[np.arange(levels), policy[t]]
+
+        # Forward pass along the optimal policy
+        start = min(max(int(round(battery_current / self.step)), 0), levels - 1)
+        level = start
+        actions = np.empty(horizon, dtype=np.int32)
+        soc = np.empty(horizon)
+        for t in range(horizon):
+            actions[t] = policy[t, level]
+            level += actions[t] - down
+            soc[t] = level * self.step
+        hours = np.arange(horizon)
+        battery_input = charged[actions] - delivered[actions]
+        total_cost = float(value[start])
+
+        state = np.full(horizon, USE_GRID, dtype=np.int8)
+        state[surplus > 0] = USE_SOLAR
+        state[battery_input < 0] = USE_BATTERY
+        state[battery_input > 0] = CHARGE_BATTERY
+        state[(battery_input > 0) & (exported[hours, actions] > 0)] = MIXED
+
+        self.last_status = "optimal" if np.isfinite(total_cost) else "infeasible"
+        self.last_solve_ms = (time.perf_counter() - begin) * 1000
+        return Dispatch(battery_input, state, surplus, soc, grid_import[hours, actions], feed_in[hours, actions], total_cost)
@@ -0,0 +1,290 @@
+"""
+Monte-Carlo ensemble planning for Balkonsolar.
+
+The point forecasts (PV from irradiation_data, consumption from the standard profile) are
+perturbed into N scenarios with multiplicative lognormal AR(1) errors whose level, spread and
+autocorrelation are learned from history. A set of candidate schedules (greedy charging plans of
+the point forecast and of representative scenarios, all planned in one vectorized call, with
+two discharge policies each, plus optionally the plan of another backend such as the DP) is
+then simulated against every scenario at once, and the candidate with the lowest expected or
+worst-case grid cost wins. The state of charge of the winner across the scenarios gives the
+P10/P50/P90 bands.
+
+Everything is batched over (candidates × scenarios) with one NumPy step per time slot:
+1,000 scenarios × 96 slots take about a tenth of a second.
+"""
+import time
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.schedule import ArrayLike, classify_states, grid_costs, plan_schedule
+
+ErrorModel = namedtuple("ErrorModel", ["mu", "sigma", "phi"])
+ErrorModel.__doc__ = """
+Multiplicative forecast error: actual = forecast * exp(mu + e[t]), where e is an AR(1) process
+with lag-1 autocorrelation phi and stationary standard deviation sigma.
+"""
+
+# Used until enough history is available
+DEFAULT_PV_ERRORS = ErrorModel(0.0, 0.35, 0.7)
+DEFAULT_USAGE_ERRORS = ErrorModel(0.0, 0.2, 0.5)
+
+# Hours (forecast and actual both above MIN_VALUE Wh) needed to fit an error model
+MIN_SAMPLES = 24
+MIN_VALUE = 10.0
+
+# Candidate selection
+OBJECTIVES = ("expected", "worst")
+
+EnsembleResult = namedtuple(
+    "EnsembleResult", ["battery_input", "state", "surplus", "soc_bands", "expected_cost", "worst_cost"]
+)
+EnsembleResult.__doc__ = """
+Result of EnsemblePlanner.plan(); the first three fields match schedule.Schedule.
+
+    battery_input: Chosen net battery input per slot (Wh), negative when discharging.
+    state: Suggested state per slot (point forecast) as an index into schedule.STATES.
+    surplus: Point forecast PV production minus usage per slot (Wh).
+    soc_bands: P10, P50 and P90 state of charge at the end of each slot, shape (3, T).
+    expected_cost: Mean grid cost of the chosen schedule over the scenarios.
+    worst_cost: Highest grid cost of the chosen schedule over the scenarios.
+"""
+
+
+def fit_error_model(actual: ArrayLike, forecast: ArrayLike, default: ErrorModel = DEFAULT_PV_ERRORS) -> ErrorModel:
+    """
+    Fit a lognormal AR(1) error model to hourly actual and forecast values.
+
+    Args:
+        actual: Measured values per hour.
+        forecast: Forecast values for the same hours.
+        default: Returned when fewer than MIN_SAMPLES usable hours exist.
+
+    Returns:
+        ErrorModel: Fitted model.
+    """
+    actual = np.asarray(actual, dtype=float)
+    forecast = np.asarray(forecast, dtype=float)
+    valid = (actual > MIN_VALUE) & (forecast > MIN_VALUE)
+    if valid.sum() < MIN_SAMPLES:
+        return default
+    errors = np.full(actual.shape, np.nan)
+    errors[valid] = np.log(actual[valid] / forecast[valid])
+    mu = float(np.nanmean(errors))
+    sigma = float(np.nanstd(errors))
+    # Autocorrelation over pairs of consecutive usable hours
+    pairs = valid[:-1] & valid[1:]
+    phi = default.phi
+    if pairs.sum() >= 2 and sigma > 0:
+        a, b = errors[:-1][pairs] - mu, errors[1:][pairs] - mu
+        denominator = np.sqrt((a * a).sum() * (b * b).sum())
+        if denominator > 0:
+            phi = float(np.clip((a * b).sum() / denominator, 0.0, 0.99))
+    return ErrorModel(mu, sigma, phi)
+
+
+def learn_error_models(db, usage_forecast: Callable[[datetime, int], np.ndarray], hours: int = 30 * 24):
+    """
+    Fit PV and consumption error models from history.
+
+    PV: the archived hourly (raw forecast, actual) pairs of the bias correction (pv_correction.py),
+    with the raw forecast corrected by the current factors, as the planner sees it. The stored
+    irradiation_data only holds the latest fetch, so it cannot be used for this.
+    Consumption: hourly consumption from the rollups (grid_usage plus solar_output) against the
+    consumption forecast the planner uses.
+
+    Args:
+        db: DatabaseInterface to read the history from.
+        usage_forecast: Function (start, hours) -> expected consumption per hour (Wh).
+        hours: History to learn from.
+
+    Returns:
+        tuple: (pv ErrorModel, usage ErrorModel); defaults where history is too short.
+    """
+    pv_model = DEFAULT_PV_ERRORS
+    pairs = db.get_pv_forecast_pairs(hours)
+    if pairs is not None and len(pairs):
+        # On a gapless hourly index, so the autocorrelation pairs up neighbouring hours only
+        pairs = pairs.reindex(pd.date_range(pairs.index[0], pairs.index[-1], freq="h"))
+        pv_model = fit_error_model(pairs["actual_wh"].to_numpy(), pairs["corrected_wh"].to_numpy(), DEFAULT_PV_ERRORS)
+
+    def hourly(table: str) -> pd.Series:
+        records = db.get_rollup_history(table, hours, resolution="hourly")
+        records = [r for r in records if "energy_wh" in r]
+        if not records:
+            return pd.Series(dtype=float)
+        frame = pd.DataFrame.from_records(records)
+        return pd.Series(frame["energy_wh"].to_numpy(dtype=float), index=pd.to_datetime(frame["timestamp"])).sort_index()
+
+    usage_model = DEFAULT_USAGE_ERRORS
+    grid = hourly("grid_usage")
+    if len(grid) >= MIN_SAMPLES:
+        # grid_usage is the meter reading with PV already subtracted
+        solar = hourly("solar_output").clip(lower=0).reindex(grid.index, fill_value=0.0)
+        hours_index = pd.date_range(grid.index[0], grid.index[-1], freq="h")
+        actual = (grid + solar).reindex(hours_index)
+        expected = usage_forecast(hours_index[0].to_pydatetime(), len(hours_index))
+        usage_model = fit_error_model(actual.to_numpy(), expected, DEFAULT_USAGE_ERRORS)
+    return pv_model, usage_model
+
+
+def sample_scenarios(forecast: ArrayLike, model: ErrorModel, scenarios: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draw perturbed copies of a forecast.
+
+    Args:
+        forecast: Point forecast per slot, shape (T,).
+        model: Error model.
+        scenarios: Number of scenarios N.
+        rng: Random generator.
+
+    Returns:
+        np.ndarray: Scenarios, shape (N, T).
+    """
+    forecast = np.asarray(forecast, dtype=float)
+    noise = rng.standard_normal((scenarios, len(forecast))) * model.sigma
+    innovation = np.sqrt(1.0 - model.phi ** 2)
+    errors = np.empty_like(noise)
+    errors[:, 0] = noise[:, 0]
+    for t in range(1, len(forecast)):
+        errors[:, t] = model.phi * errors[:, t - 1] + innovation * noise[:, t]
+    return forecast * np.exp(model.mu + errors)
+
+
+class EnsemblePlanner:
+    """
+    Chooses the schedule that does best over an ensemble of forecast scenarios.
+    """
+
+    def __init__(self, pv_model: ErrorModel = DEFAULT_PV_ERRORS, usage_model: ErrorModel = DEFAULT_USAGE_ERRORS,
+                 scenarios: int = 1000, candidates: int = 32, objective: str = "expected",
+                 charge_efficiency: float = 0.95, discharge_efficiency: float = 0.95, point_scheduler: Optional[Any] = None,
+                 seed: Optional[int] = None):
+        """
+        Initialize the ensemble planner.
+
+        Args:
+            pv_model: PV forecast error model.
+            usage_model: Consumption forecast error model.
+            scenarios: Number of scenarios N.
+            candidates: Number of candidate schedules K generated from the greedy plan.
+            objective: "expected" (lowest mean cost) or "worst" (lowest maximum cost).
+            charge_efficiency: Fraction of charged energy that ends up in the battery.
+            discharge_efficiency: Fraction of discharged energy that reaches the household.
+            point_scheduler: Optional scheduler with a plan() method (e.g. DPScheduler) whose
+                plan of the point forecast is added as a candidate.
+            seed: Random seed for reproducible scenarios.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        self.pv_model = pv_model
+        self.usage_model = usage_model
+        self.scenarios = scenarios
+        self.candidates = candidates
+        self.objective = objective
+        self.charge_efficiency = charge_efficiency
+        self.discharge_efficiency = discharge_efficiency
+        self.point_scheduler = point_scheduler
+        self.rng = np.random.default_rng(seed)
+        self.last_status = ""
+        self.last_solve_ms = 0.0
+
+    def simulate(self, battery_input: np.ndarray, usage: np.ndarray, pv_prod: np.ndarray, costs: np.ndarray,
+                 battery_max: float, battery_current: float):
+        """
+        Execute K candidate schedules in N scenarios.
+
+        Planned charging is limited by the PV actually available and the free capacity,
+        planned discharging by the actual deficit and the stored energy.
+
+        Args:
+            battery_input: Candidate schedules, shape (K, T).
+            usage: Consumption scenarios, shape (N, T).
+            pv_prod: PV scenarios, shape (N, T).
+            costs: Grid import cost per slot, shape (T,).
+            battery_max: Battery capacity (Wh).
+            battery_current: Current battery charge (Wh).
+
+        Returns:
+            tuple: Grid cost per candidate and scenario (K, N) and state of charge at the end
+            of each slot (K, N, T).
+        """
+        plan = battery_input[:, np.newaxis, :]
+        soc = np.full((battery_input.shape[0], usage.shape[0]), float(battery_current))
+        total = np.zeros_like(soc)
+        trajectory = np.empty(soc.shape + (usage.shape[1],))
+        for t in range(usage.shape[1]):
+            wanted = plan[:, :, t]
+            charge = np.minimum(np.maximum(wanted, 0.0), pv_prod[:, t])
+            charge = np.minimum(charge, (battery_max - soc) / self.charge_efficiency)
+            deficit = np.maximum(usage[:, t] - (pv_prod[:, t] - charge), 0.0)
+            delivered = np.minimum(np.minimum(np.maximum(-wanted, 0.0), deficit), soc * self.discharge_efficiency)
+            soc = soc + charge * self.charge_efficiency - delivered / self.discharge_efficiency
+            total += (deficit - delivered) * costs[t]
+            trajectory[:, :, t] = soc
+        return total, trajectory
+
+    def plan(self, usage: ArrayLike, pv_prod: ArrayLike, grid_state: ArrayLike,
+             battery_max: float, battery_current: float, point: Optional[np.ndarray] = None) -> EnsembleResult:
+        """
+        Plan one horizon over the ensemble.
+
+        Args:
+            usage: Expected household consumption per slot (Wh).
+            pv_prod: Expected PV production per slot (Wh).
+            grid_state: Grid state per slot.
+            battery_max: Battery capacity (Wh).
+            battery_current: Current battery charge (Wh).
+            point: Optional battery input of another backend's plan to include as a candidate
+                (default: the point_scheduler's plan, if any).
+
+        Returns:
+            EnsembleResult: Chosen schedule, its SoC bands and costs.
+        """
+        begin = time.perf_counter()
+        usage = np.nan_to_num(np.asarray(usage, dtype=float))
+        pv_prod = np.maximum(np.nan_to_num(np.asarray(pv_prod, dtype=float)), 0.0)
+        grid_state = np.nan_to_num(np.asarray(grid_state, dtype=float))
+        costs = grid_costs(grid_state)
+
+        pv_scenarios = sample_scenarios(pv_prod, self.pv_model, self.scenarios, self.rng)
+        usage_scenarios = sample_scenarios(usage, self.usage_model, self.scenarios, self.rng)
+
+        # Charging plans for the point forecast and for scenarios spread over the PV quantiles,
+        # each combined with discharging in every deficit hour or only in the costlier ones
+        order = np.argsort(pv_scenarios.sum(axis=1))
+        picks = order[np.linspace(0, self.scenarios - 1, max(self.candidates // 2 - 1, 1)).astype(int)]
+        candidate_usage = np.vstack([usage, usage_scenarios[picks]])
+        candidate_pv = np.vstack([pv_prod, pv_scenarios[picks]])
+        charging = plan_schedule(candidate_usage, candidate_pv, grid_state, battery_max, battery_current).battery_input
+        deficit = np.maximum(candidate_usage - candidate_pv, 0.0)
+        idle = charging <= 0
+        candidates = np.vstack([
+            np.where(idle, -deficit, charging),
+            np.where(idle & (costs > costs.min()), -deficit, charging),
+        ])
+        if point is None and self.point_scheduler is not None:
+            point = self.point_scheduler.plan(usage, pv_prod, grid_state, battery_max, battery_current).battery_input
+        if point is not None:
+            candidates = np.vstack([np.asarray(point, dtype=float), candidates])
+
+        total, trajectory = self.simulate(candidates, usage_scenarios, pv_scenarios, costs, battery_max, battery_current)
+        score = total.mean(axis=1) if self.objective == "expected" else total.max(axis=1)
+        best = int(np.argmin(score))
+
+        battery_input = candidates[best]
+        surplus = pv_prod - usage
+        self.last_status = "optimal"
+        self.last_solve_ms = (time.perf_counter() - begin) * 1000
+        return EnsembleResult(
+            battery_input,
+            classify_states(battery_input, surplus),
+            surplus,
+            np.percentile(trajectory[best], [10, 50, 90], axis=0),
+            float(total[best].mean()),
+            float(total[best].max()),
+        )
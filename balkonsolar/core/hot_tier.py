@@ -0,0 +1,161 @@
+"""
+In-memory hot tier for the latest Balkonsolar readings.
+
+Keeps a bounded ring buffer of the last samples per signal (table), shared by everything in the
+process that works on the same database. Writers append every sample they store; "latest value"
+and "last N minutes" queries are answered from RAM and only fall back to SQLite, the durable cold
+tier, when the buffer cannot cover the request.
+
+Only the standard library is used, so the standalone AppDaemon apps can import it as well.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Samples kept per signal: one day of minute readings
+DEFAULT_MAXLEN = 24 * 60
+
+
+class HotTier:
+    """
+    Per-signal ring buffers of (timestamp, value, id) samples in timestamp order.
+
+    One instance exists per database path. A buffer is "complete from" its horizon: every sample
+    at or after the horizon timestamp is in the buffer, so range queries starting there can be
+    answered without SQLite. Samples written by other processes are not seen, so the hot tier
+    belongs in the process that does the writing.
+    """
+    _instances: Dict[str, "HotTier"] = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, db_path: str, **kwargs):
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = super(HotTier, cls).__new__(cls)
+            return cls._instances[key]
+
+    def __init__(self, db_path: str, maxlen: int = DEFAULT_MAXLEN):
+        """
+        Initialize the hot tier (only once per database path).
+
+        Args:
+            db_path: Path of the database this tier caches.
+            maxlen: Samples kept per signal.
+        """
+        if hasattr(self, "_initialized"):
+            return
+        self.db_path = db_path
+        self.maxlen = maxlen
+        self._buffers: Dict[str, Deque[Tuple[Any, float, Optional[int]]]] = {}
+        # Oldest timestamp from which a buffer holds every sample ("" = all samples ever stored)
+        self._horizons: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def is_warm(self, signal: str) -> bool:
+        """
+        True once the signal's buffer was filled from the database or by an append.
+        """
+        return signal in self._buffers
+
+    def warm(self, signal: str, records: List[Dict[str, Any]]):
+        """
+        Fill a signal's buffer from the database, unless it is already warm.
+
+        Args:
+            signal: Table name.
+            records: The newest (up to maxlen) records with timestamp, value and id, newest first.
+        """
+        with self._lock:
+            if signal in self._buffers:
+                return
+            samples = [(record["timestamp"], record["value"], record.get("id")) for record in reversed(records)]
+            self._buffers[signal] = deque(samples, maxlen=self.maxlen)
+            # Fewer rows than requested means the database holds nothing older
+            self._horizons[signal] = samples[0][0] if len(samples) >= self.maxlen else ""
+
+    def append(self, signal: str, timestamp: Any, value: float, id: Optional[int] = None):
+        """
+        Add a freshly stored sample.
+
+        Args:
+            signal: Table name.
+            timestamp: Timestamp as stored (text, local time).
+            value: Sample value.
+            id: Row id, if known.
+        """
+        with self._lock:
+            buffer = self._buffers.get(signal)
+            if buffer is None:
+                buffer = self._buffers[signal] = deque(maxlen=self.maxlen)
+                self._horizons[signal] = timestamp
+            if buffer and timestamp < buffer[-1][0]:
+                # Late sample: keep the buffer ordered (rare, so a linear insert is fine)
+                position = len(buffer)
+                while position > 0 and buffer[position - 1][0] > timestamp:
+                    position -= 1
+                if len(buffer) == buffer.maxlen:
+                    if position == 0:
+                        return
+                    buffer.popleft()
+                    position -= 1
+                buffer.insert(position, (timestamp, value, id))
+            else:
+                buffer.append((timestamp, value, id))
+            if len(buffer) == buffer.maxlen:
+                self._horizons[signal] = max(self._horizons[signal], buffer[0][0])
+
+    def latest(self, signal: str, limit: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the newest samples of a signal.
+
+        Returns:
+            Up to `limit` records (id, timestamp, value), newest first, or None if the buffer
+            cannot answer (not warm, or too few samples while older ones may exist on disk).
+        """
+        with self._lock:
+            buffer = self._buffers.get(signal)
+            if buffer is None:
+                return None
+            if len(buffer) < limit and self._horizons[signal] != "":
+                return None
+            samples = [buffer[-i] for i in range(1, min(limit, len(buffer)) + 1)]
+        return [self._record(sample) for sample in samples]
+
+    def since(self, signal: str, start: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get all samples of a signal at or after `start`.
+
+        Returns:
+            Records (id, timestamp, value), newest first, or None if the range reaches past
+            the buffer's horizon and has to be read from the database.
+        """
+        with self._lock:
+            buffer = self._buffers.get(signal)
+            if buffer is None or start < self._horizons[signal]:
+                return None
+            samples = []
+            for sample in reversed(buffer):
+                if sample[0] < start:
+                    break
+                samples.append(sample)
+        return [self._record(sample) for sample in samples]
+
+    def clear(self, signal: Optional[str] = None):
+        """
+        Drop the buffer of one signal, or of all signals.
+        """
+        with self._lock:
+            if signal is None:
+                self._buffers.clear()
+                self._horizons.clear()
+            else:
+                self._buffers.pop(signal, None)
+                self._horizons.pop(signal, None)
+
+    @staticmethod
+    def _record(sample: Tuple[Any, float, Optional[int]]) -> Dict[str, Any]:
+        timestamp, value, id = sample
+        return {"id": id, "timestamp": timestamp, "value": value}
@@ -0,0 +1,202 @@
+"""
+Linear-programming battery schedule for Balkonsolar.
+
+Unlike the greedy plan in balkonsolar/core/schedule.py, the LP accounts for charge and discharge
+losses and for the grid state over the whole horizon: it decides per hour how much PV goes to the
+household, into the battery or is fed in, and how much the battery discharges, so that grid
+imports weighted by the grid state are minimal. The model is assembled directly as sparse
+matrices and solved in-process with HiGHS (scipy.optimize.linprog).
+
+Variables per hour t (Wh): c charge from PV, d discharge to the household, g grid import,
+e PV fed in, s state of charge at the end of the hour.
+
+    minimize    sum(cost[t] * g[t]) - reward * sum(s[t]) + eps * sum(d[t])
+    subject to  pv[t] - c[t] - e[t] + d[t] + g[t] = usage[t]          (household balance)
+                s[t] = s[t-1] + eta_c * c[t] - d[t] / eta_d           (state of charge)
+                c[t] + e[t] <= pv[t]                                   (PV split)
+                0 <= s[t] <= capacity, 0 <= c[t] <= max_charge, 0 <= d[t] <= max_discharge
+"""
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from balkonsolar.core.schedule import (
+    CHARGE_BATTERY, MIXED, USE_BATTERY, USE_GRID, USE_SOLAR, ArrayLike, Schedule, grid_costs, plan_schedule,
+)
+
+# Tie-breakers, small against any grid cost: a reward per Wh stored at the end of each hour, so
+# surplus PV fills the battery early (it then counts for more hours) instead of being fed in, and
+# a cost per Wh discharged so the battery does not cycle when it saves nothing. Rewarding the
+# state of charge rather than the charged energy makes charging and discharging in the same hour
+# strictly worse than the net flow, so the LP never runs round trips to collect the reward.
+SOC_REWARD = 1e-5
+DISCHARGE_COST = 1e-4
+
+# Default solve-time budget in seconds
+DEFAULT_TIME_LIMIT = 1.0
+
+# Tolerance (Wh) when checking whether a previous solution is still feasible
+FEASIBILITY_TOL = 1e-6
+
+# Variable blocks in the solution vector
+BLOCKS = ("charge", "discharge", "grid", "feed_in", "soc")
+
+
+class LPScheduler:
+    """
+    Plans the battery schedule with an LP. Keeps the constraint matrices of each horizon length
+    and the last solution, so repeated plans only rebuild the right-hand sides and bounds.
+    """
+
+    def __init__(self, charge_efficiency: float = 0.95, discharge_efficiency: float = 0.95,
+                 max_charge: Optional[float] = None, max_discharge: Optional[float] = None,
+                 time_limit: float = DEFAULT_TIME_LIMIT):
+        """
+        Initialize the scheduler.
+
+        Args:
+            charge_efficiency: Fraction of charged energy that ends up in the battery.
+            discharge_efficiency: Fraction of discharged energy that reaches the household.
+            max_charge: Optional charge limit per hour (Wh).
+            max_discharge: Optional discharge limit per hour (Wh).
+            time_limit: Solve-time budget in seconds; past it the plan falls back (see plan()).
+        """
+        self.charge_efficiency = charge_efficiency
+        self.discharge_efficiency = discharge_efficiency
+        self.max_charge = max_charge
+        self.max_discharge = max_discharge
+        self.time_limit = time_limit
+        # horizon -> (A_eq, A_ub)
+        self._matrices: Dict[int, Tuple[sparse.csr_matrix, sparse.csr_matrix]] = {}
+        # Last problem (cost, b_eq, b_ub, bounds) and its solution
+        self._previous: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self.last_status = ""
+        self.last_solve_ms = 0.0
+        # Flows of the last LP plan per block ("charge", "discharge", ...), None after a greedy plan
+        self.last_flows: Optional[Dict[str, np.ndarray]] = None
+
+    def _constraints(self, horizon: int) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        """
+        Sparse equality and inequality matrices for a horizon (built once per length).
+        """
+        if horizon not in self._matrices:
+            eye = sparse.identity(horizon, format="csr")
+            zero = sparse.csr_matrix((horizon, horizon))
+            # s[t] - s[t-1]
+            delta = sparse.identity(horizon, format="csr") - sparse.eye(horizon, k=-1, format="csr")
+            a_eq = sparse.vstack([
+                sparse.hstack([-eye, eye, eye, -eye, zero]),
+                sparse.hstack([-self.charge_efficiency * eye, eye / self.discharge_efficiency, zero, zero, delta]),
+            ], format="csr")
+            a_ub = sparse.hstack([eye, zero, zero, eye, zero], format="csr")
+            self._matrices[horizon] = (a_eq, a_ub)
+        return self._matrices[horizon]
+
+    def _problem(self, usage: np.ndarray, pv_prod: np.ndarray, grid_state: np.ndarray,
+                 battery_max: float, battery_current: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Cost vector, right-hand sides and variable bounds for the given inputs.
+        """
+        horizon = len(usage)
+        zeros = np.zeros(horizon)
+        cost = np.concatenate([zeros, np.full(horizon, DISCHARGE_COST), grid_costs(grid_state), zeros,
+                               np.full(horizon, -SOC_REWARD)])
+        b_soc = zeros.copy()
+        b_soc[0] = battery_current
+        b_eq = np.concatenate([usage - pv_prod, b_soc])
+        b_ub = pv_prod
+        upper = np.concatenate([
+            np.full(horizon, np.inf if self.max_charge is None else self.max_charge),
+            np.full(horizon, np.inf if self.max_discharge is None else self.max_discharge),
+            np.full(horizon, np.inf),
+            np.full(horizon, np.inf),
+            np.full(horizon, battery_max),
+        ])
+        bounds = np.column_stack([np.zeros(5 * horizon), upper])
+        return cost, b_eq, b_ub, bounds
+
+    def _feasible(self, x: np.ndarray, b_eq: np.ndarray, b_ub: np.ndarray, bounds: np.ndarray) -> bool:
+        a_eq, a_ub = self._constraints(len(b_ub))
+        return bool(
+            np.all(np.abs(a_eq @ x - b_eq) <= FEASIBILITY_TOL)
+            and np.all(a_ub @ x <= b_ub + FEASIBILITY_TOL)
+            and np.all(x >= bounds[:, 0] - FEASIBILITY_TOL)
+            and np.all(x <= bounds[:, 1] + FEASIBILITY_TOL)
+        )
+
+    def plan(self, usage: ArrayLike, pv_prod: ArrayLike, grid_state: ArrayLike,
+             battery_max: float, battery_current: float) -> Schedule:
+        """
+        Plan one horizon.
+
+        If the inputs are the same as in the last call, the last solution is returned without
+        solving. If HiGHS does not finish within the time limit (or fails), the last solution is
+        used if it is still feasible for the new inputs, otherwise the greedy plan.
+        last_status tells which of "optimal", "cached", "previous" and "greedy" was used.
+
+        Args:
+            usage: Expected household consumption per hour (Wh).
+            pv_prod: Expected PV production per hour (Wh).
+            grid_state: Grid state per hour.
+            battery_max: Battery capacity (Wh).
+            battery_current: Current battery charge (Wh).
+
+        Returns:
+            Schedule: Net battery input (negative when discharging), state and surplus per hour.
+        """
+        usage = np.nan_to_num(np.asarray(usage, dtype=float))
+        pv_prod = np.maximum(np.nan_to_num(np.asarray(pv_prod, dtype=float)), 0.0)
+        grid_state = np.nan_to_num(np.asarray(grid_state, dtype=float))
+        battery_current = min(max(float(battery_current), 0.0), float(battery_max))
+        cost, b_eq, b_ub, bounds = self._problem(usage, pv_prod, grid_state, battery_max, battery_current)
+
+        begin = time.perf_counter()
+        previous = self._previous
+        if (previous is not None and len(previous[0]) == len(cost) and np.array_equal(previous[0], cost)
+                and np.array_equal(previous[1], b_eq) and np.array_equal(previous[2], b_ub)
+                and np.array_equal(previous[3], bounds)):
+            self.last_status = "cached"
+            x = previous[4]
+        else:
+            a_eq, a_ub = self._constraints(len(usage))
+            result = linprog(cost, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq, bounds=bounds,
+                             method="highs", options={"time_limit": self.time_limit})
+            if result.status == 0:
+                self.last_status = "optimal"
+                x = result.x
+                self._previous = (cost, b_eq, b_ub, bounds, x)
+            elif previous is not None and len(previous[4]) == len(cost) and self._feasible(previous[4], b_eq, b_ub, bounds):
+                self.last_status = "previous"
+                x = previous[4]
+            else:
+                self.last_status = "greedy"
+                x = None
+        self.last_solve_ms = (time.perf_counter() - begin) * 1000
+
+        if x is None:
+            self.last_flows = None
+            return plan_schedule(usage, pv_prod, grid_state, battery_max, battery_current)
+        # Solver noise below a milliwatt-hour is not a decision
+        x = np.where(np.abs(x) < 1e-6, 0.0, x)
+        self.last_flows = dict(zip(BLOCKS, np.split(x, len(BLOCKS))))
+        return self._schedule(x, usage, pv_prod)
+
+    @staticmethod
+    def _schedule(x: np.ndarray, usage: np.ndarray, pv_prod: np.ndarray) -> Schedule:
+        """
+        Turn an LP solution into net battery input and suggested states. The state follows the
+        net flow, so an hour that discharges on balance is never labelled as charging.
+        """
+        charge, discharge, _, feed_in, _ = np.split(x, len(BLOCKS))
+        net = charge - discharge
+        surplus = pv_prod - usage
+
+        state = np.full(len(usage), USE_GRID, dtype=np.int8)
+        state[surplus > 0] = USE_SOLAR
+        state[net < 0] = USE_BATTERY
+        state[net > 0] = CHARGE_BATTERY
+        state[(net > 0) & (feed_in > 0)] = MIXED
+        return Schedule(net, state, surplus)
@@ -0,0 +1,200 @@
+"""
+Receding-horizon (model predictive) control for Balkonsolar.
+
+The MPCController is stepped often (e.g. every minute) but only re-solves the plan when it has
+to: when the forecasts in irradiation_data / grid_usage_forecast or the expected consumption
+move beyond a tolerance, when the actual state of charge drifts away from the planned
+trajectory, or when the plan runs short of horizon. Slots before the first changed forecast
+slot are kept from the previous plan and only the rest is solved again, starting from the
+state of charge the kept prefix ends with. Every replan is recorded with its reasons. Slots
+have the planner's resolution (hourly by default).
+"""
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.planner import Planner, build_schedule
+
+# Default tolerances: forecast changes per slot (Wh) and state of charge drift (Wh)
+PV_TOLERANCE = 50.0
+USAGE_TOLERANCE = 50.0
+SOC_TOLERANCE = 100.0
+
+# Replan when fewer hours than this are left in the plan
+MIN_HORIZON = 12
+
+# Replans kept in MPCController.replans
+HISTORY_SIZE = 100
+
+# Columns stored in output_algorithm
+OUTPUT_COLUMNS = ["timestamp", "usage", "battery_input", "pv_prod", "grid_state", "suggested_state"]
+
+
+def soc_trajectory(battery_current: float, battery_input: np.ndarray, battery_max: float,
+                   charge_efficiency: float = 1.0, discharge_efficiency: float = 1.0) -> np.ndarray:
+    """
+    State of charge at the end of each slot when a plan is followed.
+
+    Args:
+        battery_current: State of charge at the start of the first slot (Wh).
+        battery_input: Planned net battery input per slot (Wh), negative when discharging.
+        battery_max: Battery capacity (Wh).
+        charge_efficiency: Fraction of charged energy that ends up in the battery.
+        discharge_efficiency: Fraction of discharged energy that reaches the household.
+
+    Returns:
+        np.ndarray: State of charge per slot (Wh).
+    """
+    stored = np.where(battery_input > 0, battery_input * charge_efficiency, battery_input / discharge_efficiency)
+    return np.clip(battery_current + np.cumsum(stored), 0.0, battery_max)
+
+
+class MPCController:
+    """
+    Keeps the current plan and decides on every step whether it has to be re-solved.
+    """
+
+    def __init__(self, planner: Planner, pv_tolerance: float = PV_TOLERANCE, usage_tolerance: float = USAGE_TOLERANCE,
+                 soc_tolerance: float = SOC_TOLERANCE, min_horizon: int = MIN_HORIZON, store: bool = True):
+        """
+        Initialize the controller.
+
+        Args:
+            planner: Planner providing the (cached) inputs, the backend and the database.
+            pv_tolerance: PV forecast change per slot (Wh) that triggers a replan.
+            usage_tolerance: Consumption forecast change per slot (Wh) that triggers a replan.
+            soc_tolerance: Deviation of the actual from the planned state of charge (Wh) that
+                triggers a replan.
+            min_horizon: Replan when fewer hours than this are left in the plan.
+            store: Write every new plan to output_algorithm.
+        """
+        self.planner = planner
+        self.pv_tolerance = pv_tolerance
+        self.usage_tolerance = usage_tolerance
+        self.soc_tolerance = soc_tolerance
+        self.min_horizon = min_horizon
+        self.store = store
+        # Current plan: output_algorithm columns plus soc_start / soc_end, indexed by slot
+        self.plan: Optional[pd.DataFrame] = None
+        self.replans: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+
+    def _efficiencies(self) -> Tuple[float, float]:
+        scheduler = self.planner.scheduler
+        return (getattr(scheduler, "charge_efficiency", 1.0), getattr(scheduler, "discharge_efficiency", 1.0))
+
+    def expected_soc(self, now: datetime) -> Optional[float]:
+        """
+        Planned state of charge at `now`, interpolated within the slot, or None without a plan.
+        """
+        if self.plan is None:
+            return None
+        slot = pd.Timestamp(now).floor(self.planner.freq)
+        if slot not in self.plan.index:
+            return None
+        row = self.plan.loc[slot]
+        fraction = (pd.Timestamp(now) - slot) / pd.Timedelta(self.planner.freq)
+        return float(row["soc_start"] + fraction * (row["soc_end"] - row["soc_start"]))
+
+    def _triggers(self, inputs: pd.DataFrame, now: datetime, soc: Optional[float]) -> Tuple[List[str], int]:
+        """
+        Reasons to replan and the first slot (index into inputs) that has to be solved again.
+        """
+        if self.plan is None:
+            return ["initial plan"], 0
+
+        reasons, first = [], len(inputs)
+        expected = self.expected_soc(now)
+        if soc is not None and expected is not None and abs(soc - expected) > self.soc_tolerance:
+            reasons.append(f"state of charge drift ({soc - expected:+.0f} Wh)")
+            first = 0
+
+        previous = self.plan.reindex(inputs.index)
+        planned = previous["usage"].notna().to_numpy()
+        changed = planned & (
+            (np.abs(inputs["pv_prod"].to_numpy() - previous["pv_prod"].to_numpy()) > self.pv_tolerance)
+            | (np.abs(inputs["usage"].to_numpy() - previous["usage"].to_numpy()) > self.usage_tolerance)
+            | (inputs["grid_state"].to_numpy() != previous["grid_state"].to_numpy())
+        )
+        if changed.any():
+            index = int(np.argmax(changed))
+            reasons.append(f"forecast changed from {inputs.index[index]:%Y-%m-%d %H:%M}")
+            first = min(first, index)
+
+        remaining = int(planned.sum())
+        if remaining < self.min_horizon * 60 // self.planner.resolution:
+            reasons.append(f"horizon ({remaining * self.planner.resolution / 60:g} planned hours left)")
+            first = min(first, remaining)
+        return reasons, first
+
+    def step(self, now: Optional[datetime] = None, soc: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Check the triggers and replan if needed.
+
+        Args:
+            now: Current time (default: now).
+            soc: Actual state of charge (Wh); without it, drift is not checked.
+
+        Returns:
+            dict: "replanned" (bool), "reasons" (list), "solved_hours" (hours solved again),
+            "current" (the plan row of the current slot as a dict) and "schedule" (DataFrame).
+        """
+        now = now or datetime.now()
+        if self.plan is not None:
+            # Receding horizon: slots that are over drop out of the plan
+            self.plan = self.plan[self.plan.index >= pd.Timestamp(now).floor(self.planner.freq)]
+        inputs, _ = self.planner.inputs(now)
+        reasons, first = self._triggers(inputs, now, soc)
+        if reasons:
+            self._replan(inputs, first, now, soc, reasons)
+
+        current = self.plan.iloc[0]
+        return {
+            "replanned": bool(reasons),
+            "reasons": reasons,
+            "solved_hours": (len(inputs) - first) * self.planner.resolution / 60 if reasons else 0,
+            "current": current.to_dict(),
+            "schedule": self.plan.reset_index(drop=True)[OUTPUT_COLUMNS],
+        }
+
+    def _replan(self, inputs: pd.DataFrame, first: int, now: datetime, soc: Optional[float], reasons: List[str]):
+        """
+        Keep the plan before slot `first` and solve the rest again.
+        """
+        begin = time.perf_counter()
+        battery_max = self.planner.battery_max
+        charge_efficiency, discharge_efficiency = self._efficiencies()
+
+        if first == 0:
+            prefix = None
+            if soc is not None:
+                start_soc = soc
+            else:
+                expected = self.expected_soc(now)
+                start_soc = expected if expected is not None else self.planner.battery_current
+        else:
+            prefix = self.plan.reindex(inputs.index[:first])
+            start_soc = float(prefix["soc_end"].iloc[-1])
+
+        suffix = build_schedule(inputs.iloc[first:], battery_max, start_soc, self.planner.scheduler)
+        soc_end = soc_trajectory(start_soc, suffix["battery_input"].to_numpy(), battery_max,
+                                 charge_efficiency, discharge_efficiency)
+        suffix["soc_start"] = np.concatenate([[start_soc], soc_end[:-1]])
+        suffix["soc_end"] = soc_end
+        suffix = suffix.set_index(inputs.index[first:])
+        plan = suffix if prefix is None else pd.concat([prefix, suffix])
+        plan["timestamp"] = plan.index
+        self.plan = plan
+
+        if self.store:
+            self.planner.db.store_output_algorithm(plan.reset_index(drop=True)[OUTPUT_COLUMNS])
+        self.replans.append({
+            "time": now,
+            "reasons": reasons,
+            "from": inputs.index[first],
+            "solved_hours": (len(inputs) - first) * self.planner.resolution / 60,
+            "ms": (time.perf_counter() - begin) * 1000,
+        })
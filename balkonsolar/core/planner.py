@@ -0,0 +1,292 @@
+"""
+Long-lived planning service for Balkonsolar.
+
+A Planner is created once (by the AppDaemon PlannerRunner app or the cron runner) and keeps
+everything that does not change between runs: the database connection, the standard
+consumption profile (compiled from Excel, see utils/read_average_energy_consumption.py), and the
+last version of each forecast table. replan() only re-reads a forecast table when its
+fingerprint changed, so a typical run costs a few small queries, the resampling of the
+forecasts onto the planning grid (balkonsolar/core/resample.py; 60 minute slots by default,
+15 or 5 minutes for finer plans) and the plan itself: the vectorized greedy plan from
+balkonsolar/core/schedule.py (backend "greedy"), the LP from balkonsolar/core/lp_schedule.py
+(backend "lp"), the dynamic program from balkonsolar/core/dp_schedule.py (backend "dp") or the
+Monte-Carlo ensemble from balkonsolar/core/ensemble.py around the DP (backend "ensemble").
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.consumption_forecast import ConsumptionForecaster
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.resample import periods_ending_at, resample_energy, resample_state, slot_edges
+from balkonsolar.core.schedule import plan_schedule, state_labels
+from balkonsolar.core.timestamps import to_local_datetime
+from balkonsolar.utils.read_average_energy_consumption import load_profile, profile_values
+
+# Battery capacity values
+BATTERY_MAX = 2560  # Wh
+BATTERY_CURRENT = 500  # Wh
+
+# Hours planned per run
+HORIZON = 24
+
+# Slot length in minutes
+RESOLUTION = 60
+RESOLUTIONS = (60, 30, 15, 5)
+
+# Planning backends
+BACKENDS = ("greedy", "lp", "dp", "ensemble")
+
+# Consumption sources: the standard profile, or the forecast learned from grid_usage
+USAGE_SOURCES = ("profile", "learned")
+
+# Forecast tables and the column (renamed) that the planner uses from each
+FORECASTS = {
+    "irradiation_data": ("watt_hours", "pv_prod"),
+    "grid_usage_forecast": ("grid_state", "grid_state"),
+}
+
+
+def build_schedule(inputs: pd.DataFrame, battery_max: float = BATTERY_MAX, battery_current: float = BATTERY_CURRENT,
+                   scheduler: Optional[Any] = None) -> pd.DataFrame:
+    """
+    Plan battery charging for a frame of inputs per slot.
+
+    Args:
+        inputs: usage, pv_prod and grid_state per slot, indexed by timestamp.
+        battery_max: Battery capacity (Wh).
+        battery_current: Current battery charge (Wh).
+        scheduler: Object with a plan() method like plan_schedule(), e.g. an LPScheduler
+            (default: the greedy plan).
+
+    Returns:
+        pd.DataFrame: timestamp, usage, battery_input, pv_prod, grid_state and suggested_state
+        per slot, as stored in output_algorithm.
+    """
+    plan = plan_schedule if scheduler is None else scheduler.plan
+    schedule = plan(
+        inputs["usage"].to_numpy(), inputs["pv_prod"].to_numpy(), inputs["grid_state"].to_numpy(),
+        battery_max, battery_current,
+    )
+    df = pd.DataFrame({
+        "timestamp": inputs.index,
+        "usage": inputs["usage"].to_numpy(),
+        "battery_input": schedule.battery_input,
+        "pv_prod": inputs["pv_prod"].to_numpy(),
+        "grid_state": inputs["grid_state"].to_numpy(),
+        "suggested_state": state_labels(schedule.state),
+    })
+    return df
+
+
+class Planner:
+    """
+    Plans the battery schedule with cached inputs. Not thread-safe; use one instance per thread.
+    """
+
+    def __init__(self, db: Optional[DatabaseInterface] = None, battery_max: float = BATTERY_MAX,
+                 battery_current: float = BATTERY_CURRENT, horizon: int = HORIZON,
+                 backend: str = "greedy", time_limit: Optional[float] = None, resolution: int = RESOLUTION,
+                 usage_source: str = "profile"):
+        """
+        Initialize the planner.
+
+        Args:
+            db: Database interface (default: a pooled DatabaseInterface on the default database).
+            battery_max: Battery capacity (Wh).
+            battery_current: Battery charge (Wh) used when replan() gets none.
+            horizon: Hours planned per run.
+            backend: "greedy", "lp" (needs scipy), "dp" or "ensemble". The ensemble's error
+                models are fitted from history here and whenever the PV forecast is refreshed
+                (see update_error_models()).
+            time_limit: Solve-time budget of the LP backend in seconds; past it the LP falls back
+                to its previous solution or the greedy plan.
+            resolution: Slot length in minutes, one of RESOLUTIONS.
+            usage_source: "profile" (standard profile) or "learned" (consumption_forecast.py,
+                updated from the grid_usage history on every run; falls back to the profile
+                where the history is sparse).
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown planning backend: {backend}")
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unsupported planning resolution: {resolution} minutes")
+        if usage_source not in USAGE_SOURCES:
+            raise ValueError(f"Unknown consumption source: {usage_source}")
+        self.db = db if db is not None else DatabaseInterface(pooled=True)
+        self.battery_max = battery_max
+        self.battery_current = battery_current
+        self.horizon = horizon
+        self.resolution = resolution
+        self.freq = f"{resolution}min"
+        self.slots = horizon * 60 // resolution
+        self.backend = backend
+        self.usage_source = usage_source
+        self.scheduler = None
+        if backend == "lp":
+            from balkonsolar.core.lp_schedule import DEFAULT_TIME_LIMIT, LPScheduler
+            self.scheduler = LPScheduler(time_limit=DEFAULT_TIME_LIMIT if time_limit is None else time_limit)
+        elif backend == "dp":
+            from balkonsolar.core.dp_schedule import FEED_IN_LIMIT, DPScheduler
+            self.scheduler = DPScheduler(feed_in_limit=FEED_IN_LIMIT * resolution / 60)
+        elif backend == "ensemble":
+            from balkonsolar.core.dp_schedule import FEED_IN_LIMIT, DPScheduler
+            from balkonsolar.core.ensemble import EnsemblePlanner
+            self.scheduler = EnsemblePlanner(point_scheduler=DPScheduler(feed_in_limit=FEED_IN_LIMIT * resolution / 60))
+        # Compiled consumption profile (memory-mapped), loaded on first use
+        self._profile: Optional[np.ndarray] = None
+        # Learned consumption forecast (usage_source "learned"), loaded on first use
+        self._consumption: Optional[ConsumptionForecaster] = None
+        # table -> (fingerprint, forecast series indexed by timestamp)
+        self._forecasts: Dict[str, Tuple[Any, pd.Series]] = {}
+        self.last_timings: Dict[str, float] = {}
+        self.update_error_models()
+
+    def invalidate(self):
+        """
+        Drop all cached inputs, e.g. after the consumption profile was replaced.
+        """
+        self._profile = None
+        self._consumption = None
+        self._forecasts.clear()
+
+    def _forecast(self, table: str) -> Tuple[pd.Series, bool]:
+        """
+        Get a forecast table as a series, re-reading it only if its fingerprint changed.
+
+        Returns:
+            tuple: The series and whether it was re-read.
+        """
+        fingerprint = self.db.table_fingerprint(table)
+        cached = self._forecasts.get(table)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1], False
+
+        column, name = FORECASTS[table]
+        df = self.db.get_history(table)
+        if not isinstance(df, pd.DataFrame) or df.empty or column not in df.columns:
+            series = pd.Series(dtype=float, name=name)
+        else:
+            timestamps = to_local_datetime(df["timestamp"])
+            series = pd.Series(df[column].to_numpy(dtype=float), index=timestamps, name=name)
+            series = series[series.index.notna()]
+            # A repeated timestamp keeps its last value
+            series = series[~series.index.duplicated(keep="last")].sort_index()
+        self._forecasts[table] = (fingerprint, series)
+        return series, True
+
+    def _usage(self, start: datetime, hours: Optional[int] = None) -> np.ndarray:
+        """
+        Expected hourly consumption for `hours` hours (default: the horizon) starting at `start`,
+        from the learned forecast once it is loaded (usage_source "learned"), else the standard profile.
+        """
+        hours = self.horizon if hours is None else hours
+        if self.usage_source == "learned" and self._consumption is not None:
+            return self._consumption.forecast(start, hours, 60)
+        # load_profile() only stats the workbook when the profile is already loaded
+        self._profile = load_profile()
+        return profile_values(start, hours, 60, self._profile)
+
+    def update_error_models(self):
+        """
+        Refit the ensemble's PV and consumption error models from history (backend "ensemble"
+        only; see ensemble.learn_error_models()).
+        """
+        if self.backend != "ensemble":
+            return
+        from balkonsolar.core.ensemble import learn_error_models
+        self.scheduler.pv_model, self.scheduler.usage_model = learn_error_models(self.db, self._usage)
+
+    def inputs(self, start: Optional[datetime] = None) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Collect the planning inputs for the horizon starting at the slot of `start`.
+
+        PV energy from irradiation_data (watt_hours_period, i.e. the energy of the period
+        ending at each timestamp) is spread over the slots without losing energy, consumption
+        comes from the quarter-hour profile (Sundays and holidays with their own day type) or the
+        learned forecast, and each slot gets the most restrictive grid state it overlaps. A new PV
+        forecast also refits the ensemble's error models.
+
+        Args:
+            start: Start of the horizon (default: now).
+
+        Returns:
+            tuple: usage, pv_prod and grid_state per slot indexed by timestamp, and the
+            forecast tables that were re-read.
+        """
+        start = pd.Timestamp(start or datetime.now()).floor(self.freq).to_pydatetime()
+        edges = slot_edges(start, self.slots, self.resolution)
+        slots = edges[:-1]
+
+        usage = None
+        if self.usage_source == "learned":
+            # Folds in the quarter-hours completed since the last run
+            self._consumption = self.db.update_consumption_forecast(self._consumption)
+            if self._consumption is not None:
+                usage = self._consumption.forecast(start, self.slots, self.resolution)
+        if usage is None:
+            # The profile is in quarter-hours, so it is looked up at the slot resolution directly
+            self._profile = load_profile()
+            usage = profile_values(start, self.slots, self.resolution, self._profile) * self.resolution / 60
+        inputs = pd.DataFrame({"usage": usage}, index=slots)
+
+        refreshed = []
+        pv, reread = self._forecast("irradiation_data")
+        if reread:
+            refreshed.append("irradiation_data")
+            self.update_error_models()
+        # Hours without a forecast count as no PV production
+        pv_starts, pv_ends = periods_ending_at(pv.index)
+        inputs["pv_prod"] = resample_energy(pv_starts, pv_ends, pv.to_numpy(), edges)
+
+        grid_state, reread = self._forecast("grid_usage_forecast")
+        if reread:
+            refreshed.append("grid_usage_forecast")
+        # Slots without a forecast get grid state 0
+        inputs["grid_state"] = resample_state(grid_state.index, grid_state.to_numpy(), edges)
+        return inputs, refreshed
+
+    def replan(self, start: Optional[datetime] = None, battery_current: Optional[float] = None,
+               store: bool = True) -> Dict[str, Any]:
+        """
+        Plan the next hours and optionally store the schedule in output_algorithm.
+
+        Args:
+            start: Start of the horizon (default: now).
+            battery_current: Current battery charge (Wh); defaults to the planner's value.
+            store: Write the schedule to the database.
+
+        Returns:
+            dict: "schedule" (DataFrame), "refreshed" (forecast tables re-read), "timings"
+            (milliseconds per phase: inputs, plan, store and total) and "status" (other
+            backends: how the plan was obtained, see LPScheduler.plan(); greedy backend: "greedy").
+        """
+        if battery_current is not None:
+            self.battery_current = battery_current
+        timings = {}
+        begin = time.perf_counter()
+
+        inputs, refreshed = self.inputs(start)
+        mark = time.perf_counter()
+        timings["inputs"] = (mark - begin) * 1000
+
+        schedule = build_schedule(inputs, self.battery_max, self.battery_current, self.scheduler)
+        timings["plan"] = (time.perf_counter() - mark) * 1000
+        mark = time.perf_counter()
+
+        if store:
+            self.db.store_output_algorithm(schedule)
+        timings["store"] = (time.perf_counter() - mark) * 1000
+        timings["total"] = (time.perf_counter() - begin) * 1000
+
+        self.last_timings = timings
+        status = self.scheduler.last_status if self.scheduler is not None else "greedy"
+        return {"schedule": schedule, "refreshed": refreshed, "timings": timings, "status": status}
+
+    def close(self):
+        """
+        Close the database connections.
+        """
+        self.db.close()
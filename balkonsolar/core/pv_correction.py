@@ -0,0 +1,361 @@
+"""
+Bias correction of the PV forecast against measured solar_output.
+
+Forecast.Solar's watt_hours_period does not know the shading, soiling or inverter losses of the
+installation. This module learns a multiplicative correction per season and hour of day from
+(forecast, actual) pairs: each cell keeps exponentially weighted means of the forecast and the
+measured energy, and the factor is their ratio, shrunk towards 1 while a cell has few pairs.
+
+Forecasts are remembered per hour in pv_correction_pending when they are ingested (the latest
+forecast of an hour wins); once the hour is over and rolled up, the pair updates its cell in O(1)
+and moves to pv_correction_pairs, which keeps the pairs of the last PAIR_RETENTION_DAYS for
+fitting forecast error models (see ensemble.py). correct() applies the factors to a freshly
+fetched forecast, which is then stored with the corrected watt_hours next to the original
+watt_hours_raw.
+
+Print the correction table with: python -m balkonsolar.core.pv_correction [db_path]
+"""
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core import rollups
+from balkonsolar.core.resample import periods_ending_at, resample_energy, slot_edges, to_seconds
+from balkonsolar.core.timestamps import to_local_datetime
+
+# Meteorological seasons (DJF, MAM, JJA, SON)
+SEASONS = ("winter", "spring", "summer", "autumn")
+
+# Pairs after which a pair counts half
+HALFLIFE = 14.0
+
+# Weight of the neutral factor 1 in pairs; a cell with this many pairs is half learned
+PRIOR_WEIGHT = 3.0
+
+# Hours forecast below this (Wh) are too dark to learn a ratio from
+MIN_FORECAST_WH = 10.0
+
+# Minimum solar_output samples in an hourly rollup bucket for it to count as measured
+MIN_HOUR_SAMPLES = 45
+
+# Bounds of the correction factor
+MIN_FACTOR = 0.2
+MAX_FACTOR = 3.0
+
+# Days of (forecast, actual) pairs kept in pv_correction_pairs
+PAIR_RETENTION_DAYS = 90
+
+
+def ensure_correction_tables(conn: sqlite3.Connection):
+    """
+    Create the pv_correction tables if they do not exist.
+
+    Args:
+        conn: Open database connection.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pv_correction (
+            season INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            forecast_mean REAL NOT NULL,
+            actual_mean REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (season, hour)
+        ) WITHOUT ROWID
+        """
+    )
+    # Raw forecast energy per hour (local hour start) that still waits for its measurement
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pv_correction_pending (
+            hour TEXT PRIMARY KEY,
+            forecast_wh REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    # Raw forecast and measured energy of past hours
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pv_correction_pairs (
+            hour TEXT PRIMARY KEY,
+            forecast_wh REAL NOT NULL,
+            actual_wh REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.commit()
+
+
+def load_pairs(conn: sqlite3.Connection, start_time: Optional[str] = None) -> pd.DataFrame:
+    """
+    Archived (raw forecast, actual) pairs per hour.
+
+    Args:
+        conn: Open database connection.
+        start_time: Optional inclusive lower bound on the hour start.
+
+    Returns:
+        pd.DataFrame: forecast_wh and actual_wh indexed by the hour start, ascending.
+    """
+    ensure_correction_tables(conn)
+    rows = conn.execute(
+        "SELECT hour, forecast_wh, actual_wh FROM pv_correction_pairs WHERE hour >= ? ORDER BY hour",
+        (start_time or "",),
+    ).fetchall()
+    frame = pd.DataFrame(rows, columns=["hour", "forecast_wh", "actual_wh"])
+    return frame.set_index(pd.to_datetime(frame.pop("hour")))
+
+
+def _cells(seconds: np.ndarray):
+    """
+    Season and hour of day per timestamp (seconds on the local wall clock).
+    """
+    months = seconds.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+    return (months % 12) // 3, (seconds % 86400) // 3600
+
+
+def hourly_forecast(timestamps, watt_hours) -> pd.Series:
+    """
+    Spread a watt_hours_period forecast (energy of the period ending at each timestamp) over
+    whole local hours.
+
+    Args:
+        timestamps: Period ends (local time), ascending.
+        watt_hours: Energy per period (Wh).
+
+    Returns:
+        pd.Series: Energy per hour (Wh) indexed by the hour start.
+    """
+    starts, ends = periods_ending_at(timestamps)
+    if len(ends) == 0:
+        return pd.Series(dtype=float)
+    first = pd.Timestamp(int(starts[0]), unit="s").floor("h")
+    hours = int(-(-(ends[-1] - to_seconds([first])[0]) // 3600))
+    edges = slot_edges(first, hours, 60)
+    return pd.Series(resample_energy(starts, ends, watt_hours, edges), index=edges[:-1])
+
+
+class PVBiasCorrector:
+    """
+    Multiplicative PV forecast correction per (season, hour of day).
+    """
+
+    def __init__(self, halflife: float = HALFLIFE, prior_weight: float = PRIOR_WEIGHT):
+        """
+        Initialize a neutral corrector (all factors 1).
+
+        Args:
+            halflife: Pairs of a cell after which a pair counts half.
+            prior_weight: Weight of the neutral factor in pairs.
+        """
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        self.prior_weight = prior_weight
+        shape = (len(SEASONS), 24)
+        self.forecast_mean = np.zeros(shape)
+        self.actual_mean = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+
+    def update(self, hour_start: datetime, forecast_wh: float, actual_wh: float) -> bool:
+        """
+        Fold one (forecast, actual) pair into its cell in O(1).
+
+        Args:
+            hour_start: Start of the hour (local time).
+            forecast_wh: Raw forecast energy of the hour (Wh).
+            actual_wh: Measured energy of the hour (Wh).
+
+        Returns:
+            bool: Whether the pair was used (hours with a tiny forecast are skipped).
+        """
+        if not forecast_wh >= MIN_FORECAST_WH or np.isnan(actual_wh):
+            return False
+        seasons, hours = _cells(to_seconds([hour_start]))
+        season, hour = int(seasons[0]), int(hours[0])
+        count = self.count[season, hour] + 1
+        rate = max(self.alpha, 1.0 / count)
+        self.forecast_mean[season, hour] += rate * (forecast_wh - self.forecast_mean[season, hour])
+        self.actual_mean[season, hour] += rate * (max(actual_wh, 0.0) - self.actual_mean[season, hour])
+        self.count[season, hour] = count
+        return True
+
+    def factors(self) -> np.ndarray:
+        """
+        Correction factor per season and hour of day (4 x 24).
+        """
+        weight = np.minimum(self.count, (2.0 - self.alpha) / self.alpha)
+        # The prior adds prior_weight pairs with actual == forecast
+        prior = self.prior_weight * self.forecast_mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = (weight * self.actual_mean + prior) / (weight * self.forecast_mean + prior)
+        return np.clip(np.where(self.count > 0, ratio, 1.0), MIN_FACTOR, MAX_FACTOR)
+
+    def factors_at(self, seconds: np.ndarray) -> np.ndarray:
+        """
+        Correction factor per timestamp (seconds on the local wall clock).
+        """
+        seasons, hours = _cells(np.asarray(seconds, dtype=np.int64))
+        return self.factors()[seasons, hours]
+
+    def table(self) -> pd.DataFrame:
+        """
+        The correction table: season, hour, pairs, mean forecast and actual energy, and factor.
+        """
+        seasons, hours = np.indices(self.count.shape)
+        return pd.DataFrame({
+            "season": np.array(SEASONS)[seasons.ravel()],
+            "hour": hours.ravel(),
+            "count": self.count.ravel(),
+            "forecast_mean": self.forecast_mean.ravel(),
+            "actual_mean": self.actual_mean.ravel(),
+            "factor": self.factors().ravel(),
+        })
+
+    def correct(self, forecast: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the factors to a watt_hours_period forecast. Each period gets the factor of the hour
+        it starts in.
+
+        Args:
+            forecast: DataFrame with "timestamp" (period end) and "watt_hours".
+
+        Returns:
+            pd.DataFrame: Copy with corrected "watt_hours" and the original as "watt_hours_raw".
+        """
+        corrected = forecast.copy()
+        raw = corrected["watt_hours"].to_numpy(dtype=float)
+        corrected["watt_hours_raw"] = raw
+        if len(corrected) == 0:
+            return corrected
+        starts, _ = periods_ending_at(to_local_datetime(corrected["timestamp"]))
+        corrected["watt_hours"] = raw * self.factors_at(starts)
+        return corrected
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, **kwargs) -> "PVBiasCorrector":
+        """
+        Load the persisted correction table (a neutral corrector if there is none).
+
+        Args:
+            conn: Open database connection.
+            kwargs: Passed to the constructor.
+        """
+        ensure_correction_tables(conn)
+        corrector = cls(**kwargs)
+        for season, hour, forecast_mean, actual_mean, count in conn.execute(
+            "SELECT season, hour, forecast_mean, actual_mean, count FROM pv_correction"
+        ):
+            corrector.forecast_mean[season, hour] = forecast_mean
+            corrector.actual_mean[season, hour] = actual_mean
+            corrector.count[season, hour] = count
+        return corrector
+
+    def save(self, conn: sqlite3.Connection):
+        """
+        Persist the correction table (96 rows) in one transaction.
+
+        Args:
+            conn: Open database connection.
+        """
+        ensure_correction_tables(conn)
+        seasons, hours = np.indices(self.count.shape)
+        rows = zip(seasons.ravel().tolist(), hours.ravel().tolist(), self.forecast_mean.ravel().tolist(),
+                   self.actual_mean.ravel().tolist(), self.count.ravel().tolist())
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pv_correction (season, hour, forecast_mean, actual_mean, count) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def learn(self, conn: sqlite3.Connection, now: Optional[datetime] = None) -> int:
+        """
+        Pair the pending forecasts of finished hours with the measured solar_output and fold them in.
+        Pending hours without enough measurements are dropped.
+
+        Args:
+            conn: Open database connection.
+            now: Current time; the running hour stays pending (default: now).
+
+        Returns:
+            int: Number of pairs used.
+        """
+        ensure_correction_tables(conn)
+        rollups.refresh_rollups(conn, ("solar_output",))
+        current = str(pd.Timestamp(now or datetime.now()).floor("h"))
+        pending = conn.execute(
+            "SELECT hour, forecast_wh FROM pv_correction_pending WHERE hour < ? ORDER BY hour", (current,)
+        ).fetchall()
+        if not pending:
+            return 0
+        measured = {
+            r["timestamp"]: r["energy_wh"]
+            for r in rollups.query_rollup(conn, "solar_output", "hourly", start_time=pending[0][0], end_time=pending[-1][0])
+            if r["samples"] >= MIN_HOUR_SAMPLES
+        }
+        pairs = [(hour, forecast_wh, max(measured[hour], 0.0)) for hour, forecast_wh in pending if hour in measured]
+        used = sum(self.update(pd.Timestamp(hour), forecast_wh, actual_wh) for hour, forecast_wh, actual_wh in pairs)
+        oldest = str(pd.Timestamp(current) - pd.Timedelta(days=PAIR_RETENTION_DAYS))
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO pv_correction_pairs (hour, forecast_wh, actual_wh) VALUES (?, ?, ?)", pairs)
+            conn.execute("DELETE FROM pv_correction_pairs WHERE hour < ?", (oldest,))
+            conn.execute("DELETE FROM pv_correction_pending WHERE hour < ?", (current,))
+        return used
+
+    def remember(self, conn: sqlite3.Connection, forecast: pd.DataFrame, now: Optional[datetime] = None):
+        """
+        Store the raw hourly forecast of the current and coming hours for learn().
+
+        Args:
+            conn: Open database connection.
+            forecast: DataFrame with "timestamp" (period end) and "watt_hours" (raw).
+            now: Current time (default: now).
+        """
+        ensure_correction_tables(conn)
+        hourly = hourly_forecast(to_local_datetime(forecast["timestamp"]), forecast["watt_hours"].to_numpy(dtype=float))
+        hourly = hourly[hourly.index >= pd.Timestamp(now or datetime.now()).floor("h")]
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pv_correction_pending (hour, forecast_wh) VALUES (?, ?)",
+                zip((str(hour) for hour in hourly.index), hourly.tolist()),
+            )
+
+    def ingest(self, conn: sqlite3.Connection, forecast: pd.DataFrame, now: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Learn from the hours finished since the last ingestion, remember the new raw forecast and
+        return it corrected.
+
+        Args:
+            conn: Open database connection.
+            forecast: Freshly fetched DataFrame with "timestamp" (period end) and "watt_hours".
+            now: Current time (default: now).
+
+        Returns:
+            pd.DataFrame: See correct().
+        """
+        if self.learn(conn, now):
+            self.save(conn)
+        self.remember(conn, forecast, now)
+        return self.correct(forecast)
+
+
+def main():
+    """
+    Print the correction table of a database.
+    """
+    from balkonsolar.core.database_interface import DatabaseInterface
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else None
+    with DatabaseInterface(db_path) as db:
+        table = db.get_pv_correction_table()
+    if table is None:
+        return
+    with pd.option_context("display.max_rows", None):
+        print(table[table["count"] > 0].to_string(index=False) if table["count"].any() else "No pairs learned yet")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Energy-conserving resampling of forecasts onto a planning grid.
+
+Forecasts arrive on irregular periods: Forecast.Solar's watt_hours_period holds the energy of the
+period that ends at each timestamp (hourly, but cut at sunrise and sunset), and StromGedacht
+states cover arbitrary intervals. To plan at 60, 15 or 5 minute resolution, the energies are
+turned into a cumulative energy curve (power constant within each source period) and sampled at
+the slot edges with np.interp, so every Wh lands in the slots its period overlaps and the total
+is preserved. States are mapped onto slots with searchsorted. Both cost O(rows + slots).
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ArrayLike = np.ndarray
+
+
+def to_seconds(timestamps) -> np.ndarray:
+    """
+    Naive datetimes (pandas index/series, NumPy datetime64 or datetime objects) as int64 seconds.
+    """
+    return np.asarray(pd.DatetimeIndex(timestamps).values, dtype="datetime64[s]").astype(np.int64)
+
+
+def slot_edges(start, slots: int, resolution_minutes: int) -> pd.DatetimeIndex:
+    """
+    The slots + 1 edges of a planning grid starting at `start`.
+    """
+    return pd.date_range(start=start, periods=slots + 1, freq=f"{resolution_minutes}min")
+
+
+def periods_ending_at(timestamps) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Period bounds for values that hold the energy since the previous timestamp (Forecast.Solar's
+    watt_hours_period). The first period is taken as long as the second one.
+
+    Returns:
+        tuple: Start and end seconds per value.
+    """
+    ends = to_seconds(timestamps)
+    if len(ends) == 0:
+        return ends, ends
+    first = ends[0] - (ends[1] - ends[0] if len(ends) > 1 else 3600)
+    return np.concatenate([[first], ends[:-1]]), ends
+
+
+def periods_starting_at(timestamps, period_minutes: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Period bounds for values that hold the energy of a fixed period starting at each timestamp
+    (e.g. hourly consumption profiles).
+
+    Returns:
+        tuple: Start and end seconds per value.
+    """
+    starts = to_seconds(timestamps)
+    return starts, starts + period_minutes * 60
+
+
+def resample_energy(starts: np.ndarray, ends: np.ndarray, energy: ArrayLike, edges) -> np.ndarray:
+    """
+    Energy per slot between consecutive edges, spreading each value evenly over its period.
+
+    Args:
+        starts: Period start per value (seconds), ascending and not overlapping.
+        ends: Period end per value (seconds).
+        energy: Energy per period (Wh); NaN counts as 0.
+        edges: Slot edges (datetimes), slots + 1 of them.
+
+    Returns:
+        np.ndarray: Energy per slot (Wh). Parts of slots outside all periods get none.
+    """
+    edge_seconds = to_seconds(edges)
+    energy = np.nan_to_num(np.asarray(energy, dtype=float))
+    if len(energy) == 0:
+        return np.zeros(len(edge_seconds) - 1)
+    # Cumulative energy at each period start and end; flat across gaps between periods
+    cumulative = np.cumsum(energy)
+    knots = np.empty(2 * len(energy), dtype=np.int64)
+    knots[0::2], knots[1::2] = starts, ends
+    values = np.empty(2 * len(energy))
+    values[0::2] = cumulative - energy
+    values[1::2] = cumulative
+    return np.diff(np.interp(edge_seconds, knots, values))
+
+
+def resample_state(timestamps, states: ArrayLike, edges, max_age: Optional[int] = None,
+                   default: float = 0) -> np.ndarray:
+    """
+    State per slot: the highest (most restrictive) state sampled within the slot, or the last
+    state before it.
+
+    Args:
+        timestamps: Sample times, ascending.
+        states: State per sample.
+        edges: Slot edges (datetimes), slots + 1 of them.
+        max_age: Seconds a sample stays valid after its timestamp (default: the median sample
+            spacing); slots starting later get `default`.
+        default: State where no sample applies.
+
+    Returns:
+        np.ndarray: State per slot.
+    """
+    edge_seconds = to_seconds(edges)
+    slots = len(edge_seconds) - 1
+    seconds = to_seconds(timestamps)
+    states = np.asarray(states, dtype=float)
+    if len(seconds) == 0:
+        return np.full(slots, default, dtype=float)
+    if max_age is None:
+        max_age = int(np.median(np.diff(seconds))) if len(seconds) > 1 else 3600
+
+    # Last sample at or before each slot start, if still valid
+    last = np.searchsorted(seconds, edge_seconds[:-1], side="right") - 1
+    valid = (last >= 0) & (edge_seconds[:-1] - seconds[np.maximum(last, 0)] < max_age)
+    result = np.where(valid, states[np.maximum(last, 0)], default)
+
+    # Samples inside each slot: indices first[i]..first[i + 1] - 1
+    first = np.searchsorted(seconds, edge_seconds, side="left")
+    inside = np.diff(first) > 0
+    if inside.any():
+        # A trailing -inf keeps every slot start a valid index without clipping, so the slot
+        # holding the last samples reduces up to its own end
+        within = np.append(states[:first[-1]], -np.inf)
+        maxima = np.maximum.reduceat(within, first[:-1])
+        result[inside] = np.where(valid[inside], np.maximum(result[inside], maxima[inside]), maxima[inside])
+    return result
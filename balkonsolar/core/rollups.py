@@ -0,0 +1,341 @@
+"""
+Rollup tables for Balkonsolar telemetry.
+
+Raw telemetry (solar_output, grid_usage, battery_storage_status) arrives as one row per minute.
+This module keeps 15-minute, hourly and daily aggregates (sample count, min, max, sum and an
+energy integral) in rollup_<resolution> tables. They are updated incrementally from the rows
+added since the last run, so long-range queries cost O(buckets) instead of O(raw samples).
+
+Run a catch-up with: python -m balkonsolar.core.rollups
+"""
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.timestamps import LOCAL_TZ
+
+# Rollup resolutions in seconds, ordered from finest to coarsest
+RESOLUTIONS = {
+    "15min": 15 * 60,
+    "hourly": 60 * 60,
+    "daily": 24 * 60 * 60,
+}
+
+# Raw tables that are rolled up
+ROLLUP_SOURCES = ("solar_output", "grid_usage", "battery_storage_status")
+
+# Gaps between two samples longer than this (seconds) are not integrated into the energy
+DEFAULT_MAX_GAP = 5 * 60
+
+# Raw rows processed per transaction during a catch-up
+DEFAULT_BATCH_SIZE = 10000
+
+
+def rollup_table(resolution: str) -> str:
+    """
+    Name of the rollup table for a resolution, e.g. "rollup_hourly".
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    return f"rollup_{resolution}"
+
+
+def ensure_rollup_tables(conn: sqlite3.Connection):
+    """
+    Create the rollup tables and the rollup_state watermark table if they do not exist.
+
+    Args:
+        conn: Open database connection.
+    """
+    for resolution in RESOLUTIONS:
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {rollup_table(resolution)} (
+                source TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 0,
+                min_value REAL,
+                max_value REAL,
+                sum_value REAL NOT NULL DEFAULT 0,
+                energy_wh REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, bucket)
+            ) WITHOUT ROWID
+            """
+        )
+    # Last raw row folded into the rollups per source, plus the sample needed to continue the energy integral
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            last_tstamp,
+            last_value REAL
+        )
+        """
+    )
+    conn.commit()
+
+
+def _to_seconds(tstamps: Iterable[Any], epoch: bool = False) -> np.ndarray:
+    """
+    Convert timestamps into integer seconds on the local wall clock, so that hourly and daily
+    buckets follow local time. Text timestamps ("YYYY-MM-DD HH:MM:SS", an optional UTC offset
+    is ignored) already are wall-clock times; epoch seconds are shifted into the local time zone.
+    """
+    if epoch:
+        local = pd.to_datetime(np.asarray(tstamps, dtype=np.int64), unit="s", utc=True).tz_convert(LOCAL_TZ).tz_localize(None)
+        return local.values.astype("datetime64[s]").astype(np.int64)
+    return np.array([t[:19] for t in tstamps], dtype="datetime64[s]").astype(np.int64)
+
+
+def _to_text(seconds: np.ndarray) -> List[str]:
+    """
+    Format integer seconds as "YYYY-MM-DD HH:MM:SS".
+    """
+    return np.char.replace(np.datetime_as_string(seconds.astype("datetime64[s]")), "T", " ").tolist()
+
+
+def _aggregate(
+    seconds: np.ndarray,
+    values: np.ndarray,
+    energy_seconds: np.ndarray,
+    energy_wh: np.ndarray,
+    resolution_seconds: int,
+) -> List[tuple]:
+    """
+    Aggregate samples and energy contributions into buckets of the given resolution.
+
+    Returns:
+        List of (bucket, samples, min, max, sum, energy_wh) tuples.
+    """
+    sample_buckets = seconds - seconds % resolution_seconds
+    energy_buckets = energy_seconds - energy_seconds % resolution_seconds
+    buckets, inverse = np.unique(np.concatenate([sample_buckets, energy_buckets]), return_inverse=True)
+    sample_idx = inverse[: len(sample_buckets)]
+    energy_idx = inverse[len(sample_buckets):]
+
+    n = len(buckets)
+    counts = np.bincount(sample_idx, minlength=n)
+    sums = np.bincount(sample_idx, weights=values, minlength=n)
+    energy = np.bincount(energy_idx, weights=energy_wh, minlength=n)
+    mins = np.full(n, np.inf)
+    maxs = np.full(n, -np.inf)
+    np.minimum.at(mins, sample_idx, values)
+    np.maximum.at(maxs, sample_idx, values)
+
+    rows = []
+    for bucket, count, lo, hi, total, wh in zip(_to_text(buckets), counts, mins, maxs, sums, energy):
+        has_samples = count > 0
+        rows.append((
+            bucket,
+            int(count),
+            float(lo) if has_samples else None,
+            float(hi) if has_samples else None,
+            float(total),
+            float(wh),
+        ))
+    return rows
+
+
+def _upsert(conn: sqlite3.Connection, source: str, resolution: str, rows: List[tuple]):
+    """
+    Merge aggregated buckets into a rollup table.
+    """
+    conn.executemany(
+        f"""
+        INSERT INTO {rollup_table(resolution)} (source, bucket, samples, min_value, max_value, sum_value, energy_wh)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(source, bucket) DO UPDATE SET
+            samples = samples + excluded.samples,
+            min_value = COALESCE(MIN(min_value, excluded.min_value), min_value, excluded.min_value),
+            max_value = COALESCE(MAX(max_value, excluded.max_value), max_value, excluded.max_value),
+            sum_value = sum_value + excluded.sum_value,
+            energy_wh = energy_wh + excluded.energy_wh
+        """,
+        [(source, *row) for row in rows],
+    )
+
+
+def source_layout(conn: sqlite3.Connection, source: str) -> Tuple[str, bool]:
+    """
+    Watermark column and timestamp representation of a raw source.
+
+    Returns:
+        tuple: ("id", or "tstamp" for epoch schema tables without an id, whether tstamp holds epoch seconds).
+    """
+    column_types = {row[1]: (row[2] or "").upper() for row in conn.execute(f"PRAGMA table_info({source})")}
+    return ("id" if "id" in column_types else "tstamp"), column_types.get("tstamp") == "INTEGER"
+
+
+def fold_new_rows(
+    conn: sqlite3.Connection,
+    source: str,
+    key: str,
+    epoch: bool,
+    max_gap: int = DEFAULT_MAX_GAP,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Fold the raw rows of one source added after its watermark into all rollup tables.
+
+    Each batch is committed together with whatever the caller's transaction holds, so a writer
+    can insert a sample and fold it with a single commit. The rollup tables must exist.
+
+    Args:
+        conn: Open database connection.
+        source: Raw table or view.
+        key, epoch: Layout of the source, see source_layout().
+        max_gap: Longest gap between samples (seconds) that is still integrated.
+        batch_size: Raw rows processed per transaction.
+
+    Returns:
+        int: Number of raw rows processed.
+    """
+    state = conn.execute(
+        "SELECT last_id, last_tstamp, last_value FROM rollup_state WHERE source = ?", (source,)
+    ).fetchone()
+    last_id, last_tstamp, last_value = state if state else (0, None, None)
+    processed = 0
+
+    while True:
+        rows = conn.execute(
+            f"SELECT {key}, tstamp, value FROM {source} WHERE {key} > ? AND tstamp IS NOT NULL ORDER BY {key} LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return processed
+
+        ids, tstamps, values = zip(*rows)
+        seconds = _to_seconds(tstamps, epoch)
+        values = np.asarray(values, dtype=float)
+
+        # Energy segments between consecutive samples, continuing from the previous batch
+        if last_tstamp is not None:
+            seq_seconds = np.concatenate([_to_seconds([last_tstamp], epoch), seconds])
+            seq_values = np.concatenate([[last_value], values])
+        else:
+            seq_seconds, seq_values = seconds, values
+        dt = np.diff(seq_seconds)
+        valid = (dt > 0) & (dt <= max_gap)
+        energy_seconds = seq_seconds[:-1][valid]
+        energy_wh = seq_values[:-1][valid] * dt[valid] / 3600.0
+
+        with conn:
+            for resolution, resolution_seconds in RESOLUTIONS.items():
+                _upsert(conn, source, resolution, _aggregate(seconds, values, energy_seconds, energy_wh, resolution_seconds))
+            last_id, last_tstamp, last_value = ids[-1], tstamps[-1], float(values[-1])
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_state (source, last_id, last_tstamp, last_value) VALUES (?, ?, ?, ?)",
+                (source, last_id, last_tstamp, last_value),
+            )
+        processed += len(rows)
+
+
+def refresh_rollups(
+    conn: sqlite3.Connection,
+    sources: Iterable[str] = ROLLUP_SOURCES,
+    max_gap: int = DEFAULT_MAX_GAP,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Fold raw rows added since the last run into all rollup tables.
+
+    The energy integral uses the left Riemann sum: each sample's value is held until the next
+    sample, and the resulting Wh (for W inputs) are booked into the bucket of the earlier sample.
+
+    Args:
+        conn: Open database connection.
+        sources: Raw tables to roll up.
+        max_gap: Longest gap between samples (seconds) that is still integrated.
+        batch_size: Raw rows processed per transaction.
+
+    Returns:
+        int: Number of raw rows processed.
+    """
+    ensure_rollup_tables(conn)
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    processed = 0
+    for source in sources:
+        if source in existing:
+            key, epoch = source_layout(conn, source)
+            processed += fold_new_rows(conn, source, key, epoch, max_gap, batch_size)
+    return processed
+
+
+def choose_resolution(span_seconds: float, min_points: int) -> Optional[str]:
+    """
+    Pick the coarsest rollup resolution that still yields at least min_points buckets.
+
+    Args:
+        span_seconds: Length of the requested time range in seconds.
+        min_points: Minimum number of points the caller needs.
+
+    Returns:
+        str or None: Resolution name, or None if only raw data is fine enough.
+    """
+    for resolution, resolution_seconds in sorted(RESOLUTIONS.items(), key=lambda item: -item[1]):
+        if span_seconds / resolution_seconds >= min_points:
+            return resolution
+    return None
+
+
+def query_rollup(
+    conn: sqlite3.Connection,
+    source: str,
+    resolution: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Read aggregated buckets of a source table, newest first.
+
+    Args:
+        conn: Open database connection.
+        source: Raw table name, e.g. "solar_output".
+        resolution: One of RESOLUTIONS.
+        start_time: Optional inclusive lower bound on the bucket start.
+        end_time: Optional inclusive upper bound on the bucket start.
+
+    Returns:
+        List of dicts with timestamp, value (mean), min, max, samples and energy_wh.
+    """
+    query = (
+        f"SELECT bucket, samples, min_value, max_value, sum_value, energy_wh "
+        f"FROM {rollup_table(resolution)} WHERE source = ?"
+    )
+    params: List[Any] = [source]
+    if start_time:
+        query += " AND bucket >= ?"
+        params.append(start_time)
+    if end_time:
+        query += " AND bucket <= ?"
+        params.append(end_time)
+    query += " ORDER BY bucket DESC"
+
+    return [
+        {
+            "timestamp": bucket,
+            "value": total / samples if samples else None,
+            "min": lo,
+            "max": hi,
+            "samples": samples,
+            "energy_wh": energy,
+        }
+        for bucket, samples, lo, hi, total, energy in conn.execute(query, params)
+    ]
+
+
+def main():
+    """
+    Run a rollup catch-up against the default database.
+    """
+    from balkonsolar.core.database_interface import DatabaseInterface
+
+    db = DatabaseInterface()
+    print(f"Rolled up {db.refresh_rollups()} new rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,148 @@ Balkonsolar System Optimization Rules
 
 Provides the core logic to determine the optimal operating state for a Balkonsolar system based on grid demand, solar production, and battery status.
 
-This algorithm determines the optimal operating state for a Balkonsolar system
-based on current grid demand, solar production, and battery capacity.
+The inputs are reduced to four bits (grid demand high, solar production high, battery filled,
+battery low) and the state is looked up in a compiled 16-entry decision table indexed by
+G << 3 | S << 2 | BF << 1 | BL. determine_balkonsolar_state() evaluates one tick;
+determine_balkonsolar_states() classifies whole NumPy arrays of ticks at once. Alternative
+tables can be loaded from a JSON file with load_table() or by setting RULES_TABLE in the
+environment.
 
 States:
 0 - Use solar to power household
 1 - Charge battery from solar
 2 - Use battery to power household
 3 - Use grid to power household
-
-Args:
-    grid_demand (int): Current grid demand level from Stromgedacht API (0, 1, or 2)
-    solar_production (float): Current solar production (Watts)
-    current_battery_percent (float): Current battery capacity (percentage)
-    max_solar_capacity (float): Maximum solar production capacity (Watts)
-    max_battery_percent (float): Maximum battery capacity (percentage)
-    min_battery_percent (float): Minimum desired battery charge level (percentage)
-
-Returns:
-    int: The recommended state (0-3)
 """
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
 
 USER_SOLAR_HIGH_THRESHOLD = 0.50
 STROMGEDACHT_HIGH_THRESHOLD = 1
 
+# States
+USE_SOLAR = 0
+CHARGE_BATTERY = 1
+USE_BATTERY = 2
+USE_GRID = 3
+RULE_STATES = ("use solar", "charge battery", "use battery", "use grid")
+
+# Bit positions of the table index
+GRID_HIGH_BIT = 8
+SOLAR_HIGH_BIT = 4
+BATTERY_FILLED_BIT = 2
+BATTERY_LOW_BIT = 1
+
+# Rule fields in JSON tables, in bit order
+RULE_FIELDS = ("grid_high", "solar_high", "battery_filled", "battery_low")
+
+
+def _compile_default() -> np.ndarray:
+    """
+    The built-in truth table:
+
+    G | S | BF | BL | State
+    -----------------------
+    * | 1 | 1  | *  | 0  (Solar high, battery filled -> Use solar)
+    * | 1 | 0  | *  | 1  (Solar high, battery not filled -> Charge battery)
+    1 | 0 | *  | 0  | 2  (Grid demand high, solar low, battery not low -> Use battery)
+    0 | 0 | *  | *  | 3  (Grid demand low, solar low -> Use grid)
+    * | 0 | *  | 1  | 3  (Solar low, battery low -> Use grid)
+    """
+    table = np.empty(16, dtype=np.int8)
+    for index in range(16):
+        grid_high = bool(index & GRID_HIGH_BIT)
+        solar_high = bool(index & SOLAR_HIGH_BIT)
+        battery_filled = bool(index & BATTERY_FILLED_BIT)
+        battery_low = bool(index & BATTERY_LOW_BIT)
+        if solar_high:
+            table[index] = USE_SOLAR if battery_filled else CHARGE_BATTERY
+        elif battery_low or not grid_high:
+            table[index] = USE_GRID
+        else:
+            table[index] = USE_BATTERY
+    table.flags.writeable = False
+    return table
+
+
+DEFAULT_TABLE = _compile_default()
+
+
+def compile_table(rules: List[Dict[str, Any]], default: Optional[int] = None) -> np.ndarray:
+    """
+    Compile a list of rules into a decision table.
+
+    Each rule maps some of grid_high, solar_high, battery_filled and battery_low (0/1; a missing
+    field or null matches both) to a state. The first matching rule wins.
+
+    Args:
+        rules: Rules such as {"grid_high": 1, "solar_high": 0, "battery_low": 0, "state": 2}.
+        default: State for combinations no rule matches; without it every combination must match.
+
+    Returns:
+        np.ndarray: 16-entry table of states.
+    """
+    table = np.full(16, -1, dtype=np.int8)
+    for rule in rules:
+        state = rule.get("state")
+        if state not in range(len(RULE_STATES)):
+            raise ValueError(f"Invalid state in rule {rule}")
+        unknown = set(rule) - set(RULE_FIELDS) - {"state"}
+        if unknown:
+            raise ValueError(f"Unknown fields in rule {rule}: {sorted(unknown)}")
+        for index in range(16):
+            bits = [bool(index & bit) for bit in (GRID_HIGH_BIT, SOLAR_HIGH_BIT, BATTERY_FILLED_BIT, BATTERY_LOW_BIT)]
+            matches = all(rule.get(field) is None or bool(rule[field]) == bit for field, bit in zip(RULE_FIELDS, bits))
+            if matches and table[index] < 0:
+                table[index] = state
+    if default is not None:
+        if default not in range(len(RULE_STATES)):
+            raise ValueError(f"Invalid default state {default}")
+        table[table < 0] = default
+    if (table < 0).any():
+        raise ValueError(f"Rules do not cover table entries {np.flatnonzero(table < 0).tolist()}")
+    table.flags.writeable = False
+    return table
+
+
+def load_table(path: str) -> np.ndarray:
+    """
+    Load a decision table from a JSON file, either as the full table
+    ({"table": [16 states indexed by G << 3 | S << 2 | BF << 1 | BL]}) or as rules
+    ({"rules": [...], "default": 3}, see compile_table()).
+
+    Args:
+        path: Path of the JSON file.
+
+    Returns:
+        np.ndarray: 16-entry table of states.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if "table" in config:
+        table = np.asarray(config["table"], dtype=np.int8)
+        if table.shape != (16,) or table.min() < 0 or table.max() >= len(RULE_STATES):
+            raise ValueError(f"{path}: table must hold 16 states between 0 and {len(RULE_STATES) - 1}")
+        table.flags.writeable = False
+        return table
+    if "rules" in config:
+        return compile_table(config["rules"], config.get("default"))
+    raise ValueError(f"{path}: expected a 'table' or 'rules' entry")
+
+
+@lru_cache(maxsize=1)
+def default_table() -> np.ndarray:
+    """
+    The table used when none is passed: loaded from the file in RULES_TABLE if set, otherwise
+    the built-in DEFAULT_TABLE.
+    """
+    path = os.getenv("RULES_TABLE")
+    return load_table(path) if path else DEFAULT_TABLE
+
 
 def determine_balkonsolar_state(
     grid_demand,
@@ -35,19 +153,21 @@ def determine_balkonsolar_state(
     current_battery_capacity, # we get this from moritz,
     max_solar_capacity, #user
     battery_high_threshold = 0.8, # we get this from user
-    min_battery_percent = 0.25 # we get this from user
+    min_battery_percent = 0.25, # we get this from user
+    table: Optional[np.ndarray] = None,
 ):
     """
     Determine the optimal state for the Balkonsolar system.
 
     Args:
-        grid_demand (int): Current grid demand level from Stromgedacht API (0, 1, or 2)
+        grid_demand (int): Current grid state from the StromGedacht API (-1, 1, 3 or 4)
         solar_production (float): Current solar production (Watts)
         max_battery_capacity (float): Maximum battery capacity (Wh)
         current_battery_capacity (float): Current battery charge (Wh)
         max_solar_capacity (float): Maximum solar production capacity (Watts)
         battery_high_threshold (float): Threshold for considering battery 'full' (default 0.8)
         min_battery_percent (float): Minimum desired battery charge level (default 0.25)
+        table: Decision table (default: default_table())
 
     Returns:
         int: The recommended state (0=use solar, 1=charge battery, 2=use battery, 3=use grid)
@@ -55,36 +175,70 @@ def determine_balkonsolar_state(
     # Define thresholds for solar production (high if > 50% of maximum capacity)
     solar_high_threshold = USER_SOLAR_HIGH_THRESHOLD * max_solar_capacity
     current_battery_percent = current_battery_capacity/max_battery_capacity
-    # Convert raw values to binary states
-    is_grid_demand_high = grid_demand > STROMGEDACHT_HIGH_THRESHOLD  # Stromgedacht API: 0=low, 1 or 2=high
-    is_solar_production_high = solar_production > solar_high_threshold
-    is_battery_filled = current_battery_percent >= battery_high_threshold
-    is_battery_low = current_battery_percent < min_battery_percent
-
-    # Implementation of the truth table from the image
-    # G | S | BF | State
-    # ------------------
-    # 0 | 0 | 0  | 3  (Grid demand low, Solar low, Battery low -> Use grid)
-    # 0 | 0 | 1  | 0  (Not in table, but logically: Grid demand low, Solar low, Battery high -> Use battery)
-    # 0 | 1 | 0  | 1  (Grid demand low, Solar high, Battery low -> Charge battery)
-    # 0 | 1 | 1  | 0  (Grid demand low, Solar high, Battery high -> Use solar)
-    # 1 | 0 | 0  | 3  (Grid demand high, Solar low, Battery low -> Use grid)
-    # 1 | 0 | 1  | 2  (Grid demand high, Solar low, Battery high -> Use battery)
-    # 1 | 1 | 0  | 1  (Grid demand high, Solar high, Battery low -> Charge battery)
-    # 1 | 1 | 1  | 0  (Grid demand high, Solar high, Battery high -> Use solar)
-
-    # Logic implementation based on the truth table and requirements
-    if is_solar_production_high:
-        if is_battery_filled:
-            return 0  # Use solar to power household
-        else:
-            return 1  # Charge battery from solar
-    else:
-        # Solar production is low
-        if is_battery_low or not is_grid_demand_high:
-            return 3  # Use grid to power household
-        else:
-            return 2  # Use battery to power household
+    index = (
+        GRID_HIGH_BIT * (grid_demand > STROMGEDACHT_HIGH_THRESHOLD)
+        | SOLAR_HIGH_BIT * (solar_production > solar_high_threshold)
+        | BATTERY_FILLED_BIT * (current_battery_percent >= battery_high_threshold)
+        | BATTERY_LOW_BIT * (current_battery_percent < min_battery_percent)
+    )
+    return int((default_table() if table is None else table)[index])
+
+
+def rule_index(
+    grid_demand: Union[np.ndarray, float],
+    solar_production: Union[np.ndarray, float],
+    max_battery_capacity: Union[np.ndarray, float],
+    current_battery_capacity: Union[np.ndarray, float],
+    max_solar_capacity: Union[np.ndarray, float],
+    battery_high_threshold: float = 0.8,
+    min_battery_percent: float = 0.25,
+) -> np.ndarray:
+    """
+    Table index (G << 3 | S << 2 | BF << 1 | BL) for arrays of ticks; the arguments broadcast
+    against each other and have the same meaning as in determine_balkonsolar_state().
+
+    Returns:
+        np.ndarray: Index per tick (uint8).
+    """
+    grid_demand = np.asarray(grid_demand)
+    solar_production = np.asarray(solar_production)
+    current_battery_percent = np.asarray(current_battery_capacity) / np.asarray(max_battery_capacity)
+    index = (grid_demand > STROMGEDACHT_HIGH_THRESHOLD).astype(np.uint8) << 3
+    index |= (solar_production > USER_SOLAR_HIGH_THRESHOLD * np.asarray(max_solar_capacity)).astype(np.uint8) << 2
+    index |= (current_battery_percent >= battery_high_threshold).astype(np.uint8) << 1
+    index |= (current_battery_percent < min_battery_percent).astype(np.uint8)
+    return index
+
+
+def determine_balkonsolar_states(
+    grid_demand: Union[np.ndarray, float],
+    solar_production: Union[np.ndarray, float],
+    max_battery_capacity: Union[np.ndarray, float],
+    current_battery_capacity: Union[np.ndarray, float],
+    max_solar_capacity: Union[np.ndarray, float],
+    battery_high_threshold: float = 0.8,
+    min_battery_percent: float = 0.25,
+    table: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Vectorized determine_balkonsolar_state(): classify many ticks in one call.
+
+    Args:
+        grid_demand: Grid state per tick.
+        solar_production: Solar production per tick (Watts).
+        max_battery_capacity: Maximum battery capacity (Wh), scalar or per tick.
+        current_battery_capacity: Battery charge per tick (Wh).
+        max_solar_capacity: Maximum solar production capacity (Watts), scalar or per tick.
+        battery_high_threshold: Threshold for considering battery 'full'.
+        min_battery_percent: Minimum desired battery charge level.
+        table: Decision table (default: default_table()).
+
+    Returns:
+        np.ndarray: State per tick (int8), in the broadcast shape of the inputs.
+    """
+    index = rule_index(grid_demand, solar_production, max_battery_capacity, current_battery_capacity,
+                       max_solar_capacity, battery_high_threshold, min_battery_percent)
+    return (default_table() if table is None else table)[index]
 
 
 # USAGE
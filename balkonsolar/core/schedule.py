@@ -0,0 +1,121 @@
+"""
+Greedy battery schedule for Balkonsolar.
+
+Given hourly usage, PV production and grid state forecasts, the battery is charged from the PV
+surplus of the hours with the cleanest grid first (and within a grid state, the largest surplus
+first) until it is full. Hours with a surplus that is not needed for charging power the household
+from solar; all others use the grid.
+
+The allocation is computed with a stable sort and cumulative sums instead of row iteration, and
+works on 1-D arrays (one horizon) as well as on N-D arrays whose last axis is time (many
+households or scenarios planned in one call).
+"""
+from collections import namedtuple
+from typing import Union
+
+import numpy as np
+
+ArrayLike = Union[np.ndarray, list, float]
+
+# Suggested states; Schedule.state holds indices into this tuple
+USE_GRID = 0
+CHARGE_BATTERY = 1
+MIXED = 2
+USE_SOLAR = 3
+# Only planned by the LP and DP backends (lp_schedule.py, dp_schedule.py), the greedy plan never discharges
+USE_BATTERY = 4
+STATES = ("use grid", "charge battery", "mixed", "power the household from solar", "use battery")
+
+# Relative cost of one Wh from the grid per StromGedacht state (-1 = ideally use now,
+# 1 = normal, 3 = reduce to save cost/CO2, 4 = reduce to prevent shortfalls); 0 = no forecast
+GRID_STATE_COSTS = {-1: 0.5, 0: 1.0, 1: 1.0, 3: 2.0, 4: 4.0}
+
+Schedule = namedtuple("Schedule", ["battery_input", "state", "surplus"])
+Schedule.__doc__ = """
+Result of plan_schedule(), arrays of the shape of the inputs.
+
+    battery_input: Net energy into the battery per slot (Wh), negative when discharging.
+    state: Suggested state per slot as an index into STATES.
+    surplus: PV production minus usage per slot (Wh).
+"""
+
+
+def plan_schedule(
+    usage: ArrayLike,
+    pv_prod: ArrayLike,
+    grid_state: ArrayLike,
+    battery_max: ArrayLike,
+    battery_current: ArrayLike,
+) -> Schedule:
+    """
+    Plan when to charge the battery from PV surplus.
+
+    Args:
+        usage: Expected household consumption per slot (Wh), shape (..., T).
+        pv_prod: Expected PV production per slot (Wh), shape (..., T).
+        grid_state: Grid state per slot (lower = cleaner), shape (..., T).
+        battery_max: Battery capacity (Wh), scalar or shape (...).
+        battery_current: Current battery charge (Wh), scalar or shape (...).
+
+    The leading axes of all inputs broadcast, e.g. one 1-D forecast of shape (T,) is planned for
+    N batteries of shape (N,).
+
+    Returns:
+        Schedule: Battery input, suggested state and surplus per slot, of the broadcast shape.
+    """
+    usage = np.asarray(usage, dtype=float)
+    pv_prod = np.asarray(pv_prod, dtype=float)
+    grid_state = np.asarray(grid_state, dtype=float)
+    needed = np.asarray(battery_max, dtype=float) - np.asarray(battery_current, dtype=float)
+    # The batteries get a time axis of length 1 so they broadcast against the forecasts' leading axes
+    surplus, grid_state, needed = np.broadcast_arrays(pv_prod - usage, grid_state, needed[..., np.newaxis])
+    needed = needed[..., 0]
+
+    # Charging order: cleanest grid first, then largest surplus; ties keep their time order
+    order = np.lexsort((-surplus, grid_state), axis=-1)
+    available = np.take_along_axis(np.maximum(surplus, 0.0), order, axis=-1)
+    # Energy still needed before each slot in charging order, when every earlier slot charged fully
+    remaining = needed[..., np.newaxis] - (np.cumsum(available, axis=-1) - available)
+    charged = np.minimum(available, np.maximum(remaining, 0.0))
+
+    battery_input = np.empty_like(charged)
+    np.put_along_axis(battery_input, order, charged, axis=-1)
+
+    return Schedule(battery_input, classify_states(battery_input, surplus), surplus)
+
+
+def classify_states(battery_input: np.ndarray, surplus: np.ndarray) -> np.ndarray:
+    """
+    Suggested state per slot for a planned battery input.
+
+    Args:
+        battery_input: Net energy into the battery per slot (Wh), negative when discharging.
+        surplus: PV production minus usage per slot (Wh).
+
+    Returns:
+        np.ndarray: Indices into STATES.
+    """
+    state = np.full(np.shape(surplus), USE_GRID, dtype=np.int8)
+    state[surplus > 0] = USE_SOLAR
+    state[battery_input < 0] = USE_BATTERY
+    state[battery_input > 0] = CHARGE_BATTERY
+    state[(battery_input > 0) & (surplus > battery_input)] = MIXED
+    return state
+
+
+def grid_costs(grid_state: ArrayLike) -> np.ndarray:
+    """
+    Map grid states to import costs; unknown states cost as much as normal operation.
+    """
+    grid_state = np.asarray(grid_state, dtype=float)
+    costs = np.full(grid_state.shape, GRID_STATE_COSTS[1])
+    for state, cost in GRID_STATE_COSTS.items():
+        costs[grid_state == state] = cost
+    return costs
+
+
+def state_labels(state: np.ndarray) -> np.ndarray:
+    """
+    Translate state indices into the labels stored in output_algorithm.
+    """
+    return np.asarray(STATES, dtype=object)[state]
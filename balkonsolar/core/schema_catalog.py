@@ -0,0 +1,225 @@
+"""
+Schema catalog for the Balkonsolar SQLite database.
+
+Loads table/view names, columns, the timestamp column and indexes once and keeps them in memory,
+so readers do not have to probe sqlite_master or PRAGMA table_info before every query.
+The catalog reloads itself when PRAGMA schema_version changes and can be invalidated explicitly
+after a table is replaced.
+"""
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Timestamp column names in order of preference. Logger tables use "tstamp",
+# tables written with DataFrame.to_sql use "timestamp".
+TIMESTAMP_COLUMNS = ("tstamp", "timestamp")
+
+# Co-sampled signals that the wide telemetry table stores as one column each
+TELEMETRY_SIGNALS = ("battery_storage_status", "solar_output", "grid_usage")
+
+
+def epoch_table_sql(table: str, columns: str) -> str:
+    """
+    Build the CREATE TABLE statement of an epoch schema table: integer UTC epoch seconds
+    in tstamp, clustered on it with WITHOUT ROWID so range scans read adjacent pages.
+
+    Args:
+        table: Table name.
+        columns: Column definitions after the tstamp column, e.g. "value REAL NOT NULL".
+    """
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            tstamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            {columns},
+            PRIMARY KEY (tstamp)
+        ) WITHOUT ROWID
+        """
+
+
+def telemetry_schema_sql(epoch: bool = False) -> List[str]:
+    """
+    Build the statements of the wide telemetry schema: one telemetry row per tick with a column
+    per signal, plus a view per signal with the old (id, tstamp, value) layout. Each view has an
+    INSTEAD OF INSERT trigger that upserts into its column, so existing writers keep working.
+
+    Args:
+        epoch: Use integer epoch timestamps (clustered, WITHOUT ROWID) instead of text.
+
+    Returns:
+        List of SQL statements; the first one creates the telemetry table.
+    """
+    signal_columns = ", ".join(f"{signal} REAL" for signal in TELEMETRY_SIGNALS)
+    if epoch:
+        statements = [epoch_table_sql("telemetry", signal_columns)]
+        view_columns = "tstamp"
+        now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    else:
+        statements = [f"""
+        CREATE TABLE IF NOT EXISTS telemetry (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tstamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP UNIQUE,
+            {signal_columns}
+        )
+        """]
+        view_columns = "id, tstamp"
+        now = "CURRENT_TIMESTAMP"
+
+    for signal in TELEMETRY_SIGNALS:
+        statements.append(
+            f"CREATE VIEW IF NOT EXISTS {signal} AS "
+            f"SELECT {view_columns}, {signal} AS value FROM telemetry WHERE {signal} IS NOT NULL"
+        )
+        statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {signal}_insert INSTEAD OF INSERT ON {signal}
+        BEGIN
+            INSERT INTO telemetry (tstamp, {signal}) VALUES (COALESCE(NEW.tstamp, {now}), NEW.value)
+            ON CONFLICT(tstamp) DO UPDATE SET {signal} = excluded.{signal};
+        END
+        """)
+    return statements
+
+
+@dataclass
+class TableInfo:
+    """
+    Cached metadata of one table or view.
+    """
+    name: str
+    kind: str  # "table" or "view"
+    columns: List[str]
+    column_types: Dict[str, str] = field(default_factory=dict)
+    indexes: List[str] = field(default_factory=list)
+
+    @property
+    def timestamp_column(self) -> Optional[str]:
+        """Name of the timestamp column, or None if the table has none."""
+        for name in TIMESTAMP_COLUMNS:
+            if name in self.columns:
+                return name
+        return None
+
+    @property
+    def epoch(self) -> bool:
+        """True if the timestamp column stores integer epoch seconds (epoch schema)."""
+        column = self.timestamp_column
+        return column is not None and self.column_types.get(column) == "INTEGER"
+
+    def has_column(self, name: str) -> bool:
+        return name in self.columns
+
+
+class SchemaCatalog:
+    """
+    In-memory catalog of the database schema.
+
+    Lookups are answered from memory. Callers that reuse a long-lived connection call validate(),
+    which compares PRAGMA schema_version (a single header read) with the loaded version and drops
+    the cache if another connection changed the schema. A lookup of an unknown table checks the
+    version as well, to pick up tables created by other connections.
+    """
+
+    def __init__(self):
+        self._tables: Dict[str, TableInfo] = {}
+        self._schema_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._schema_version is not None
+
+    def load(self, conn: sqlite3.Connection):
+        """
+        (Re)load the catalog from the database.
+
+        Args:
+            conn: Open connection to the database.
+        """
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        tables = {}
+        rows = conn.execute(
+            "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        for name, kind in rows:
+            columns = conn.execute(f'PRAGMA table_info("{name}")').fetchall()
+            indexes = conn.execute(f'PRAGMA index_list("{name}")').fetchall() if kind == "table" else []
+            tables[name] = TableInfo(
+                name=name,
+                kind=kind,
+                columns=[col[1] for col in columns],
+                column_types={col[1]: (col[2] or "").upper() for col in columns},
+                indexes=[index[1] for index in indexes],
+            )
+        with self._lock:
+            self._tables = tables
+            self._schema_version = schema_version
+
+    def invalidate(self):
+        """
+        Drop the cached schema. The next lookup reloads it.
+        """
+        with self._lock:
+            self._tables = {}
+            self._schema_version = None
+
+    def validate(self, conn: sqlite3.Connection) -> bool:
+        """
+        Drop the cached schema if it changed since it was loaded. The next lookup reloads it.
+
+        Args:
+            conn: Connection that was just checked out.
+
+        Returns:
+            bool: True if the cache was dropped.
+        """
+        if not self.loaded or conn.execute("PRAGMA schema_version").fetchone()[0] == self._schema_version:
+            return False
+        self.invalidate()
+        return True
+
+    def refresh_if_changed(self, conn: sqlite3.Connection) -> bool:
+        """
+        Reload the catalog if the schema changed since it was loaded.
+
+        Returns:
+            bool: True if the catalog was reloaded.
+        """
+        if self.loaded:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if schema_version == self._schema_version:
+                return False
+        self.load(conn)
+        return True
+
+    def table(self, conn: sqlite3.Connection, name: str) -> Optional[TableInfo]:
+        """
+        Get the metadata of a table or view.
+
+        Args:
+            conn: Open connection, only used if the catalog has to be (re)loaded.
+            name: Table or view name.
+
+        Returns:
+            TableInfo or None if the table does not exist.
+        """
+        if not self.loaded:
+            self.load(conn)
+        info = self._tables.get(name)
+        if info is None and not self.refresh_if_changed(conn):
+            return None
+        return info or self._tables.get(name)
+
+    def tables(self, conn: sqlite3.Connection) -> List[str]:
+        """
+        Get the names of all tables and views.
+        """
+        if not self.loaded:
+            self.load(conn)
+        return list(self._tables)
+
+    def timestamp_column(self, conn: sqlite3.Connection, name: str) -> Optional[str]:
+        """
+        Resolve the timestamp column ("tstamp" or "timestamp") of a table.
+        """
+        info = self.table(conn, name)
+        return info.timestamp_column if info else None
@@ -0,0 +1,94 @@
+"""
+Chunked reads of Balkonsolar history tables.
+
+Instead of fetchall() or read_sql_query over a whole table, rows are pulled with fetchmany in
+fixed-size chunks and handed out one chunk at a time, so exports, backtests and other long
+scans run in constant memory regardless of how much history they cover.
+"""
+import sqlite3
+from typing import Any, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from balkonsolar.core.schema_catalog import TableInfo
+from balkonsolar.core.timestamps import from_epoch, time_bound, to_local_datetime
+
+# Rows fetched per chunk
+DEFAULT_CHUNK_SIZE = 5000
+
+# Chunk formats: single row dicts, DataFrames, or dicts of NumPy arrays
+OUTPUTS = ("records", "pandas", "numpy")
+
+
+def iter_history(
+    conn: sqlite3.Connection,
+    info: TableInfo,
+    start_time: Optional[Any] = None,
+    end_time: Optional[Any] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    output: str = "records",
+) -> Iterator[Union[dict, pd.DataFrame]]:
+    """
+    Stream the rows of a table in timestamp order (oldest first).
+
+    The timestamp column is always returned as "timestamp". In "records" mode it keeps the
+    stored text (epoch seconds are formatted as local text); in "pandas" and "numpy" mode it
+    is converted to naive local datetimes.
+
+    Args:
+        conn: Open database connection. It must stay open while the iterator is consumed.
+        info: Catalog entry of the table.
+        start_time: Optional inclusive lower bound (text or datetime, local time).
+        end_time: Optional inclusive upper bound (text or datetime, local time).
+        chunk_size: Rows fetched from SQLite per chunk.
+        output: "records" yields one dict per row, "pandas" one DataFrame per chunk and
+            "numpy" one dict of column name -> array per chunk.
+
+    Returns:
+        Iterator over rows or chunks.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output format: {output}")
+    tstamp = info.timestamp_column
+    if tstamp is None:
+        raise ValueError(f"Table {info.name} has no timestamp column")
+
+    columns: List[str] = ["timestamp" if column == tstamp else column for column in info.columns]
+    select = ", ".join(f'"{column}" AS timestamp' if column == tstamp else f'"{column}"' for column in info.columns)
+    query = f"SELECT {select} FROM {info.name}"
+    conditions, params = [], []
+    if start_time is not None:
+        conditions.append(f"{tstamp} >= ?")
+        params.append(time_bound(start_time, info.epoch))
+    if end_time is not None:
+        conditions.append(f"{tstamp} <= ?")
+        params.append(time_bound(end_time, info.epoch))
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {tstamp}"
+
+    cursor = conn.cursor()
+    # Plain tuples are cheaper than sqlite3.Row and are all the chunk builders need
+    cursor.row_factory = None
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            if output == "records":
+                for row in rows:
+                    record = dict(zip(columns, row))
+                    if info.epoch and record["timestamp"] is not None:
+                        record["timestamp"] = from_epoch(record["timestamp"])
+                    yield record
+                continue
+
+            frame = pd.DataFrame.from_records(rows, columns=columns)
+            frame["timestamp"] = to_local_datetime(frame["timestamp"])
+            if output == "pandas":
+                yield frame
+            else:
+                yield {column: frame[column].to_numpy() for column in columns}
+    finally:
+        cursor.close()
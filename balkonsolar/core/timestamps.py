@@ -0,0 +1,124 @@
+"""
+Timestamp helpers for the Balkonsolar database.
+
+Tables use either text timestamps ("%Y-%m-%d %H:%M:%S" in local time, sometimes with a UTC offset)
+or, in the opt-in epoch schema, integer UTC epoch seconds. These helpers convert between both
+representations and turn timestamp columns into pandas datetimes without per-row parsing.
+"""
+import datetime
+import os
+from typing import Any, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path="balkonsolar/.env")
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+
+def local_timezone() -> ZoneInfo:
+    """
+    Resolve the local time zone as a DST-aware zone: TIMEZONE from the .env file, else the TZ
+    environment variable, else the system zone in /etc/localtime.
+
+    Raises:
+        RuntimeError: No zone could be determined; set TIMEZONE (e.g. Europe/Berlin).
+    """
+    if os.getenv("TIMEZONE"):
+        return ZoneInfo(os.environ["TIMEZONE"])
+    try:
+        return ZoneInfo(os.getenv("TZ", "").lstrip(":"))
+    except (ValueError, ZoneInfoNotFoundError):
+        pass
+    try:
+        target = os.path.realpath("/etc/localtime")
+        if "zoneinfo/" in target:
+            return ZoneInfo(target.split("zoneinfo/", 1)[1])
+        with open("/etc/localtime", "rb") as f:
+            return ZoneInfo.from_file(f, key="localtime")
+    except (OSError, ValueError, ZoneInfoNotFoundError):
+        pass
+    raise RuntimeError("Cannot determine the local time zone; set TIMEZONE (e.g. Europe/Berlin) in balkonsolar/.env")
+
+
+# Time zone of naive text timestamps (AppDaemon logs in the configured local time). Resolved once
+# as a real zone, so conversions stay correct across DST switches; database_utils shares it.
+LOCAL_TZ = local_timezone()
+
+
+def to_epoch(value: Union[str, datetime.datetime, int, float]) -> int:
+    """
+    Convert a timestamp to integer UTC epoch seconds.
+
+    Args:
+        value: Text timestamp, datetime or epoch seconds. Naive values are taken as local time.
+
+    Returns:
+        int: Seconds since 1970-01-01 UTC.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=LOCAL_TZ)
+    return int(value.timestamp())
+
+
+def from_epoch(seconds: int) -> str:
+    """
+    Format epoch seconds as a local text timestamp.
+    """
+    return datetime.datetime.fromtimestamp(seconds, LOCAL_TZ).strftime(TIMESTAMP_FORMAT)
+
+
+def now_timestamp() -> str:
+    """
+    Current local time as a text timestamp, the default for samples stored without one.
+    """
+    return datetime.datetime.now(LOCAL_TZ).strftime(TIMESTAMP_FORMAT)
+
+
+def time_bound(value: Union[str, datetime.datetime], epoch: bool) -> Any:
+    """
+    Convert a range bound to the representation of a timestamp column.
+
+    Args:
+        value: Bound as datetime or text.
+        epoch: True if the column stores epoch seconds.
+    """
+    if epoch:
+        return to_epoch(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def to_local_datetime(series: pd.Series) -> pd.Series:
+    """
+    Convert a timestamp column to naive local datetimes in one vectorized step.
+
+    Handles epoch seconds, text timestamps with or without a UTC offset suffix
+    (the wall-clock part is kept) and columns that already hold datetimes.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit="s", utc=True).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    return pd.to_datetime(series.astype(str).str.slice(0, 19), format=TIMESTAMP_FORMAT)
+
+
+def to_epoch_series(series: pd.Series) -> pd.Series:
+    """
+    Convert a timestamp column to integer UTC epoch seconds in one vectorized step.
+    Naive values are taken as local time.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("int64")
+    values = pd.to_datetime(series)
+    if values.dt.tz is None:
+        values = values.dt.tz_localize(LOCAL_TZ, ambiguous="NaT", nonexistent="shift_forward")
+    return (values.dt.tz_convert("UTC") - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
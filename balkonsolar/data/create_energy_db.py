@@ -1,18 +1,37 @@
 import sqlite3
 import os
 
+from balkonsolar.core.rollups import ensure_rollup_tables
+from balkonsolar.core.schema_catalog import epoch_table_sql
+from balkonsolar.data.migrate_telemetry_table import migrate_to_telemetry
+
 """
 Database creation script for Balkonsolar energy monitoring.
 
 Creates a SQLite database with tables for solar output, battery status, grid usage, irradiation, and forecasts. Intended to be run once during setup or for database resets.
+The opt-in epoch schema stores UTC epoch seconds in an INTEGER tstamp column and clusters every table on it (WITHOUT ROWID).
+The opt-in telemetry table stores battery, solar and grid readings as one row per tick; the per-signal tables become views on it.
 """
 
-def create_energy_database(db_path="balkonsolar/data/energy_data.db"):
+# Value columns of the epoch schema tables. Every table gets "tstamp INTEGER PRIMARY KEY" in front.
+EPOCH_SCHEMA_COLUMNS = {
+    "solar_output": "value REAL NOT NULL",
+    "battery_storage_status": "value REAL NOT NULL",
+    "grid_usage": "value REAL NOT NULL",
+    "output_algorithm": "usage REAL, battery_input REAL, pv_prod REAL, grid_state INTEGER, suggested_state TEXT",
+    "irradiation_data": "watt_hours REAL, watt_hours_raw REAL",
+    "grid_usage_forecast": "grid_state INTEGER",
+}
+
+
+def create_energy_database(db_path="balkonsolar/data/energy_data.db", epoch_schema=False, telemetry_table=False):
     """
     Create a SQLite database with tables for energy monitoring and forecasting.
 
     Args:
         db_path (str): Path where the database will be created (default: 'balkonsolar/data/energy_data.db').
+        epoch_schema (bool): Create the tables with integer epoch timestamps, clustered on tstamp.
+        telemetry_table (bool): Store battery, solar and grid readings in the wide telemetry table.
     """
     # Ensure directory exists if needed
     db_dir = os.path.dirname(db_path)
@@ -23,6 +42,21 @@ def create_energy_database(db_path="balkonsolar/data/energy_data.db"):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
+    # Let the retention job hand freed pages back with PRAGMA incremental_vacuum (must precede the first table)
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    if epoch_schema:
+        # Clustered tables need no separate timestamp index
+        for table, columns in EPOCH_SCHEMA_COLUMNS.items():
+            cursor.execute(epoch_table_sql(table, columns))
+        ensure_rollup_tables(conn)
+        conn.commit()
+        if telemetry_table:
+            migrate_to_telemetry(conn)
+        conn.close()
+        print(f"Database created successfully at: {db_path} (epoch schema)")
+        return
+
     # Create tables
     tables = [
         # Solar output table
@@ -94,12 +128,19 @@ def create_energy_database(db_path="balkonsolar/data/energy_data.db"):
     for index_query in indexes:
         cursor.execute(index_query)
 
+    # Create the 15-minute, hourly and daily rollup tables
+    ensure_rollup_tables(conn)
+
     # Commit changes and close connection
     conn.commit()
+    if telemetry_table:
+        # Replace the per-signal tables (and their indexes) by views on the telemetry table
+        migrate_to_telemetry(conn)
     conn.close()
 
     print(f"Database created successfully at: {db_path}")
     print("Tables created: solar_output, battery_storage_status, grid_usage, output_algorithm")
 
 if __name__ == "__main__":
-    create_energy_database()
+    import sys
+    create_energy_database(epoch_schema="--epoch" in sys.argv, telemetry_table="--telemetry" in sys.argv)
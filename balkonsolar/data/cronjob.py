@@ -5,6 +5,9 @@ Periodically fetches and stores solar and grid forecast data by running the stor
 """
 from apscheduler.schedulers.background import BackgroundScheduler
 from store_data_for_scheduling import main as store_data_for_scheduling
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.data.retention import apply_retention
+from balkonsolar.data import parquet_archive
 import multiprocessing
 from datetime import datetime
 
@@ -16,6 +19,29 @@ def main():
     scheduler = BackgroundScheduler()
     # Schedule the job to run every 30 minutes, with a timeout of 20 seconds
     scheduler.add_job(call_timeout, 'interval', minutes=30, misfire_grace_time=60, next_run_time=datetime.now(), args=(20, store_data_for_scheduling))
+    # Fold new telemetry rows into the rollup tables every 5 minutes
+    scheduler.add_job(call_timeout, 'interval', minutes=5, misfire_grace_time=60, next_run_time=datetime.now(), args=(60, refresh_rollups))
+    # Delete expired rows and reclaim the space once a night
+    scheduler.add_job(call_timeout, 'cron', hour=3, minute=30, misfire_grace_time=3600, args=(1800, compact_database))
+
+
+def refresh_rollups():
+    """
+    Catch up the 15-minute, hourly and daily rollup tables with the latest raw telemetry.
+    """
+    DatabaseInterface().refresh_rollups()
+
+
+def compact_database():
+    """
+    Apply the retention policies (see balkonsolar/data/retention.py) and print the reclaimed space.
+    Expired telemetry and forecast rows are exported to the Parquet archive first if pyarrow is installed.
+    """
+    db = DatabaseInterface()
+    archive = parquet_archive.make_archiver() if parquet_archive.pa is not None else None
+    report = apply_retention(db.db_path, archive=archive)
+    deleted = ", ".join(f"{table}: {rows}" for table, rows in report["deleted"].items() if rows)
+    print(f"Retention: deleted {deleted or 'nothing'}, reclaimed {report['reclaimed_bytes']} bytes")
 
 
 def call_timeout(timeout, func):
@@ -0,0 +1,232 @@
+"""
+Migration of an existing Balkonsolar database to the epoch schema.
+
+Every table with a text timestamp column ("tstamp" or "timestamp") is rewritten into a table with
+integer UTC epoch seconds in tstamp, clustered on it (WITHOUT ROWID). Rows are copied in small
+batches with a commit after each, so AppDaemon can keep writing while the copy runs. Rows that
+arrive during the copy are picked up in a short final transaction that also swaps the tables.
+The per-signal views and INSERT triggers of the wide telemetry table are recreated for the epoch
+schema in the same transaction. Long-running readers should be restarted afterwards so they
+reload the schema.
+
+Run with: python -m balkonsolar.data.migrate_epoch_schema [--db PATH] [--tables T ...]
+"""
+import argparse
+import os
+import sqlite3
+from typing import Any, Iterable, List, Optional, Tuple
+
+from balkonsolar.core.rollups import ROLLUP_SOURCES
+from balkonsolar.core.schema_catalog import TELEMETRY_SIGNALS, TIMESTAMP_COLUMNS, epoch_table_sql, telemetry_schema_sql
+from balkonsolar.core.timestamps import to_epoch
+
+DEFAULT_DB_PATH = "balkonsolar/data/energy_data.db"
+
+# Rows copied per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _convert_rows(rows: List[tuple]) -> Tuple[List[tuple], int]:
+    """
+    Convert the timestamp (second field after the rowid) of copied rows to epoch seconds.
+
+    Returns:
+        Converted rows without the rowid, and the number of rows skipped for a missing
+        or unparsable timestamp.
+    """
+    converted = []
+    skipped = 0
+    for _, tstamp, *values in rows:
+        try:
+            converted.append((to_epoch(tstamp), *values))
+        except (TypeError, ValueError):
+            skipped += 1
+    return converted, skipped
+
+
+def _copy_rows(conn: sqlite3.Connection, select: str, insert: str, last_rowid: int, batch_size: int) -> Tuple[int, int, int]:
+    """
+    Copy one batch of rows after last_rowid.
+
+    Returns:
+        Tuple of (new last rowid, rows read, rows skipped).
+    """
+    rows = conn.execute(select, (last_rowid, batch_size)).fetchall()
+    if not rows:
+        return last_rowid, 0, 0
+    converted, skipped = _convert_rows(rows)
+    conn.executemany(insert, converted)
+    return rows[-1][0], len(rows), skipped
+
+
+def migrate_table(conn: sqlite3.Connection, table: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Rewrite one table into the epoch schema.
+
+    Naive text timestamps are taken as local time, timestamps with a UTC offset are converted
+    exactly. Several rows within the same second collapse into the last one, since tstamp is
+    the primary key.
+
+    Args:
+        conn: Open database connection.
+        table: Table to migrate.
+        batch_size: Rows copied per transaction.
+
+    Returns:
+        int: Number of rows copied (0 if the table already uses the epoch schema).
+    """
+    columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    if not columns:
+        raise ValueError(f"Table {table} does not exist")
+    column_types = {col[1]: (col[2] or "").upper() for col in columns}
+    timestamp_column = next((name for name in TIMESTAMP_COLUMNS if name in column_types), None)
+    if timestamp_column is None:
+        raise ValueError(f"Table {table} has no timestamp column")
+    if column_types[timestamp_column] == "INTEGER":
+        return 0
+
+    # Keep every column except the rowid alias and the DataFrame index written by to_sql
+    value_columns = [col for col in columns if col[1] not in ("id", "index", timestamp_column)]
+    definitions = ", ".join(
+        " ".join(part for part in (f'"{col[1]}"', col[2], "NOT NULL" if col[3] else "") if part)
+        for col in value_columns
+    )
+    names = ", ".join(f'"{col[1]}"' for col in value_columns)
+    target = f"{table}__epoch"
+
+    # A leftover from an interrupted run is rebuilt from scratch
+    conn.execute(f"DROP TABLE IF EXISTS {target}")
+    conn.execute(epoch_table_sql(target, definitions))
+    conn.commit()
+
+    select = f'SELECT rowid, "{timestamp_column}", {names} FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?'
+    insert = f"INSERT OR REPLACE INTO {target} (tstamp, {names}) VALUES ({', '.join('?' * (len(value_columns) + 1))})"
+
+    last_rowid, copied, skipped = 0, 0, 0
+    while True:
+        with conn:
+            last_rowid, read, dropped = _copy_rows(conn, select, insert, last_rowid, batch_size)
+        if not read:
+            break
+        copied += read
+        skipped += dropped
+        print(f"{table}: copied {copied} rows")
+
+    # Catch up with rows written during the copy and swap the tables in one transaction
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        while True:
+            last_rowid, read, dropped = _copy_rows(conn, select, insert, last_rowid, batch_size)
+            if not read:
+                break
+            copied += read
+            skipped += dropped
+        for source in _rollup_sources(table):
+            _move_rollup_watermark(conn, source)
+        # The telemetry views (and with them their triggers) would block the rename
+        if table == "telemetry":
+            for signal in TELEMETRY_SIGNALS:
+                conn.execute(f"DROP VIEW IF EXISTS {signal}")
+        conn.execute(f'DROP TABLE "{table}"')
+        conn.execute(f'ALTER TABLE {target} RENAME TO "{table}"')
+        if table == "telemetry":
+            for statement in telemetry_schema_sql(epoch=True)[1:]:
+                conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if skipped:
+        print(f"{table}: skipped {skipped} rows without a valid timestamp")
+    kept = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    if kept < copied - skipped:
+        print(f"{table}: merged {copied - skipped - kept} rows sharing a second with another row")
+    return copied
+
+
+def _rollup_sources(table: str) -> Tuple[str, ...]:
+    """
+    Rollup sources read from a table: the table itself, or the views over the telemetry table.
+    """
+    if table == "telemetry":
+        return tuple(signal for signal in TELEMETRY_SIGNALS if signal in ROLLUP_SOURCES)
+    return (table,) if table in ROLLUP_SOURCES else ()
+
+
+def _move_rollup_watermark(conn: sqlite3.Connection, table: str):
+    """
+    Translate the rollup watermark of a migrated source from a row id to epoch seconds,
+    which is what refresh_rollups compares against for tables without an id.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_state'").fetchone()
+    if not exists:
+        return
+    state = conn.execute("SELECT last_tstamp FROM rollup_state WHERE source = ?", (table,)).fetchone()
+    if state is None or state[0] is None:
+        return
+    watermark = to_epoch(state[0])
+    conn.execute(
+        "UPDATE rollup_state SET last_id = ?, last_tstamp = ? WHERE source = ?",
+        (watermark, watermark, table),
+    )
+
+
+def migrate_database(
+    db_path: str = DEFAULT_DB_PATH,
+    tables: Optional[Iterable[str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    vacuum: bool = True,
+) -> dict:
+    """
+    Migrate all (or the given) timestamped tables of a database to the epoch schema.
+
+    Args:
+        db_path: Path to the database file.
+        tables: Tables to migrate; defaults to every table with a timestamp column except rollups.
+        batch_size: Rows copied per transaction.
+        vacuum: Run VACUUM afterwards to return the space of the old tables.
+
+    Returns:
+        dict: Rows copied per table.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if tables is None:
+            tables = []
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall():
+                if name.startswith("rollup_") or name.endswith("__epoch"):
+                    continue
+                column_names = {col[1] for col in conn.execute(f'PRAGMA table_info("{name}")')}
+                if column_names & set(TIMESTAMP_COLUMNS):
+                    tables.append(name)
+
+        results = {table: migrate_table(conn, table, batch_size) for table in tables}
+
+        if vacuum:
+            size_before = os.path.getsize(db_path)
+            conn.execute("VACUUM")
+            print(f"VACUUM: {size_before} -> {os.path.getsize(db_path)} bytes")
+        return results
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[Any]] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Migrate the Balkonsolar database to integer epoch timestamps.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database file")
+    parser.add_argument("--tables", nargs="*", help="Tables to migrate (default: all timestamped tables)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows copied per transaction")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM after the migration")
+    args = parser.parse_args(argv)
+
+    results = migrate_database(args.db, args.tables, args.batch_size, vacuum=not args.no_vacuum)
+    for table, rows in results.items():
+        print(f"{table}: {rows} rows migrated")
+
+
+if __name__ == "__main__":
+    main()
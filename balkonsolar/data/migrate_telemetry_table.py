@@ -0,0 +1,142 @@
+"""
+Migration of the per-signal telemetry tables into the wide telemetry table.
+
+battery_storage_status, solar_output and grid_usage are merged into one telemetry table with a row
+per timestamp and a column per signal. The old tables are replaced by views with the same
+(id, tstamp, value) layout, whose INSTEAD OF INSERT triggers write into the telemetry table, so
+readers and writers that still address the old tables keep working. Works on text timestamp and
+epoch schema databases alike.
+
+Run with: python -m balkonsolar.data.migrate_telemetry_table [--db PATH]
+"""
+import argparse
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from balkonsolar.core.schema_catalog import TELEMETRY_SIGNALS, telemetry_schema_sql
+
+DEFAULT_DB_PATH = "balkonsolar/data/energy_data.db"
+
+
+def migrate_to_telemetry(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Merge the per-signal tables into the telemetry table and replace them with views,
+    all in one transaction.
+
+    Samples of different signals with the same timestamp end up in the same row; of repeated
+    timestamps within one signal the largest value is kept. Rows are inserted in timestamp
+    order, so telemetry ids grow with time like the rollup watermark expects.
+
+    Args:
+        conn: Open database connection.
+
+    Returns:
+        dict: Rows copied per signal (empty if the database already uses the telemetry table).
+    """
+    kinds = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')").fetchall())
+    if kinds.get("telemetry") == "table":
+        return {}
+    sources = [signal for signal in TELEMETRY_SIGNALS if kinds.get(signal) == "table"]
+    epoch = any(
+        col[1] == "tstamp" and (col[2] or "").upper() == "INTEGER"
+        for signal in sources
+        for col in conn.execute(f"PRAGMA table_info({signal})")
+    )
+    statements = telemetry_schema_sql(epoch)
+
+    # One SELECT per signal that puts its value into the signal's column and NULL elsewhere
+    selects = [
+        "SELECT tstamp, " + ", ".join(f"value AS {column}" if column == signal else f"NULL AS {column}" for column in TELEMETRY_SIGNALS)
+        + f" FROM {signal} WHERE tstamp IS NOT NULL"
+        for signal in sources
+    ]
+
+    copied = {}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(statements[0])
+        for signal in sources:
+            copied[signal] = conn.execute(f"SELECT COUNT(*) FROM {signal} WHERE tstamp IS NOT NULL").fetchone()[0]
+        if selects:
+            conn.execute(
+                f"""
+                INSERT INTO telemetry (tstamp, {", ".join(TELEMETRY_SIGNALS)})
+                SELECT tstamp, {", ".join(f"MAX({column})" for column in TELEMETRY_SIGNALS)}
+                FROM ({" UNION ALL ".join(selects)})
+                GROUP BY tstamp ORDER BY tstamp
+                """
+            )
+        for signal in sources:
+            conn.execute(f"DROP TABLE {signal}")
+        for statement in statements[1:]:
+            conn.execute(statement)
+        if not epoch:
+            _move_rollup_watermarks(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return copied
+
+
+def _move_rollup_watermarks(conn: sqlite3.Connection):
+    """
+    Point the rollup watermarks of text timestamp databases at telemetry ids. The old per-table
+    ids are gone; the last telemetry row at or before the last rolled-up timestamp takes over.
+    (Epoch databases use tstamp as the watermark, which is unchanged.)
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_state'").fetchone()
+    if not exists:
+        return
+    conn.execute(
+        """
+        UPDATE rollup_state
+        SET last_id = COALESCE((SELECT MAX(id) FROM telemetry WHERE tstamp <= rollup_state.last_tstamp), 0)
+        WHERE source IN ({})
+        """.format(", ".join("?" for _ in TELEMETRY_SIGNALS)),
+        TELEMETRY_SIGNALS,
+    )
+
+
+def migrate_database(db_path: str = DEFAULT_DB_PATH, vacuum: bool = True) -> Dict[str, int]:
+    """
+    Migrate a database file to the telemetry table.
+
+    Args:
+        db_path: Path to the database file.
+        vacuum: Run VACUUM afterwards to return the space of the old tables.
+
+    Returns:
+        dict: Rows copied per signal.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        copied = migrate_to_telemetry(conn)
+        if copied and vacuum:
+            size_before = os.path.getsize(db_path)
+            conn.execute("VACUUM")
+            print(f"VACUUM: {size_before} -> {os.path.getsize(db_path)} bytes")
+        return copied
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[Any]] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Merge the Balkonsolar telemetry tables into one wide table.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database file")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM after the migration")
+    args = parser.parse_args(argv)
+
+    copied = migrate_database(args.db, vacuum=not args.no_vacuum)
+    if not copied:
+        print("Database already uses the telemetry table")
+    for signal, rows in copied.items():
+        print(f"{signal}: {rows} rows merged into telemetry")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Parquet archive for long-term Balkonsolar history.
+
+Cold rows of the telemetry and forecast tables are exported into date-partitioned Parquet files
+(<archive>/<table>/date=YYYY-MM-DD/*.parquet) and can then be deleted from SQLite. Reads memory-map
+the files and push the time range down to partition pruning and row-group statistics, so an
+analysis over a year of data only decodes the columns and days it asks for.
+
+pyarrow is optional; only this module needs it.
+
+Run with: python -m balkonsolar.data.parquet_archive export [--days 30] [--delete]
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from balkonsolar.core import streaming
+from balkonsolar.core.schema_catalog import SchemaCatalog, TableInfo
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+DEFAULT_DB_PATH = "balkonsolar/data/energy_data.db"
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+
+# Tables that are archived
+ARCHIVE_TABLES = (
+    "solar_output", "grid_usage", "battery_storage_status", "telemetry", "irradiation_data", "grid_usage_forecast",
+)
+
+# Rows exported per chunk
+DEFAULT_CHUNK_SIZE = 50000
+
+# Row ids are meaningless outside SQLite (and absent in the epoch schema), so they are not archived
+DROPPED_COLUMNS = ("id",)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet archive needs pyarrow: pip install pyarrow")
+
+
+def _table_dir(table: str, archive_dir: str) -> str:
+    return os.path.join(archive_dir, table)
+
+
+def _dataset(table: str, archive_dir: str) -> Optional["ds.Dataset"]:
+    """
+    Open the archived dataset of a table with memory-mapped file access, or None if empty.
+    """
+    path = _table_dir(table, archive_dir)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format="parquet", partitioning="hive", filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def archived_until(table: str, archive_dir: str = ARCHIVE_DIR) -> Optional[datetime.datetime]:
+    """
+    Newest timestamp already in the archive of a table, or None if nothing is archived.
+    """
+    _require_pyarrow()
+    path = _table_dir(table, archive_dir)
+    days = sorted(name for name in os.listdir(path) if name.startswith("date=")) if os.path.isdir(path) else []
+    if not days:
+        return None
+    # Partitions are whole days, so only the newest one has to be scanned
+    newest = ds.dataset(os.path.join(path, days[-1]), format="parquet").to_table(columns=["timestamp"])
+    return pc.max(newest["timestamp"]).as_py()
+
+
+def export_table(
+    conn: sqlite3.Connection,
+    info: TableInfo,
+    before: datetime.datetime,
+    archive_dir: str = ARCHIVE_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Export the rows of a table older than `before` that are not archived yet.
+
+    Args:
+        conn: Open database connection.
+        info: Catalog entry of the table.
+        before: Exclusive upper bound (local time).
+        archive_dir: Root directory of the archive.
+        chunk_size: Rows read from SQLite and written per chunk.
+
+    Returns:
+        int: Number of rows exported.
+    """
+    _require_pyarrow()
+    dataset = _dataset(info.name, archive_dir)
+    schema = dataset.schema if dataset is not None else None
+    start = archived_until(info.name, archive_dir)
+    # One token per run keeps file names unique across exports
+    token = uuid.uuid4().hex[:8]
+
+    exported = 0
+    chunks = streaming.iter_history(conn, info, start_time=start, chunk_size=chunk_size, output="pandas")
+    for index, frame in enumerate(chunks):
+        frame = frame.drop(columns=[c for c in DROPPED_COLUMNS if c in frame.columns])
+        done = bool((frame["timestamp"] >= before).any())
+        frame = frame[frame["timestamp"] < before]
+        if start is not None:
+            # The lower bound is inclusive, the last archived row must not be written twice
+            frame = frame[frame["timestamp"] > start]
+        if not frame.empty:
+            exported += _write_chunk(frame, info.name, archive_dir, schema, f"{info.name}-{token}-{index}-{{i}}.parquet")
+            if schema is None:
+                schema = _dataset(info.name, archive_dir).schema
+        if done:
+            break
+    return exported
+
+
+def _write_chunk(frame: pd.DataFrame, table_name: str, archive_dir: str, schema, basename_template: str) -> int:
+    """
+    Append one chunk of rows to the archive of a table, split into day partitions.
+    """
+    frame = frame.assign(date=frame["timestamp"].dt.strftime("%Y-%m-%d"))
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.set_column(
+        table.schema.get_field_index("timestamp"), "timestamp", table["timestamp"].cast(pa.timestamp("s"))
+    )
+    if schema is not None:
+        # Later exports follow the column types of the first one (e.g. an all-NULL chunk)
+        table = table.select(schema.names).cast(schema)
+    ds.write_dataset(
+        table,
+        _table_dir(table_name, archive_dir),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+        basename_template=basename_template,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def archive_database(
+    db_path: str = DEFAULT_DB_PATH,
+    days: int = 30,
+    tables: Iterable[str] = ARCHIVE_TABLES,
+    archive_dir: str = ARCHIVE_DIR,
+    delete: bool = False,
+) -> Dict[str, int]:
+    """
+    Export whole days older than `days` of the given tables, optionally deleting them from SQLite.
+
+    Args:
+        db_path: Path to the database file.
+        days: Keep this many days (plus the current one) only in SQLite.
+        tables: Tables to archive.
+        archive_dir: Root directory of the archive.
+        delete: Delete exported rows from SQLite afterwards (in batches, see retention.py).
+
+    Returns:
+        dict: Rows exported per table.
+    """
+    _require_pyarrow()
+    from balkonsolar.data.retention import delete_expired, rollup_watermark
+
+    # Cut at midnight so every archived partition holds a complete day
+    midnight = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    before = midnight - datetime.timedelta(days=days)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        catalog = SchemaCatalog()
+        exported = {}
+        for table in tables:
+            info = catalog.table(conn, table)
+            # Views over the telemetry table are covered by archiving the table itself
+            if info is None or info.kind != "table" or info.timestamp_column is None:
+                continue
+            exported[table] = export_table(conn, info, before, archive_dir)
+            if delete:
+                # Raw telemetry is only deleted once it is rolled up
+                rolled_up, watermark = rollup_watermark(conn, table)
+                if not rolled_up or watermark is not None:
+                    delete_expired(conn, info, days, now=midnight, not_after=watermark)
+        return exported
+    finally:
+        conn.close()
+
+
+def make_archiver(archive_dir: str = ARCHIVE_DIR, tables: Iterable[str] = ARCHIVE_TABLES):
+    """
+    Build an `archive` callback for retention.apply_retention() that exports expired rows of the
+    archived tables to Parquet before they are deleted.
+    """
+    tables = set(tables)
+
+    def archive(conn: sqlite3.Connection, info: TableInfo, cutoff: datetime.datetime) -> int:
+        if info.name not in tables or info.timestamp_column is None:
+            return 0
+        return export_table(conn, info, cutoff, archive_dir)
+
+    return archive
+
+
+def read_archive(
+    table: str,
+    start_time: Optional[Any] = None,
+    end_time: Optional[Any] = None,
+    columns: Optional[List[str]] = None,
+    archive_dir: str = ARCHIVE_DIR,
+    output: str = "pandas",
+) -> Any:
+    """
+    Read archived rows of a table within a time range.
+
+    The range is pushed down to the scan: partitions outside the date range are skipped and
+    row groups are filtered by their timestamp statistics. Files are memory-mapped.
+
+    Args:
+        table: Table name.
+        start_time: Optional inclusive lower bound (text or datetime, local time).
+        end_time: Optional inclusive upper bound (text or datetime, local time).
+        columns: Columns to read (default: all); "timestamp" is always included.
+        archive_dir: Root directory of the archive.
+        output: "pandas" (DataFrame), "numpy" (dict of arrays, zero-copy where the data
+            allows) or "arrow" (pyarrow.Table).
+
+    Returns:
+        The rows sorted by timestamp in the requested format.
+    """
+    _require_pyarrow()
+    if output not in ("pandas", "numpy", "arrow"):
+        raise ValueError(f"Unknown output format: {output}")
+    dataset = _dataset(table, archive_dir)
+    if dataset is None:
+        empty = pa.table({"timestamp": pa.array([], pa.timestamp("s"))})
+        return _convert(empty, output)
+
+    condition = None
+    for bound, op in ((start_time, "ge"), (end_time, "le")):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound).floor("s").to_pydatetime()
+        day = bound.strftime("%Y-%m-%d")
+        if op == "ge":
+            part = (ds.field("date") >= day) & (ds.field("timestamp") >= pa.scalar(bound, pa.timestamp("s")))
+        else:
+            part = (ds.field("date") <= day) & (ds.field("timestamp") <= pa.scalar(bound, pa.timestamp("s")))
+        condition = part if condition is None else condition & part
+
+    if columns is None:
+        # The date partition column only exists for pruning
+        columns = [name for name in dataset.schema.names if name != "date"]
+    columns = ["timestamp"] + [c for c in columns if c != "timestamp"]
+    result = dataset.to_table(columns=columns, filter=condition)
+    result = result.sort_by("timestamp")
+    return _convert(result, output)
+
+
+def _convert(table: "pa.Table", output: str) -> Any:
+    if output == "arrow":
+        return table
+    if output == "numpy":
+        return {name: table[name].to_numpy() for name in table.column_names}
+    return table.to_pandas()
+
+
+def main(argv: Optional[List[Any]] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Archive old Balkonsolar data to Parquet.")
+    parser.add_argument("command", choices=["export"], help="Action to run")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database file")
+    parser.add_argument("--days", type=int, default=30, help="Days that stay only in SQLite")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="Archive root directory")
+    parser.add_argument("--tables", nargs="*", default=list(ARCHIVE_TABLES), help="Tables to archive")
+    parser.add_argument("--delete", action="store_true", help="Delete exported rows from SQLite")
+    args = parser.parse_args(argv)
+
+    exported = archive_database(args.db, args.days, args.tables, args.archive_dir, args.delete)
+    for table, rows in exported.items():
+        print(f"{table}: {rows} rows archived")
+
+
+if __name__ == "__main__":
+    main()
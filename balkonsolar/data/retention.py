@@ -0,0 +1,336 @@
+"""
+Retention and compaction for the Balkonsolar database.
+
+Deletes rows older than a per-table retention period in small batches (one short write
+transaction each, so the AppDaemon loggers are never blocked for long), then returns the freed
+pages to the file system with PRAGMA incremental_vacuum and reports the reclaimed space.
+
+Raw telemetry is rolled up before it is deleted, and never deleted past the rollup watermark,
+so the rollups keep every sample that retention removes.
+
+Databases created before auto_vacuum=INCREMENTAL was the default need a one-time migration
+(a full VACUUM that locks the database while it runs) before the space can be reclaimed:
+
+    python -m balkonsolar.data.retention --enable-incremental-vacuum
+
+Run with: python -m balkonsolar.data.retention [--db PATH] [--policy TABLE=DAYS ...] [--dry-run]
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from balkonsolar.core import rollups
+from balkonsolar.core.schema_catalog import TELEMETRY_SIGNALS, SchemaCatalog, TableInfo
+from balkonsolar.core.timestamps import from_epoch, time_bound
+
+DEFAULT_DB_PATH = "balkonsolar/data/energy_data.db"
+
+# Days to keep per table; None keeps the table forever
+RETENTION_POLICIES: Dict[str, Optional[int]] = {
+    # Raw minute telemetry; the rollups keep the long-term picture
+    "solar_output": 30,
+    "grid_usage": 30,
+    "battery_storage_status": 30,
+    "telemetry": 30,
+    # Rollups
+    "rollup_15min": 365,
+    "rollup_hourly": 5 * 365,
+    "rollup_daily": None,
+    # Forecasts and planner output are only useful around their horizon
+    "irradiation_data": 7,
+    "grid_usage_forecast": 7,
+    "output_algorithm": 7,
+}
+
+# Rows deleted per transaction, and the pause between two batches that lets writers in
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE = 0.05
+
+# Pages released per incremental_vacuum step
+VACUUM_STEP_PAGES = 256
+
+# Columns holding the row time, in addition to the catalog's timestamp columns
+BUCKET_COLUMN = "bucket"
+
+
+def _time_column(info: TableInfo) -> Optional[str]:
+    """
+    Column that retention compares against: the timestamp column, or the rollup bucket start.
+    """
+    if info.timestamp_column:
+        return info.timestamp_column
+    return BUCKET_COLUMN if info.has_column(BUCKET_COLUMN) else None
+
+
+def _cutoff(info: TableInfo, days: int, now: Optional[datetime.datetime] = None) -> Tuple[Optional[str], Any]:
+    """
+    Time column of a table and the retention cutoff in that column's representation.
+    """
+    column = _time_column(info)
+    # Rollup buckets are stored as local text even in the epoch schema
+    epoch = info.epoch and column != BUCKET_COLUMN
+    return column, time_bound((now or datetime.datetime.now()) - datetime.timedelta(days=days), epoch)
+
+
+def _rollup_sources(table: str) -> Tuple[str, ...]:
+    """
+    Rollup sources whose raw rows live in a table: the table itself, or the per-signal views of
+    the telemetry table.
+    """
+    if table in rollups.ROLLUP_SOURCES:
+        return (table,)
+    if table == "telemetry":
+        return tuple(signal for signal in TELEMETRY_SIGNALS if signal in rollups.ROLLUP_SOURCES)
+    return ()
+
+
+def rollup_watermark(conn: sqlite3.Connection, table: str) -> Tuple[bool, Any]:
+    """
+    Newest raw timestamp of a table that all of its rollups have processed.
+
+    Returns:
+        tuple: (whether the table is a rollup source, the watermark in the timestamp column's
+        representation or None if nothing was rolled up yet).
+    """
+    sources = _rollup_sources(table)
+    if not sources:
+        return False, None
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollup_state'").fetchone() is None:
+        return True, None
+    marks = []
+    for source in sources:
+        row = conn.execute("SELECT last_tstamp FROM rollup_state WHERE source = ?", (source,)).fetchone()
+        if row is None or row[0] is None:
+            return True, None
+        marks.append(row[0])
+    return True, min(marks)
+
+
+def _key_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """
+    Columns identifying a row: rowid, or the primary key of a WITHOUT ROWID table.
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    if "WITHOUT ROWID" not in sql.upper():
+        return ["rowid"]
+    pk = sorted((col[5], col[1]) for col in conn.execute(f'PRAGMA table_info("{table}")') if col[5])
+    return [name for _, name in pk]
+
+
+def delete_expired(
+    conn: sqlite3.Connection,
+    info: TableInfo,
+    days: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = DEFAULT_PAUSE,
+    now: Optional[datetime.datetime] = None,
+    not_after: Any = None,
+) -> int:
+    """
+    Delete the rows of a table that are older than `days`, batch by batch.
+
+    Args:
+        conn: Open database connection.
+        info: Catalog entry of the table.
+        days: Retention period in days.
+        batch_size: Rows deleted per transaction.
+        pause: Seconds to sleep between batches.
+        now: Reference time (default: now).
+        not_after: Optional later limit in the time column's representation (e.g. a rollup
+            watermark); rows from this time on are kept even if they expired.
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    column, cutoff = _cutoff(info, days, now)
+    if column is None:
+        return 0
+    if not_after is not None:
+        cutoff = min(cutoff, not_after)
+
+    keys = _key_columns(conn, info.name)
+    key = keys[0] if len(keys) == 1 else f"({', '.join(keys)})"
+    query = (
+        f'DELETE FROM "{info.name}" WHERE {key} IN '
+        f'(SELECT {", ".join(keys)} FROM "{info.name}" WHERE "{column}" < ? ORDER BY "{column}" LIMIT ?)'
+    )
+
+    deleted = 0
+    while True:
+        with conn:
+            count = conn.execute(query, (cutoff, batch_size)).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def incremental_vacuum_enabled(conn: sqlite3.Connection) -> bool:
+    """
+    Whether the database runs in auto_vacuum=INCREMENTAL mode.
+    """
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def ensure_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """
+    One-time migration of an existing database to auto_vacuum=INCREMENTAL. The switch needs a
+    full VACUUM, which locks the database for the duration, so it is only run on request
+    (--enable-incremental-vacuum) and never by apply_retention itself.
+
+    Returns:
+        bool: True if the mode was changed (and the database rewritten).
+    """
+    if incremental_vacuum_enabled(conn):
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum(conn: sqlite3.Connection, step_pages: int = VACUUM_STEP_PAGES, pause: float = DEFAULT_PAUSE) -> int:
+    """
+    Release free pages to the file system in small steps.
+
+    Returns:
+        int: Number of pages released.
+    """
+    released = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            return released
+        # incremental_vacuum returns no rows; fetchall() makes it run to completion
+        conn.execute(f"PRAGMA incremental_vacuum({min(free, step_pages)})").fetchall()
+        conn.commit()
+        released += min(free, step_pages)
+        time.sleep(pause)
+
+
+def apply_retention(
+    db_path: str = DEFAULT_DB_PATH,
+    policies: Optional[Dict[str, Optional[int]]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = DEFAULT_PAUSE,
+    archive: Optional[Callable[[sqlite3.Connection, TableInfo, Any], Any]] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Delete expired rows from every table with a retention policy and reclaim the space.
+
+    Args:
+        db_path: Path to the database file.
+        policies: Table -> days to keep (None = forever); merged over RETENTION_POLICIES.
+        batch_size: Rows deleted per transaction.
+        pause: Seconds to sleep between batches.
+        archive: Optional callback (conn, table info, cutoff datetime) called before a table's
+            expired rows are deleted, e.g. to export them.
+        dry_run: Only count the expired rows.
+
+    Raw telemetry tables are rolled up first, and their rows are only deleted up to the rollup
+    watermark. Free pages are only released if the database is in auto_vacuum=INCREMENTAL
+    mode; see ensure_incremental_vacuum for the one-time migration.
+
+    Returns:
+        dict: Rows deleted (or expired, in a dry run) per table, file size before and after,
+        the reclaimed bytes and whether incremental vacuum is enabled.
+    """
+    merged = dict(RETENTION_POLICIES)
+    merged.update(policies or {})
+    size_before = os.path.getsize(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if not dry_run:
+            rollups.refresh_rollups(conn)
+
+        catalog = SchemaCatalog()
+        deleted: Dict[str, int] = {}
+        for table, days in merged.items():
+            info = catalog.table(conn, table)
+            # Views (e.g. per-signal views over the telemetry table) hold no rows of their own
+            if days is None or info is None or info.kind != "table":
+                continue
+            column, cutoff = _cutoff(info, days)
+            if column is None:
+                continue
+            rolled_up, watermark = rollup_watermark(conn, table)
+            if rolled_up:
+                if watermark is None:
+                    print(f"{table}: not rolled up yet, keeping all rows")
+                    continue
+                cutoff = min(cutoff, watermark)
+            if dry_run:
+                deleted[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}" WHERE "{column}" < ?', (cutoff,)).fetchone()[0]
+                continue
+            if archive is not None:
+                archive(conn, info, _to_datetime(cutoff))
+            deleted[table] = delete_expired(conn, info, days, batch_size, pause, not_after=watermark)
+
+        enabled = incremental_vacuum_enabled(conn)
+        if not dry_run:
+            if enabled:
+                incremental_vacuum(conn, pause=pause)
+            else:
+                print("auto_vacuum is not INCREMENTAL, free pages stay in the file; "
+                      "run once with --enable-incremental-vacuum to migrate")
+    finally:
+        conn.close()
+
+    size_after = os.path.getsize(db_path)
+    return {
+        "deleted": deleted,
+        "incremental_vacuum": enabled,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "reclaimed_bytes": size_before - size_after,
+    }
+
+
+def _to_datetime(bound: Any) -> datetime.datetime:
+    """
+    Cutoff in a time column's representation (epoch seconds or local text) as a datetime.
+    """
+    return datetime.datetime.fromisoformat(from_epoch(bound) if isinstance(bound, int) else str(bound)[:19])
+
+
+def _parse_policy(text: str) -> Tuple[str, Optional[int]]:
+    table, _, days = text.partition("=")
+    return table, None if days.lower() in ("", "none", "forever") else int(days)
+
+
+def main(argv: Optional[List[Any]] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Delete expired Balkonsolar data and reclaim the space.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database file")
+    parser.add_argument("--policy", action="append", type=_parse_policy, default=[],
+                        help="Override a retention period, e.g. solar_output=60 or rollup_15min=forever")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows deleted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only count expired rows")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="One-time migration to auto_vacuum=INCREMENTAL (full VACUUM, locks the database)")
+    args = parser.parse_args(argv)
+
+    if args.enable_incremental_vacuum:
+        conn = sqlite3.connect(args.db, timeout=30)
+        try:
+            changed = ensure_incremental_vacuum(conn)
+        finally:
+            conn.close()
+        print("Switched to auto_vacuum=INCREMENTAL" if changed else "auto_vacuum is already INCREMENTAL")
+        return
+
+    report = apply_retention(args.db, dict(args.policy), args.batch_size, dry_run=args.dry_run)
+    for table, rows in report["deleted"].items():
+        print(f"{table}: {rows} rows {'expired' if args.dry_run else 'deleted'}")
+    print(f"Database size: {report['bytes_before']} -> {report['bytes_after']} bytes "
+          f"({report['reclaimed_bytes']} bytes reclaimed)")
+
+
+if __name__ == "__main__":
+    main()
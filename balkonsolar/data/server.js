@@ -35,10 +35,25 @@ function queryDatabase(query, params) {
   });
 }
 
+// Zeitstempelspalte einer Tabelle: Text ("tstamp" oder "timestamp") oder Epoch-Sekunden (INTEGER tstamp)
+async function timestampColumn(table) {
+  const columns = await queryDatabase(`PRAGMA table_info(${table})`, []);
+  const column = columns.find((c) => c.name === 'tstamp') || columns.find((c) => c.name === 'timestamp');
+  const name = column ? column.name : 'tstamp';
+  const epoch = Boolean(column) && (column.type || '').toUpperCase() === 'INTEGER';
+  return {
+    name,
+    // Epoch-Sekunden werden als lokale Zeit ausgegeben
+    select: epoch ? `datetime(${name}, 'unixepoch', 'localtime')` : name,
+    // Grenzen kommen als lokale Zeit und werden für Epoch-Tabellen in UTC-Sekunden umgerechnet
+    bound: epoch ? "CAST(strftime('%s', ?, 'utc') AS INTEGER)" : '?',
+  };
+}
+
 // API-Endpunkt für Energiedaten
 app.get('/api/energy', async (req, res) => {
   try {
-    const { table, limit = 100, startTime, endTime } = req.query;
+    const { table, limit = 100, startTime, endTime, resolution } = req.query;
     
     // Validiere Tabellennamen
     const validTables = ['solar_output', 'battery_storage_status', 'grid_usage', 'output_algorithm', 'irradiation_data', 'grid_usage_forecast'];
@@ -46,29 +61,56 @@ app.get('/api/energy', async (req, res) => {
       return res.status(400).json({ error: 'Ungültiger Tabellenparameter' });
     }
 
+    // Aggregierte Daten aus den Rollup-Tabellen (siehe balkonsolar/core/rollups.py)
+    if (resolution) {
+      const validResolutions = ['15min', 'hourly', 'daily'];
+      const rollupTables = ['solar_output', 'battery_storage_status', 'grid_usage'];
+      if (!validResolutions.includes(resolution) || !rollupTables.includes(table)) {
+        return res.status(400).json({ error: 'Ungültige Auflösung' });
+      }
+      let rollupQuery = `SELECT bucket as timestamp, sum_value / samples as value, min_value as min, max_value as max, energy_wh FROM rollup_${resolution} WHERE source = ? AND samples > 0`;
+      const rollupParams = [table];
+      if (startTime) {
+        rollupQuery += ' AND bucket >= ?';
+        rollupParams.push(startTime);
+      }
+      if (endTime) {
+        rollupQuery += ' AND bucket <= ?';
+        rollupParams.push(endTime);
+      }
+      rollupQuery += ' ORDER BY bucket DESC LIMIT ?';
+      rollupParams.push(parseInt(limit));
+      return res.json(await queryDatabase(rollupQuery, rollupParams));
+    }
+
     // Baue Query
+    const ts = await timestampColumn(table);
     let query;
     if (table === 'output_algorithm') {
-      query = `SELECT timestamp, suggested_state as suggested_state, grid_state as value, usage as usage FROM ${table}`;
+      query = `SELECT ${ts.select} as timestamp, suggested_state as suggested_state, grid_state as value, usage as usage FROM ${table}`;
+    } else if (table === 'irradiation_data') {
+      query = `SELECT ${ts.select} as timestamp, watt_hours as value FROM ${table}`;
+    } else if (table === 'grid_usage_forecast') {
+      query = `SELECT ${ts.select} as timestamp, grid_state as value FROM ${table}`;
     } else {
-      query = `SELECT tstamp as timestamp, value FROM ${table}`;
+      query = `SELECT ${ts.select} as timestamp, value FROM ${table}`;
     }
     const params = [];
 
     if (startTime || endTime) {
       query += ' WHERE';
       if (startTime) {
-        query += table === 'output_algorithm' ? ' timestamp >= ?' : ' tstamp >= ?';
+        query += ` ${ts.name} >= ${ts.bound}`;
         params.push(startTime);
       }
       if (endTime) {
         if (startTime) query += ' AND';
-        query += table === 'output_algorithm' ? ' timestamp <= ?' : ' tstamp <= ?';
+        query += ` ${ts.name} <= ${ts.bound}`;
         params.push(endTime);
       }
     }
 
-    query += table === 'output_algorithm' ? ' ORDER BY timestamp DESC LIMIT ?' : ' ORDER BY tstamp DESC LIMIT ?';
+    query += ` ORDER BY ${ts.name} DESC LIMIT ?`;
     params.push(parseInt(limit));
 
     const data = await queryDatabase(query, params);
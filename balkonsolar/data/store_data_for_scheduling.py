@@ -1,4 +1,3 @@
-import asyncio
 import itertools
 from datetime import datetime, timedelta
 from typing import List, Tuple, Optional, Iterator
@@ -6,13 +5,15 @@ from typing import List, Tuple, Optional, Iterator
 import pandas as pd
 
 from balkonsolar.api.grid import StromGedachtClient
+from balkonsolar.api.http_session import run
 from balkonsolar.api.irradiation import ForecastSolarClient
 from balkonsolar.core.database_interface import DatabaseInterface
 
 
 def store_solar_production_predictions():
     """
-    Fetch solar production forecast from the ForecastSolar API and store it in the database.
+    Fetch solar production forecast from the ForecastSolar API, correct its bias against the
+    measured solar_output and store it in the database.
     """
     (lat, lon) = (48.0173627,7.8272418) # the FRIZ
     client = ForecastSolarClient(
@@ -22,11 +23,16 @@ def store_solar_production_predictions():
         azimuth=0,
         kwp=0.8,
     )
-    watt_hours_dict = asyncio.run(client.get_watt_hours())
+    watt_hours_dict = run(client.get_watt_hours())
+    if not watt_hours_dict:
+        # The request failed (already logged); keep the stored forecast
+        return
     watt_hours_df = pd.DataFrame(list(watt_hours_dict.items())).rename(columns={0: "timestamp", 1: "watt_hours"})
     watt_hours_df = watt_hours_df.sort_values(by="timestamp")
 
     dbi = DatabaseInterface()
+    # Learns from the hours measured since the last fetch; keeps the raw forecast as watt_hours_raw
+    watt_hours_df = dbi.correct_pv_forecast(watt_hours_df)
     dbi.store_irradiation_data(watt_hours_df)
 
 def __grid_forecast_to_array(
@@ -50,36 +56,47 @@ def __grid_forecast_to_array(
         start = datetime.fromisoformat(interval["from"])
         end = datetime.fromisoformat(interval["to"])
         state = interval["state"]
-        return map(lambda dt: (dt, state), __full_hours_in_interval(start, end))
+        return map(lambda dt: (dt, state), __slots_in_interval(start, end, resolution_minutes))
 
-    return list(itertools.chain.from_iterable(_expand_interval(d) for d in forecast))
+    samples = itertools.chain.from_iterable(_expand_interval(d) for d in forecast)
+    if as_str:
+        return [(dt.isoformat(sep=" "), state) for dt, state in samples]
+    return list(samples)
 
-def __full_hours_in_interval(
+def __slots_in_interval(
         start_dt: datetime,
-        end_dt: datetime
+        end_dt: datetime,
+        resolution_minutes: int = 60
 ) -> Iterator[datetime]:
+    """
+    Slot starts on the resolution grid (aligned to the full hour) within [start_dt, end_dt).
+    """
+    step = timedelta(minutes=resolution_minutes)
     start_hour = start_dt.replace(minute=0, second=0, microsecond=0)
-    if start_dt != start_hour:
-        start_hour += timedelta(hours=1)
-
-    end_hour = end_dt.replace(minute=0, second=0, microsecond=0)
+    # Number of whole steps from the full hour to the first slot at or after start_dt
+    steps = -(-(start_dt - start_hour) // step)
+    first_slot = start_hour + steps * step
 
-    hours_iter = itertools.takewhile(
-        lambda dt: dt < end_hour,
-        (start_hour + timedelta(hours=i) for i in range(1000000))  # Large enough range
+    slots_iter = itertools.takewhile(
+        lambda dt: dt < end_dt,
+        (first_slot + i * step for i in itertools.count())
     )
 
-    return hours_iter
+    return slots_iter
 
 
-def store_grid_state_predictions():
+def store_grid_state_predictions(resolution_minutes: int = 15):
     """
     Fetch grid state forecast from the StromGedacht API and store it in the database.
+
+    Args:
+        resolution_minutes: Sampling interval of the stored states; StromGedacht intervals can
+            start within the hour, so the default keeps quarter-hours.
     """
     client = StromGedachtClient(zip_code=79110)
-    grid_forecast = asyncio.run(client.get_forecast())
+    grid_forecast = run(client.get_forecast())
 
-    state_array = __grid_forecast_to_array(grid_forecast)
+    state_array = __grid_forecast_to_array(grid_forecast, resolution_minutes)
     grid_state_df = pd.DataFrame(state_array, columns=["timestamp", "grid_state"])
     grid_state_df = grid_state_df.sort_values(by="timestamp")
 
@@ -1,6 +1,9 @@
 import sqlite3
 import datetime
-from typing import List, Dict, Union, Tuple, Optional
+from typing import Any, Iterator, List, Dict, Union, Tuple, Optional
+
+from balkonsolar.core import streaming
+from balkonsolar.core.schema_catalog import SchemaCatalog
 
 """
 Utility class for interacting with the Balkonsolar energy monitoring SQLite database.
@@ -22,6 +25,7 @@ class EnergyDB:
             db_path (str): Path to the SQLite database file.
         """
         self.db_path = db_path
+        self.catalog = SchemaCatalog()
 
     def store_solar_output(self, value: float, timestamp: Optional[str] = None) -> bool:
         return self._store_value("solar_output", value, timestamp)
@@ -81,19 +85,20 @@ class EnergyDB:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            query = f"SELECT id, tstamp, value FROM {table}"
+            tstamp = self.catalog.timestamp_column(conn, table) or "tstamp"
+            query = f"SELECT id, {tstamp} AS tstamp, value FROM {table}"
             params = []
             if start_time or end_time:
                 query += " WHERE"
                 if start_time:
-                    query += " tstamp >= ?"
+                    query += f" {tstamp} >= ?"
                     params.append(start_time)
                 if end_time:
                     if start_time:
                         query += " AND"
-                    query += " tstamp <= ?"
+                    query += f" {tstamp} <= ?"
                     params.append(end_time)
-            query += " ORDER BY tstamp DESC LIMIT ?"
+            query += f" ORDER BY {tstamp} DESC LIMIT ?"
             params.append(limit)
             cursor.execute(query, params)
             results = []
@@ -109,6 +114,37 @@ class EnergyDB:
             print(f"Error querying {table}: {e}")
             return []
 
+    def iter_data(self, table: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                  chunk_size: int = streaming.DEFAULT_CHUNK_SIZE, output: str = "records") -> Iterator[Any]:
+        """
+        Stream data from a table in timestamp order (oldest first), chunk by chunk.
+
+        Args:
+            table (str): Table name.
+            start_time (str, optional): Start time (inclusive) for filtering.
+            end_time (str, optional): End time (inclusive) for filtering.
+            chunk_size (int): Rows fetched from SQLite at a time.
+            output (str): "records", "pandas" or "numpy" (see core.streaming.iter_history).
+
+        Returns:
+            Iterator over records or chunks.
+
+        Raises:
+            Exception: Errors while reading or converting a chunk are logged and re-raised.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.catalog.validate(conn)
+            info = self.catalog.table(conn, table)
+            if info is None:
+                return
+            yield from streaming.iter_history(conn, info, start_time, end_time, chunk_size, output)
+        except Exception as e:
+            print(f"Error streaming {table}: {e}")
+            raise
+        finally:
+            conn.close()
+
     def get_latest_data(self, table: str) -> Dict:
         """
         Retrieve the latest record from a table.
@@ -123,7 +159,8 @@ class EnergyDB:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            query = f"SELECT id, tstamp, value FROM {table} ORDER BY tstamp DESC LIMIT 1"
+            tstamp = self.catalog.timestamp_column(conn, table) or "tstamp"
+            query = f"SELECT id, {tstamp} AS tstamp, value FROM {table} ORDER BY {tstamp} DESC LIMIT 1"
             cursor.execute(query)
             row = cursor.fetchone()
             conn.close()
@@ -0,0 +1,71 @@
+"""
+Benchmark for the Balkonsolar database interface.
+
+Measures operations per second of DatabaseInterface with a fresh connection per call (default)
+versus pooled, long-lived WAL connections, on a throwaway copy of the schema.
+
+Run with: python -m balkonsolar.utils.benchmark_database
+"""
+import os
+import tempfile
+import time
+
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.data.create_energy_db import create_energy_database
+
+OPERATIONS = 2000
+
+
+def run_benchmark(db: DatabaseInterface, operations: int = OPERATIONS) -> dict:
+    """
+    Run a mixed read/write workload against a database interface.
+
+    Args:
+        db: The DatabaseInterface to benchmark.
+        operations: Number of calls per operation type.
+
+    Returns:
+        dict: Operations per second for each operation type.
+    """
+    results = {}
+
+    start = time.perf_counter()
+    for i in range(operations):
+        db.store_value("solar_output", float(i), f"2025-05-10 12:{i // 60 % 60:02d}:{i % 60:02d}")
+    results["store_value"] = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        db.get_latest_value("solar_output")
+    results["get_latest_value"] = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        db.get_solar_output()
+        db.get_grid_usage()
+    results["get_solar_and_grid"] = operations / (time.perf_counter() - start)
+
+    return results
+
+
+def main():
+    """
+    Benchmark the default and the pooled connection mode and print ops/sec side by side.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rows = {}
+        for pooled in (False, True):
+            db_path = os.path.join(tmp_dir, f"energy_data_{'pooled' if pooled else 'default'}.db")
+            create_energy_database(db_path)
+            with DatabaseInterface(db_path, pooled=pooled) as db:
+                rows["pooled" if pooled else "default"] = run_benchmark(db)
+
+    print(f"\n{'operation':<22}{'default ops/s':>16}{'pooled ops/s':>16}{'speedup':>10}")
+    for operation in rows["default"]:
+        before = rows["default"][operation]
+        after = rows["pooled"][operation]
+        print(f"{operation:<22}{before:>16.0f}{after:>16.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+German public holidays for the day types of the standard load profile.
+
+Holidays are computed (no lookup tables or network access): fixed-date holidays plus the movable
+ones derived from Easter Sunday (Gregorian computus). Nationwide holidays apply everywhere;
+STATE_HOLIDAYS adds the ones of individual federal states.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+import numpy as np
+
+# Federal state used when none is given (the installation is in Freiburg, Baden-Württemberg)
+DEFAULT_STATE = "BW"
+
+# Nationwide fixed holidays as (month, day)
+FIXED_HOLIDAYS = ((1, 1), (5, 1), (10, 3), (12, 25), (12, 26))
+
+# Nationwide movable holidays as days after Easter Sunday:
+# Good Friday, Easter Monday, Ascension Day, Whit Monday
+EASTER_HOLIDAYS = (-2, 1, 39, 50)
+
+# Additional holidays per federal state: fixed (month, day) and days after Easter Sunday
+STATE_HOLIDAYS = {
+    "BW": (((1, 6), (11, 1)), (60,)),  # Epiphany, All Saints' Day; Corpus Christi
+    "BY": (((1, 6), (8, 15), (11, 1)), (60,)),
+    "BE": (((3, 8),), ()),
+    "HE": ((), (60,)),
+    "NW": (((11, 1),), (60,)),
+    "RP": (((11, 1),), (60,)),
+    "SL": (((8, 15), (11, 1)), (60,)),
+    "SN": (((10, 31),), ()),
+    "TH": (((9, 20), (10, 31)), ()),
+}
+
+
+def easter_sunday(year: int) -> date:
+    """
+    Date of Easter Sunday in the Gregorian calendar (anonymous Gregorian algorithm).
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=64)
+def holidays_for_year(year: int, state: str = DEFAULT_STATE) -> Tuple[date, ...]:
+    """
+    Public holidays of one year.
+
+    Args:
+        year: Calendar year.
+        state: Federal state code (e.g. "BW"); unknown codes get the nationwide holidays only.
+
+    Returns:
+        tuple: Holiday dates in ascending order.
+    """
+    fixed, movable = STATE_HOLIDAYS.get(state, ((), ()))
+    easter = easter_sunday(year)
+    days = {date(year, month, day) for month, day in FIXED_HOLIDAYS + tuple(fixed)}
+    days |= {easter + timedelta(days=offset) for offset in EASTER_HOLIDAYS + tuple(movable)}
+    return tuple(sorted(days))
+
+
+def german_holidays(years: Iterable[int], state: str = DEFAULT_STATE) -> np.ndarray:
+    """
+    Public holidays of several years as a sorted datetime64[D] array, e.g. for np.isin().
+
+    Args:
+        years: Calendar years.
+        state: Federal state code.
+
+    Returns:
+        np.ndarray: Holiday dates.
+    """
+    days = [day for year in sorted(set(years)) for day in holidays_for_year(int(year), state)]
+    return np.array(days, dtype="datetime64[D]")
@@ -3,6 +3,8 @@ import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from balkonsolar.core.schema_catalog import SchemaCatalog
+
 load_dotenv(dotenv_path="balkonsolar/.env")
 
 """
@@ -11,6 +13,24 @@ Interactive utility for querying the Balkonsolar SQLite database.
 Allows users to view recent records or query by date range for any table in the database, via a command-line interface.
 """
 
+# One schema catalog per database file, reused across queries
+_catalogs = {}
+
+def get_catalog(db_path, conn):
+    """
+    Get the cached schema catalog for a database file, validated against a new connection.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        conn (sqlite3.Connection): Connection that was just opened to the file.
+
+    Returns:
+        SchemaCatalog: Catalog shared by all queries against this file.
+    """
+    catalog = _catalogs.setdefault(os.path.abspath(db_path), SchemaCatalog())
+    catalog.validate(conn)
+    return catalog
+
 def get_default_db_path():
     """
     Get the default database path (in the user's home directory).
@@ -34,8 +54,7 @@ def query_table(db_path, table_name, limit=10):
     cursor = conn.cursor()
 
     # Get column names
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [col[1] for col in cursor.fetchall()]
+    columns = get_catalog(db_path, conn).table(conn, table_name).columns
 
     # Get the data
     cursor.execute(f"SELECT * FROM {table_name} LIMIT {limit}")
@@ -69,12 +88,13 @@ def get_data_by_date_range(db_path, table_name, start_date, end_date):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    # Get column names
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [col[1] for col in cursor.fetchall()]
+    # Get column names and the timestamp column (tstamp or timestamp)
+    info = get_catalog(db_path, conn).table(conn, table_name)
+    columns = info.columns
+    tstamp = info.timestamp_column
 
     # Get the data for the date range
-    cursor.execute(f"SELECT * FROM {table_name} WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
+    cursor.execute(f"SELECT * FROM {table_name} WHERE {tstamp} BETWEEN ? AND ? ORDER BY {tstamp}",
                   (start_date, end_date))
     rows = cursor.fetchall()
 
@@ -108,9 +128,7 @@ def main():
 
     # Connect to the database to get table names
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [table[0] for table in cursor.fetchall()]
+    tables = get_catalog(db_path, conn).tables(conn)
     conn.close()
 
     if not tables:
@@ -1,13 +1,37 @@
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
 
+from balkonsolar.utils.holidays import german_holidays, holidays_for_year
+
 """
 Utility for reading and processing average energy consumption data from Excel for Balkonsolar scheduling.
 
 Provides functions to aggregate, extract, and retrieve 24-hour energy usage profiles for use in forecasting and simulation.
+
+Reading the workbook takes a while and needs openpyxl, so the profile is compiled once into a NumPy
+array indexed by [month - 1, day type (WT, SA, FT), quarter-hour] and stored as
+StandardStromVerbrauch.npy next to the workbook, with a JSON sidecar holding the workbook's mtime,
+size and SHA-256. load_profile() memory-maps the array and only recompiles it when the workbook changed.
 """
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+EXCEL_PATH = os.path.join(SCRIPT_DIR, "StandardStromVerbrauch.xlsx")
+PROFILE_PATH = os.path.join(SCRIPT_DIR, "StandardStromVerbrauch.npy")
+
+# Day types of the standard profile: working day, Saturday, Sunday/holiday
+DAY_TYPES = ("WT", "SA", "FT")
+QUARTER_HOURS = 96
+
+# Bumped when the compiled layout changes
+PROFILE_VERSION = 1
+
+# path -> (sidecar, memory-mapped array) of profiles loaded in this process
+_loaded_profiles = {}
+
 def aggregate_to_hourly_preserve_columns(df):
     """
     Aggregate a DataFrame to hourly means, preserving all columns except the timestamp.
@@ -36,11 +60,13 @@ def aggregate_to_hourly_preserve_columns(df):
 def get_values_for_next_24h(df, start_datetime, german_holidays=None):
     """
     Get values for the next 24 hours starting from start_datetime.
+    Kept for the DataFrame profile; profile_values() does the same for any horizon in one step.
 
     Args:
         df (pd.DataFrame): DataFrame with hourly values indexed by HH:00.
         start_datetime (datetime): Starting datetime.
-        german_holidays: (Unused, for future extension).
+        german_holidays: Optional holiday dates, treated like Sundays (default: holidays in
+            Baden-Württemberg, see utils/holidays.py).
 
     Returns:
         list: 24 values representing the next 24 hours.
@@ -54,10 +80,7 @@ def get_values_for_next_24h(df, start_datetime, german_holidays=None):
         current_dt = start_datetime + timedelta(hours=hour_offset)
 
         # Determine day type
-        if current_dt.weekday() == 5:  # Saturday (0=Monday, 5=Saturday)
-            day_type = "SA"
-        else:
-            day_type = "WT"  # Weekday
+        day_type = DAY_TYPES[day_type_index(current_dt, german_holidays)]
 
         # Format the month part of the column name (always 2012 year)
         month_str = f"2012-{current_dt.month:02d}-01"
@@ -82,15 +105,16 @@ def get_values_for_next_24h(df, start_datetime, german_holidays=None):
 
     return values
 
-def get_excel_data() -> pd.DataFrame:
+def get_excel_data(excel_path: str = EXCEL_PATH) -> pd.DataFrame:
     """
     Load and process the standard energy consumption Excel file.
 
+    Args:
+        excel_path (str): Path of the workbook.
+
     Returns:
         pd.DataFrame: DataFrame with combined headers and cleaned data.
     """
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    excel_path = os.path.join(script_dir, "StandardStromVerbrauch.xlsx")
     df = pd.read_excel(excel_path, header=None)
     # Extract the header rows
     first_header = df.iloc[0]
@@ -109,6 +133,227 @@ def get_excel_data() -> pd.DataFrame:
     return df
 
 
+def _sidecar_path(profile_path: str) -> str:
+    return os.path.splitext(profile_path)[0] + ".json"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_profile(excel_path: str = EXCEL_PATH, profile_path: str = PROFILE_PATH) -> np.ndarray:
+    """
+    Compile the workbook into a [12, 3, 96] array (month, day type, quarter-hour) and store it
+    with its sidecar. Files are written to temporary names and renamed, so readers never see a
+    half-written profile.
+
+    Args:
+        excel_path (str): Path of the workbook.
+        profile_path (str): Path of the compiled .npy file.
+
+    Returns:
+        np.ndarray: The compiled profile.
+    """
+    df = get_excel_data(excel_path)
+    if len(df) != QUARTER_HOURS:
+        raise ValueError(f"{excel_path}: expected {QUARTER_HOURS} quarter-hour rows, found {len(df)}")
+    profile = np.empty((12, len(DAY_TYPES), QUARTER_HOURS))
+    for month in range(12):
+        for day, day_type in enumerate(DAY_TYPES):
+            column = f"2012-{month + 1:02d}-01_{day_type}"
+            if column not in df.columns:
+                raise ValueError(f"{excel_path}: column {column} is missing")
+            profile[month, day] = df[column].to_numpy(dtype=float)
+
+    stat = os.stat(excel_path)
+    sidecar = {
+        "version": PROFILE_VERSION,
+        "source": os.path.basename(excel_path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": _sha256(excel_path),
+        "shape": list(profile.shape),
+        "day_types": list(DAY_TYPES),
+    }
+    temp_path = profile_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, profile)
+    os.replace(temp_path, profile_path)
+    sidecar_path = _sidecar_path(profile_path)
+    with open(sidecar_path + ".tmp", "w") as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+    return profile
+
+
+def _is_current(sidecar: dict, excel_path: str) -> bool:
+    """
+    Whether a sidecar describes the workbook as it is now. A changed mtime alone (e.g. after a
+    checkout) only costs a hash; the sidecar is then updated in place.
+    """
+    if sidecar.get("version") != PROFILE_VERSION:
+        return False
+    stat = os.stat(excel_path)
+    if sidecar.get("mtime") == stat.st_mtime and sidecar.get("size") == stat.st_size:
+        return True
+    if sidecar.get("size") != stat.st_size or sidecar.get("sha256") != _sha256(excel_path):
+        return False
+    sidecar["mtime"] = stat.st_mtime
+    return True
+
+
+def load_profile(excel_path: str = EXCEL_PATH, profile_path: str = PROFILE_PATH) -> np.ndarray:
+    """
+    Get the compiled profile, memory-mapped read-only, recompiling it if the workbook changed.
+    Within a process the array is reused as long as the workbook's mtime stays the same.
+
+    Args:
+        excel_path (str): Path of the workbook.
+        profile_path (str): Path of the compiled .npy file.
+
+    Returns:
+        np.ndarray: Profile indexed by [month - 1, day type, quarter-hour].
+    """
+    mtime = os.stat(excel_path).st_mtime
+    loaded = _loaded_profiles.get(profile_path)
+    if loaded is not None and loaded[0]["mtime"] == mtime:
+        return loaded[1]
+
+    sidecar_path = _sidecar_path(profile_path)
+    sidecar = None
+    if os.path.exists(profile_path) and os.path.exists(sidecar_path):
+        try:
+            with open(sidecar_path) as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable profile sidecar {sidecar_path}: {e}")
+    recorded_mtime = sidecar.get("mtime") if sidecar else None
+    if sidecar is None or not _is_current(sidecar, excel_path):
+        compile_profile(excel_path, profile_path)
+        with open(sidecar_path) as f:
+            sidecar = json.load(f)
+    elif recorded_mtime != mtime:
+        # Only the mtime changed: record it so the next process skips the hash
+        try:
+            with open(sidecar_path + ".tmp", "w") as f:
+                json.dump(sidecar, f, indent=2)
+            os.replace(sidecar_path + ".tmp", sidecar_path)
+        except OSError as e:
+            print(f"Could not update profile sidecar {sidecar_path}: {e}")
+
+    profile = np.load(profile_path, mmap_mode="r")
+    _loaded_profiles[profile_path] = (sidecar, profile)
+    return profile
+
+
+def day_type_codes(timestamps, holidays=None) -> np.ndarray:
+    """
+    Day type per timestamp as an index into DAY_TYPES, for all timestamps at once:
+    Sundays and public holidays -> FT, Saturdays -> SA, all other days -> WT.
+
+    Args:
+        timestamps: Naive datetimes (array-like).
+        holidays: Holiday dates (default: holidays in Baden-Württemberg for the years covered).
+
+    Returns:
+        np.ndarray: Codes (int8).
+    """
+    days = np.asarray(pd.DatetimeIndex(timestamps).values, dtype="datetime64[D]")
+    # 1970-01-01 was a Thursday; weekday 0 = Monday
+    weekday = (days.astype(np.int64) + 3) % 7
+    if holidays is None:
+        years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+        holidays = german_holidays(np.unique(years)) if len(years) else np.array([], dtype="datetime64[D]")
+    else:
+        holidays = np.asarray(list(holidays), dtype="datetime64[D]")
+    codes = np.where(weekday == 5, 1, 0).astype(np.int8)
+    codes[(weekday == 6) | np.isin(days, holidays)] = 2
+    return codes
+
+
+def day_type_index(dt: datetime, holidays=None) -> int:
+    """
+    Index into DAY_TYPES for one date: Sundays and holidays -> FT, Saturday -> SA, other days -> WT.
+    """
+    if holidays is None:
+        holidays = holidays_for_year(dt.year)
+    else:
+        holidays = {pd.Timestamp(day).date() for day in holidays}
+    day = dt.date() if isinstance(dt, datetime) else dt
+    if dt.weekday() == 6 or day in holidays:
+        return 2
+    return 1 if dt.weekday() == 5 else 0
+
+
+def profile_value(profile: np.ndarray, dt: datetime, hourly: bool = True) -> float:
+    """
+    Look up the profile at a point in time.
+
+    Args:
+        profile (np.ndarray): Output of load_profile().
+        dt (datetime): Point in time.
+        hourly (bool): Mean of the hour (as aggregate_to_hourly_preserve_columns) instead of the
+            quarter-hour.
+
+    Returns:
+        float: Profile value.
+    """
+    row = profile[dt.month - 1, day_type_index(dt)]
+    if hourly:
+        return float(row[4 * dt.hour:4 * dt.hour + 4].mean())
+    return float(row[4 * dt.hour + dt.minute // 15])
+
+
+def get_profile_values_for_next_24h(start_datetime, profile=None) -> list:
+    """
+    Compiled-profile version of get_values_for_next_24h(): hourly values for the next 24 hours.
+
+    Args:
+        start_datetime (datetime): Starting datetime.
+        profile (np.ndarray): Output of load_profile() (default: loaded on demand).
+
+    Returns:
+        list: 24 values representing the next 24 hours.
+    """
+    return profile_values(start_datetime.replace(minute=0, second=0, microsecond=0), 24, 60, profile).tolist()
+
+
+def profile_values(start_datetime, periods: int, resolution_minutes: int = 60, profile=None,
+                   holidays=None) -> np.ndarray:
+    """
+    Profile values for a horizon of any length and resolution in one vectorized lookup: the
+    month, day type and quarter-hour of every quarter-hour covered are computed as arrays and
+    gathered from the compiled profile with a single fancy index. Slots longer than a quarter
+    hour get the mean of their quarter-hours (for 60 minutes the same as
+    aggregate_to_hourly_preserve_columns); shorter slots get the value of their quarter-hour.
+
+    Args:
+        start_datetime (datetime): Start of the first slot.
+        periods (int): Number of slots.
+        resolution_minutes (int): Slot length in minutes.
+        profile (np.ndarray): Output of load_profile() (default: loaded on demand).
+        holidays: Holiday dates (default: holidays in Baden-Württemberg).
+
+    Returns:
+        np.ndarray: Mean profile value per slot, in the profile's unit (average power; times the
+        slot length in hours gives the energy per slot).
+    """
+    profile = load_profile() if profile is None else profile
+    quarters = max(resolution_minutes // 15, 1)
+    starts = np.datetime64(pd.Timestamp(start_datetime).floor("min").to_datetime64(), "m") \
+        + np.arange(periods) * np.timedelta64(resolution_minutes, "m")
+    # Every quarter-hour of every slot, shape (periods, quarters)
+    times = starts[:, np.newaxis] + np.arange(quarters) * np.timedelta64(15, "m")
+    minutes = (times - times.astype("datetime64[D]")).astype(np.int64)
+    months = times.astype("datetime64[M]").astype(np.int64) % 12
+    codes = day_type_codes(times.ravel(), holidays).reshape(times.shape)
+    return np.asarray(profile[months, codes, minutes // 15]).mean(axis=1)
+
+
 def main(tstamp: datetime) -> list[float]|None:
     """
     Get the values for the next 24 hours starting from tstamp.
@@ -120,9 +365,7 @@ def main(tstamp: datetime) -> list[float]|None:
         list[float] or None: List of 24 hourly values, or None on error.
     """
     try:
-        base_df = get_excel_data()
-        hourly_df = aggregate_to_hourly_preserve_columns(base_df)
-        return get_values_for_next_24h(hourly_df, tstamp)
+        return get_profile_values_for_next_24h(tstamp)
     except Exception as e:
         print(f"Error getting values for {tstamp}: {e}")
         return None
@@ -0,0 +1,198 @@
+"""
+Tests for the StromGedacht and Forecast.Solar clients against a local stub HTTP server.
+"""
+import asyncio
+from datetime import datetime
+
+from aiohttp import web
+
+from balkonsolar.api import http_session
+from balkonsolar.api.grid import StromGedachtClient
+from balkonsolar.api.irradiation import ForecastSolarClient, Plane, merge_forecasts
+
+
+async def serve(routes, scenario):
+    """
+    Start a stub server with the given routes, run scenario(base_url, requests) and shut down.
+    `requests` collects (path, query, peer) per request.
+    """
+    requests = []
+
+    @web.middleware
+    async def record(request, handler):
+        requests.append((request.path, dict(request.query), request.transport.get_extra_info("peername")))
+        return await handler(request)
+
+    app = web.Application(middlewares=[record])
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        return await scenario(f"http://127.0.0.1:{port}", requests)
+    finally:
+        await http_session.close_session()
+        await runner.cleanup()
+
+
+def plane_forecast(kwp):
+    return {
+        "result": {
+            "watts": {"2025-06-01 06:00:00": 100 * kwp, "2025-06-01 07:00:00": 300 * kwp},
+            "watt_hours_period": {"2025-06-01 06:00:00": 50 * kwp, "2025-06-01 07:00:00": 200 * kwp},
+            "watt_hours": {"2025-06-01 06:00:00": 50 * kwp, "2025-06-01 07:00:00": 250 * kwp},
+            "watt_hours_day": {"2025-06-01": 250 * kwp},
+        }
+    }
+
+
+def test_stromgedacht_state_and_forecast():
+    async def now(request):
+        return web.json_response({"state": 3})
+
+    async def states(request):
+        return web.json_response({"states": [{"from": "2025-06-01T00:00:00", "to": "2025-06-01T06:00:00", "state": 1}]})
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=79110, api_url=url)
+        state = await client.get_stromgedacht_mapping_integer()
+        forecast = await client.get_forecast()
+        return state, forecast, requests
+
+    state, forecast, requests = asyncio.run(
+        serve([web.get("/now", now), web.get("/states", states)], scenario))
+    assert state == 3
+    assert forecast == [{"from": "2025-06-01T00:00:00", "to": "2025-06-01T06:00:00", "state": 1}]
+    assert requests[0][1] == {"zip": "79110"}
+    assert set(requests[1][1]) == {"zip", "from", "to"}
+
+
+def test_requests_share_a_keep_alive_connection():
+    async def now(request):
+        return web.json_response({"state": 1})
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=79110, api_url=url)
+        session = http_session.get_session()
+        for _ in range(3):
+            await client.get_stromgedacht_api_response()
+        assert http_session.get_session() is session
+        return requests
+
+    requests = asyncio.run(serve([web.get("/now", now)], scenario))
+    assert len(requests) == 3
+    assert len({peer for _, _, peer in requests}) == 1
+
+
+def test_retries_server_errors_with_backoff():
+    calls = []
+
+    async def now(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.json_response({"state": -1})
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=79110, api_url=url, retries=3, backoff=0.01)
+        return await client.get_stromgedacht_mapping_integer()
+
+    assert asyncio.run(serve([web.get("/now", now)], scenario)) == -1
+    assert len(calls) == 3
+
+
+def test_gives_up_after_the_last_retry():
+    async def now(request):
+        return web.Response(status=500)
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=79110, api_url=url, retries=2, backoff=0.01)
+        return await client.get_stromgedacht_mapping_integer(), requests
+
+    state, requests = asyncio.run(serve([web.get("/now", now)], scenario))
+    assert state is None
+    assert len(requests) == 3
+
+
+def test_does_not_retry_client_errors():
+    async def states(request):
+        return web.json_response({"message": "invalid zip"}, status=400)
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=0, api_url=url, backoff=0.01)
+        return await client.get_forecast(), requests
+
+    forecast, requests = asyncio.run(serve([web.get("/states", states)], scenario))
+    assert forecast == []
+    assert len(requests) == 1
+
+
+def test_times_out_slow_responses():
+    async def now(request):
+        await asyncio.sleep(1)
+        return web.json_response({"state": 1})
+
+    async def scenario(url, requests):
+        client = StromGedachtClient(zip_code=79110, api_url=url, timeout=0.1, retries=1, backoff=0.01)
+        return await client.get_stromgedacht_api_response(), requests
+
+    response, requests = asyncio.run(serve([web.get("/now", now)], scenario))
+    assert response == {}
+    assert len(requests) == 2
+
+
+def test_forecast_solar_fetches_planes_concurrently(tmp_path):
+    arrived = []
+    both = asyncio.Event()
+
+    async def estimate(request):
+        arrived.append(request.match_info["azimuth"])
+        if len(arrived) == 2:
+            both.set()
+        # Only answers once both planes are requested, so sequential requests would time out
+        await asyncio.wait_for(both.wait(), 2)
+        return web.json_response(plane_forecast(float(request.match_info["kwp"])))
+
+    async def scenario(url, requests):
+        client = ForecastSolarClient(
+            latitude=48.0, longitude=7.8, cache_dirname=str(tmp_path), base_url=url + "/", timeout=5,
+            planes=[Plane(90, -90, 0.4), Plane(90, 90, 0.6)],
+        )
+        return await client.get_forecast(), await client.get_watt_hours(), requests
+
+    forecast, watt_hours, requests = asyncio.run(
+        serve([web.get("/estimate/{lat}/{lon}/{declination}/{azimuth}/{kwp}", estimate)], scenario))
+    assert sorted(arrived) == ["-90", "90"]
+    assert forecast["watt_hours_period"] == {"2025-06-01 06:00:00": 50.0, "2025-06-01 07:00:00": 200.0}
+    assert forecast["watt_hours_day"] == {"2025-06-01": 250.0}
+    assert watt_hours == {datetime(2025, 6, 1, 6): 50.0, datetime(2025, 6, 1, 7): 200.0}
+    # The second call is served from the cache
+    assert len(requests) == 2
+
+
+def test_forecast_solar_fails_if_a_plane_fails(tmp_path):
+    async def estimate(request):
+        if request.match_info["azimuth"] == "90":
+            return web.Response(status=429)
+        return web.json_response(plane_forecast(1.0))
+
+    async def scenario(url, requests):
+        client = ForecastSolarClient(
+            latitude=48.0, longitude=7.8, cache_dirname=str(tmp_path), base_url=url + "/",
+            planes=[Plane(90, -90, 0.4), Plane(90, 90, 0.6)], retries=1, backoff=0.01,
+        )
+        return await client.get_watt_hours()
+
+    assert asyncio.run(serve([web.get("/estimate/{lat}/{lon}/{declination}/{azimuth}/{kwp}", estimate)], scenario)) == {}
+
+
+def test_merge_carries_cumulative_values_within_the_day():
+    east = {"watt_hours": {"2025-06-01 06:00:00": 10, "2025-06-01 07:00:00": 30, "2025-06-02 06:00:00": 5},
+            "watt_hours_period": {"2025-06-01 06:00:00": 10, "2025-06-01 07:00:00": 20}}
+    west = {"watt_hours": {"2025-06-01 06:00:00": 1, "2025-06-02 06:00:00": 2},
+            "watt_hours_period": {"2025-06-01 06:00:00": 1}}
+    merged = merge_forecasts([east, west])
+    assert merged["watt_hours"] == {"2025-06-01 06:00:00": 11, "2025-06-01 07:00:00": 31, "2025-06-02 06:00:00": 7}
+    assert merged["watt_hours_period"] == {"2025-06-01 06:00:00": 11, "2025-06-01 07:00:00": 20}
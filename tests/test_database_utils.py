@@ -0,0 +1,18 @@
+"""
+Tests for the AppDaemon DatabaseManager.
+"""
+from balkonsolar.appdaemon.apps.database_utils import DatabaseManager
+
+
+def test_hot_tier_only_serves_samples_that_were_written(tmp_path):
+    db = DatabaseManager(str(tmp_path / "energy.db"), hot_tier=True)
+    assert db.store_solar_output(100.0, "2025-06-01 12:00:00")
+    assert db.get_solar_output()[0]["value"] == 100.0
+
+    conn = db._get_connection()
+    conn.execute("CREATE TRIGGER reject BEFORE INSERT ON solar_output BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.commit()
+    conn.close()
+
+    assert not db.store_solar_output(200.0, "2025-06-01 12:01:00")
+    assert db.get_solar_output()[0]["value"] == 100.0
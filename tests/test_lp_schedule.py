@@ -0,0 +1,45 @@
+"""
+Tests for the LP battery schedule.
+"""
+import numpy as np
+
+from balkonsolar.core.lp_schedule import LPScheduler
+from balkonsolar.core.schedule import CHARGE_BATTERY, MIXED, USE_BATTERY
+
+
+def random_day(seed):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(24)
+    pv = np.maximum(0.0, 400 * np.sin((hours - 6) / 12 * np.pi)) * rng.uniform(0.3, 1.2, 24)
+    usage = rng.uniform(50, 400, 24)
+    grid_state = rng.choice([-1, 1, 1, 1, 3, 4], 24)
+    return usage, pv, grid_state
+
+
+def test_never_charges_and_discharges_in_the_same_hour():
+    scheduler = LPScheduler()
+    for seed in range(20):
+        usage, pv, grid_state = random_day(seed)
+        scheduler.plan(usage, pv, grid_state, battery_max=2560, battery_current=500)
+        assert scheduler.last_status == "optimal"
+        flows = scheduler.last_flows
+        assert np.all(np.minimum(flows["charge"], flows["discharge"]) <= 1e-6)
+
+
+def test_states_follow_the_net_battery_flow():
+    scheduler = LPScheduler()
+    for seed in range(20):
+        usage, pv, grid_state = random_day(seed)
+        schedule = scheduler.plan(usage, pv, grid_state, battery_max=2560, battery_current=500)
+        charging = np.isin(schedule.state, (CHARGE_BATTERY, MIXED))
+        assert np.all(schedule.battery_input[charging] > 0)
+        assert np.all(schedule.battery_input[schedule.state == USE_BATTERY] < 0)
+
+
+def test_surplus_fills_the_battery_before_feeding_in():
+    usage = np.full(6, 100.0)
+    pv = np.array([0.0, 600.0, 600.0, 0.0, 0.0, 0.0])
+    schedule = LPScheduler().plan(usage, pv, np.ones(6), battery_max=600, battery_current=0)
+    # 500 Wh surplus per hour; the battery takes all it can in the first surplus hour
+    assert schedule.battery_input[1] > schedule.battery_input[2]
+    assert np.all(schedule.battery_input[3:] < 0)
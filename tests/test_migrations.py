@@ -0,0 +1,58 @@
+"""
+Tests for the epoch schema and telemetry table migrations.
+"""
+import sqlite3
+
+from balkonsolar.core import rollups
+from balkonsolar.core.schema_catalog import TELEMETRY_SIGNALS
+from balkonsolar.core.timestamps import to_epoch
+from balkonsolar.data import migrate_epoch_schema, migrate_telemetry_table
+from balkonsolar.data.create_energy_db import create_energy_database
+
+SAMPLES = [("2025-06-01 12:00:00", 10.0, 200.0, -50.0), ("2025-06-01 12:01:00", 11.0, 300.0, -80.0)]
+
+
+def fill(db_path, epoch=False):
+    conn = sqlite3.connect(db_path)
+    for tstamp, battery, solar, grid in SAMPLES:
+        for signal, value in zip(TELEMETRY_SIGNALS, (battery, solar, grid)):
+            conn.execute(f"INSERT INTO {signal} (tstamp, value) VALUES (?, ?)", (to_epoch(tstamp) if epoch else tstamp, value))
+    conn.commit()
+    rollups.refresh_rollups(conn)
+    return conn
+
+
+def check_epoch_telemetry(conn):
+    assert conn.execute("SELECT DISTINCT typeof(tstamp) FROM telemetry").fetchall() == [("integer",)]
+    assert conn.execute("SELECT tstamp, value FROM solar_output ORDER BY tstamp").fetchall() == [
+        (to_epoch(tstamp), solar) for tstamp, _, solar, _ in SAMPLES]
+    # The view triggers write epoch seconds into the telemetry table
+    conn.execute("INSERT INTO grid_usage (tstamp, value) VALUES (?, ?)", (to_epoch("2025-06-01 12:02:00"), -90.0))
+    conn.execute("INSERT INTO grid_usage (value) VALUES (-95.0)")
+    assert conn.execute("SELECT DISTINCT typeof(tstamp) FROM grid_usage").fetchall() == [("integer",)]
+    watermarks = dict(conn.execute("SELECT source, last_tstamp FROM rollup_state").fetchall())
+    assert watermarks == {signal: to_epoch(SAMPLES[-1][0]) for signal in TELEMETRY_SIGNALS}
+
+
+def test_telemetry_database_migrates_to_the_epoch_schema(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    create_energy_database(db_path, telemetry_table=True)
+    fill(db_path).close()
+
+    migrate_epoch_schema.migrate_database(db_path, vacuum=False)
+
+    conn = sqlite3.connect(db_path)
+    check_epoch_telemetry(conn)
+    # Only the two grid samples written after the migration are rolled up, nothing twice
+    assert rollups.refresh_rollups(conn) == 2
+
+
+def test_epoch_database_migrates_to_the_telemetry_table(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    create_energy_database(db_path, epoch_schema=True)
+    fill(db_path, epoch=True).close()
+
+    assert migrate_telemetry_table.migrate_database(db_path, vacuum=False) == {signal: 2 for signal in TELEMETRY_SIGNALS}
+
+    conn = sqlite3.connect(db_path)
+    check_epoch_telemetry(conn)
@@ -0,0 +1,35 @@
+"""
+Tests for the planning-grid resampling.
+"""
+import numpy as np
+import pandas as pd
+
+from balkonsolar.core.resample import periods_ending_at, resample_energy, resample_state, slot_edges
+
+
+def test_state_takes_the_newest_sample_of_a_slot_before_the_last():
+    timestamps = pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:10", "2025-01-01 01:30"])
+    edges = slot_edges("2025-01-01", 3, 60)
+    states = resample_state(timestamps, [1, 1, 4], edges, max_age=3600)
+    assert states[1] == 4
+
+
+def test_state_ignores_samples_after_the_last_edge():
+    timestamps = pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:00", "2025-01-01 02:00"])
+    edges = slot_edges("2025-01-01", 2, 60)
+    assert resample_state(timestamps, [1, 1, 4], edges).tolist() == [1, 1]
+
+
+def test_state_keeps_the_most_restrictive_sample_in_a_slot():
+    timestamps = pd.to_datetime(["2025-01-01 00:00", "2025-01-01 00:15", "2025-01-01 00:30", "2025-01-01 00:45"])
+    edges = slot_edges("2025-01-01", 1, 60)
+    assert resample_state(timestamps, [-1, 3, 1, 1], edges).tolist() == [3]
+
+
+def test_energy_is_conserved_across_resolutions():
+    timestamps = pd.to_datetime(["2025-06-01 06:23", "2025-06-01 07:00", "2025-06-01 08:00", "2025-06-01 08:41"])
+    energy = np.array([20.0, 150.0, 300.0, 90.0])
+    starts, ends = periods_ending_at(timestamps)
+    for resolution in (60, 15, 5):
+        edges = slot_edges("2025-06-01 05:00", 5 * 60 // resolution, resolution)
+        assert np.isclose(resample_energy(starts, ends, energy, edges).sum(), energy.sum())
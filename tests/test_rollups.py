@@ -0,0 +1,39 @@
+"""
+Tests for the rollup tables.
+"""
+import sqlite3
+
+import pytest
+
+from balkonsolar.core import rollups
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.data.create_energy_db import create_energy_database
+
+BUCKETS = "SELECT source, bucket, samples, min_value, max_value, ROUND(sum_value, 6), ROUND(energy_wh, 6) FROM rollup_15min ORDER BY 1, 2"
+
+
+@pytest.mark.parametrize("schema", [{}, {"epoch_schema": True}, {"telemetry_table": True}])
+def test_folding_each_sample_matches_a_full_refresh(tmp_path, schema):
+    db_path = str(tmp_path / "energy.db")
+    create_energy_database(db_path, **schema)
+    db = DatabaseInterface(db_path, pooled=True, update_rollups=True)
+    statements = []
+    db._get_connection().set_trace_callback(statements.append)
+    for minute in range(90):
+        if minute == 1:
+            # The first write creates the rollup tables
+            statements.clear()
+        db.store_value("solar_output", 100.0 + minute, f"2025-06-01 {12 + minute // 60}:{minute % 60:02d}:00")
+    db.close()
+
+    # Later writes commit each sample together with its buckets and never touch the schema
+    assert sum(statement == "COMMIT" for statement in statements) == 89
+    assert not any("CREATE" in statement or "sqlite_master" in statement for statement in statements)
+
+    conn = sqlite3.connect(db_path)
+    folded = conn.execute(BUCKETS).fetchall()
+    for table in ("rollup_15min", "rollup_hourly", "rollup_daily", "rollup_state"):
+        conn.execute(f"DELETE FROM {table}")
+    rollups.refresh_rollups(conn)
+    assert folded == conn.execute(BUCKETS).fetchall()
+    assert len(folded) == 6
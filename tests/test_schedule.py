@@ -0,0 +1,31 @@
+"""
+Tests for the greedy battery schedule.
+"""
+import numpy as np
+
+from balkonsolar.core.schedule import plan_schedule
+
+
+def test_one_forecast_broadcasts_over_many_batteries():
+    usage = np.array([100.0, 100.0, 100.0])
+    pv = np.array([300.0, 0.0, 500.0])
+    grid_state = np.array([3, 1, 1])
+    schedule = plan_schedule(usage, pv, grid_state, battery_max=np.array([100.0, 300.0, 1000.0]), battery_current=0)
+    assert schedule.battery_input.shape == (3, 3)
+    assert schedule.battery_input.tolist() == [[0, 0, 100], [0, 0, 300], [200, 0, 400]]
+    for row, battery_max in zip(schedule.battery_input, (100.0, 300.0, 1000.0)):
+        single = plan_schedule(usage, pv, grid_state, battery_max, 0)
+        assert np.array_equal(row, single.battery_input)
+
+
+def test_batteries_per_row_match_separate_plans():
+    rng = np.random.default_rng(0)
+    usage = rng.uniform(50, 400, (4, 24))
+    pv = rng.uniform(0, 600, (4, 24))
+    grid_state = rng.choice([-1, 1, 3, 4], (4, 24))
+    battery_max = np.array([500.0, 1000.0, 2000.0, 2560.0])
+    schedule = plan_schedule(usage, pv, grid_state, battery_max, 100.0)
+    for i in range(4):
+        single = plan_schedule(usage[i], pv[i], grid_state[i], battery_max[i], 100.0)
+        assert np.array_equal(schedule.battery_input[i], single.battery_input)
+        assert np.array_equal(schedule.state[i], single.state)
@@ -0,0 +1,64 @@
+"""
+Tests for the cached schema catalog.
+"""
+import sqlite3
+
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.schema_catalog import SchemaCatalog
+
+
+def test_validate_drops_a_stale_known_table(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE solar_output (id INTEGER PRIMARY KEY, tstamp TEXT, value REAL)")
+    catalog = SchemaCatalog()
+    assert not catalog.table(conn, "solar_output").epoch
+
+    other = sqlite3.connect(db_path)
+    other.execute("DROP TABLE solar_output")
+    other.execute("CREATE TABLE solar_output (tstamp INTEGER PRIMARY KEY, value REAL) WITHOUT ROWID")
+    other.commit()
+
+    assert catalog.validate(conn)
+    assert catalog.table(conn, "solar_output").epoch
+    assert not catalog.validate(conn)
+
+
+def test_pooled_connections_see_schema_changes_of_other_connections(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE solar_output (id INTEGER PRIMARY KEY AUTOINCREMENT, tstamp TEXT, value REAL)")
+    conn.execute("INSERT INTO solar_output (tstamp, value) VALUES ('2025-06-01 12:00:00', 1.0)")
+    conn.commit()
+
+    db = DatabaseInterface(db_path, pooled=True)
+    assert db.get_latest_value("solar_output")["value"] == 1.0
+
+    # Migrate the known table to the epoch schema behind the interface's back
+    conn.execute("DROP TABLE solar_output")
+    conn.execute("CREATE TABLE solar_output (tstamp INTEGER PRIMARY KEY, value REAL) WITHOUT ROWID")
+    conn.commit()
+
+    assert db.store_value("solar_output", 2.0, "2025-06-01 12:01:00")
+    assert conn.execute("SELECT typeof(tstamp), value FROM solar_output").fetchall() == [("integer", 2.0)]
+    db.close()
+
+
+def test_unpooled_reads_recover_after_a_schema_change(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE solar_output (id INTEGER PRIMARY KEY AUTOINCREMENT, tstamp TEXT, value REAL)")
+    conn.execute("INSERT INTO solar_output (tstamp, value) VALUES ('2025-06-01 12:00:00', 1.0)")
+    conn.commit()
+
+    db = DatabaseInterface(db_path)
+    assert db.get_latest_value("solar_output")["value"] == 1.0
+
+    conn.execute("DROP TABLE solar_output")
+    conn.execute("CREATE TABLE solar_output (tstamp INTEGER PRIMARY KEY, value REAL) WITHOUT ROWID")
+    conn.execute("INSERT INTO solar_output (tstamp, value) VALUES (1748772000, 2.0)")
+    conn.commit()
+
+    # The stale catalog fails at most one read, then the schema is reloaded
+    db.get_latest_value("solar_output")
+    assert db.get_latest_value("solar_output")["value"] == 2.0
@@ -0,0 +1,42 @@
+"""
+Tests for streaming history reads.
+"""
+import itertools
+import sqlite3
+
+import pytest
+
+from balkonsolar.appdaemon.apps.database_utils import DatabaseManager
+from balkonsolar.core.database_interface import DatabaseInterface
+from balkonsolar.core.timestamps import to_epoch
+from balkonsolar.data.create_energy_db import create_energy_database
+
+
+def test_a_failure_mid_stream_is_raised(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE solar_output (id INTEGER PRIMARY KEY AUTOINCREMENT, tstamp TEXT, value REAL)")
+    conn.executemany("INSERT INTO solar_output (tstamp, value) VALUES (?, ?)",
+                     [("2025-06-01 12:00:00", 1.0), ("2025-06-01 12:01:00", 2.0), ("not a timestamp", 3.0)])
+    conn.commit()
+    conn.close()
+
+    chunks = DatabaseInterface(db_path).iter_history("solar_output", chunk_size=2, output="pandas")
+    assert len(next(chunks)) == 2
+    with pytest.raises(ValueError):
+        next(chunks)
+
+
+def test_a_failure_mid_stream_is_raised_by_the_appdaemon_manager(tmp_path):
+    db_path = str(tmp_path / "energy.db")
+    create_energy_database(db_path, epoch_schema=True)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO solar_output (tstamp, value) VALUES (?, ?)",
+                     [(to_epoch("2025-06-01 12:00:00"), 1.0), (to_epoch("2025-06-01 12:01:00"), 2.0), ("not a timestamp", 3.0)])
+    conn.commit()
+    conn.close()
+
+    rows = DatabaseManager(db_path).iter_values_by_timeframe("solar_output", "2025-06-01 00:00:00", chunk_size=2)
+    assert [row["value"] for row in itertools.islice(rows, 2)] == [1.0, 2.0]
+    with pytest.raises(TypeError):
+        next(rows)
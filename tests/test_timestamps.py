@@ -0,0 +1,28 @@
+"""
+Tests for the timestamp helpers.
+"""
+import datetime
+from zoneinfo import ZoneInfo
+
+from balkonsolar.core.timestamps import local_timezone
+
+
+def test_local_timezone_follows_dst(monkeypatch):
+    monkeypatch.delenv("TIMEZONE", raising=False)
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    zone = local_timezone()
+    assert datetime.datetime(2025, 1, 15, 12, tzinfo=zone).utcoffset() == datetime.timedelta(hours=1)
+    assert datetime.datetime(2025, 7, 15, 12, tzinfo=zone).utcoffset() == datetime.timedelta(hours=2)
+
+
+def test_timezone_setting_takes_precedence(monkeypatch):
+    monkeypatch.setenv("TIMEZONE", "America/New_York")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    assert str(local_timezone()) == "America/New_York"
+
+
+def test_system_zone_is_a_real_zone(monkeypatch):
+    monkeypatch.delenv("TIMEZONE", raising=False)
+    monkeypatch.delenv("TZ", raising=False)
+    # A zone with DST rules, not the fixed offset of the moment of import
+    assert isinstance(local_timezone(), ZoneInfo)